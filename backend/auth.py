@@ -1,25 +1,60 @@
 """JWT-based authentication system."""
 import hashlib
-import json
 import secrets
-from pathlib import Path
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Tuple, Dict, Optional
+from typing import Tuple, Dict, Optional, Any
 import jwt
 from fastapi import HTTPException, Header
 
 from backend.config import *
+from backend.user import user_store
 
-DB_FILE = Path(USERS_DB_FILE)
 RESET_TOKENS = {}
 
-def _load_users() -> Dict:
-    if not DB_FILE.exists():
-        return {}
-    return json.loads(DB_FILE.read_text())
+class _TTLCache:
+    """Small thread-safe LRU cache whose entries carry their own expiry."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if time.time() >= expires_at:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
 
-def _save_users(users: Dict) -> None:
-    DB_FILE.write_text(json.dumps(users, indent=2))
+    def pop(self, key) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+# token -> verified claims; entries never outlive the token's own exp
+_TOKEN_CACHE = _TTLCache(TOKEN_CACHE_SIZE)
+# username -> profile dict; invalidated on every write to the user
+_PROFILE_CACHE = _TTLCache(PROFILE_CACHE_SIZE)
 
 def hash_password(password: str) -> str:
     return hashlib.sha256(password.encode()).hexdigest()
@@ -29,10 +64,48 @@ def create_token(username: str) -> str:
     payload = {
         "sub": username,
         "exp": datetime.utcnow() + timedelta(hours=JWT_EXPIRY_HOURS),
-        "iat": datetime.utcnow()
+        "iat": time.time(),  # Sub-second, so a token issued right after a revoke-all stays valid
+        "jti": secrets.token_hex(8)
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
+def _token_id(token: str, claims: Dict) -> str:
+    # Tokens issued before "jti" was added are identified by their hash
+    return claims.get("jti") or hashlib.sha256(token.encode()).hexdigest()[:32]
+
+# Revoked token ids and per-user cutoffs, mirrored from the user store. Another worker's
+# revocations show up within REVOCATION_REFRESH_SECONDS, when the store's version moves.
+_revocations = {"version": None, "checked": 0.0, "tokens": {}, "cutoffs": {}}
+_revocations_lock = threading.Lock()
+
+def _refresh_revocations() -> None:
+    now = time.monotonic()
+    if now - _revocations["checked"] < REVOCATION_REFRESH_SECONDS:
+        return
+    with _revocations_lock:
+        if now - _revocations["checked"] < REVOCATION_REFRESH_SECONDS:
+            return
+        if user_store.revocation_version() != _revocations["version"]:
+            version, tokens, cutoffs = user_store.load_revocations(time.time())
+            _revocations.update(version=version, tokens=tokens, cutoffs=cutoffs)
+        _revocations["checked"] = now
+
+def _is_revoked(token: str, claims: Dict) -> bool:
+    _refresh_revocations()
+    if _token_id(token, claims) in _revocations["tokens"]:
+        return True
+    valid_after = _revocations["cutoffs"].get(claims["sub"])
+    return valid_after is not None and claims.get("iat", 0) <= valid_after
+
+def _decode_token(token: str) -> Dict:
+    """Return verified claims, using the cache to skip repeated HMAC checks."""
+    claims = _TOKEN_CACHE.get(token)
+    if claims is None:
+        claims = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        ttl = min(TOKEN_CACHE_TTL_SECONDS, claims["exp"] - time.time())
+        _TOKEN_CACHE.set(token, claims, ttl)
+    return claims
+
 def verify_token(authorization: Optional[str] = Header(None)) -> str:
     """Verify JWT and return username."""
     if not authorization or not authorization.startswith("Bearer "):
@@ -40,37 +113,63 @@ def verify_token(authorization: Optional[str] = Header(None)) -> str:
     
     token = authorization.split(" ")[1]
     try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return payload["sub"]
+        claims = _decode_token(token)
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
+    
+    if _is_revoked(token, claims):
+        raise HTTPException(status_code=401, detail="Token revoked")
+    return claims["sub"]
+
+def revoke_token(token: str) -> bool:
+    """Revoke a single token until its natural expiry."""
+    try:
+        claims = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+    except jwt.InvalidTokenError:
+        return False
+    
+    user_store.revoke_token(_token_id(token, claims), claims["exp"], time.time())
+    with _revocations_lock:
+        _revocations["tokens"][_token_id(token, claims)] = claims["exp"]
+    _TOKEN_CACHE.pop(token)
+    return True
+
+def revoke_user_tokens(username: str) -> None:
+    """Revoke every token issued to a user up to now."""
+    cutoff = time.time()
+    user_store.revoke_tokens_before(username, cutoff)
+    with _revocations_lock:
+        _revocations["cutoffs"][username] = max(cutoff, _revocations["cutoffs"].get(username, 0))
+
+def _invalidate_profile(*usernames: str) -> None:
+    for username in usernames:
+        _PROFILE_CACHE.pop(username)
 
 # ========== AUTHENTICATION ==========
 
 def signup(username: str, email: str, password: str) -> Tuple[bool, str]:
-    users = _load_users()
-    
-    if username in users:
-        return False, "Username already exists"
-    if any(u.get("email") == email for u in users.values()):
-        return False, "Email already registered"
-    
-    users[username] = {
-        "email": email,
-        "password": hash_password(password),
-        "created_at": datetime.now().isoformat(),
-        "query_quota": DEFAULT_QUERY_QUOTA
-    }
-    _save_users(users)
+    success, conflict = user_store.create_user(
+        username,
+        email,
+        hash_password(password),
+        datetime.now().isoformat(),
+        {
+            "query_quota": DEFAULT_QUERY_QUOTA,
+            "upload_quota": DEFAULT_UPLOAD_QUOTA,
+            "analysis_quota": DEFAULT_ANALYSIS_QUOTA
+        }
+    )
+    if not success:
+        return False, "Email already registered" if conflict == "email" else "Username already exists"
     return True, "Account created successfully"
 
 def login(username: str, password: str) -> Tuple[bool, str, str]:
     """Returns (success, message, token)."""
-    users = _load_users()
+    user = user_store.get_user(username)
     
-    if username not in users or users[username]["password"] != hash_password(password):
+    if not user or user["password"] != hash_password(password):
         return False, "Invalid credentials", ""
     
     token = create_token(username)
@@ -79,40 +178,40 @@ def login(username: str, password: str) -> Tuple[bool, str, str]:
 # ========== PROFILE ==========
 
 def get_user_profile(username: str) -> Dict:
-    users = _load_users()
-    if username not in users:
+    profile = _PROFILE_CACHE.get(username)
+    if profile is not None:
+        return dict(profile)
+    
+    user = user_store.get_user(username)
+    if not user:
         return {}
     
-    user = users[username]
-    return {
+    profile = {
         "username": username,
         "email": user.get("email", ""),
         "created_at": user.get("created_at", ""),
         "query_quota": user.get("query_quota", 0)
     }
+    _PROFILE_CACHE.set(username, profile, PROFILE_CACHE_TTL_SECONDS)
+    return dict(profile)
 
 def update_profile(username: str, new_username: str = None, new_email: str = None) -> Tuple[bool, str]:
-    users = _load_users()
+    user = user_store.get_user(username)
     
-    if username not in users:
+    if not user:
         return False, "User not found"
     
-    if new_username and new_username != username:
-        if new_username in users:
-            return False, "Username taken"
-        users[new_username] = users.pop(username)
-        username = new_username
-    
-    if new_email:
-        if any(u.get("email") == new_email for k, u in users.items() if k != username):
-            return False, "Email already in use"
-        users[username]["email"] = new_email
+    success, conflict = user_store.update_user(username, new_username, new_email)
+    _invalidate_profile(username, new_username)
+    if not success:
+        return False, "Email already in use" if conflict == "email" else "Username taken"
     
-    _save_users(users)
+    if new_username:
+        username = new_username
     
     try:
         from backend.email_service import send_profile_updated_email
-        send_profile_updated_email(users[username].get("email", ""), username)
+        send_profile_updated_email(new_email or user.get("email", ""), username)
     except:
         pass
     
@@ -121,25 +220,25 @@ def update_profile(username: str, new_username: str = None, new_email: str = Non
 # ========== PASSWORD ==========
 
 def change_password(username: str, old_pass: str, new_pass: str) -> Tuple[bool, str]:
-    users = _load_users()
+    user = user_store.get_user(username)
     
-    if username not in users or users[username]["password"] != hash_password(old_pass):
+    if not user or user["password"] != hash_password(old_pass):
         return False, "Incorrect password"
     
-    users[username]["password"] = hash_password(new_pass)
-    _save_users(users)
+    user_store.set_password(username, hash_password(new_pass))
+    _invalidate_profile(username)
+    revoke_user_tokens(username)  # Sessions opened with the old password end here
     
     try:
         from backend.email_service import send_password_changed_email
-        send_password_changed_email(users[username].get("email", ""), username)
+        send_password_changed_email(user.get("email", ""), username)
     except:
         pass
     
     return True, "Password changed"
 
 def request_reset(email: str) -> Tuple[bool, str]:
-    users = _load_users()
-    username = next((k for k, v in users.items() if v.get("email") == email), None)
+    username = user_store.get_username_by_email(email)
     
     if not username:
         return True, "If the email is registered, a reset link has been sent."
@@ -167,14 +266,19 @@ def reset_password(token: str, new_pass: str) -> Tuple[bool, str]:
         return False, "Token expired"
     
     username = RESET_TOKENS[token]["username"]
-    users = _load_users()
-    users[username]["password"] = hash_password(new_pass)
-    _save_users(users)
+    user = user_store.get_user(username)
+    if not user:
+        del RESET_TOKENS[token]
+        return False, "Invalid or expired token"
+    
+    user_store.set_password(username, hash_password(new_pass))
     del RESET_TOKENS[token]
+    _invalidate_profile(username)
+    revoke_user_tokens(username)
     
     try:
         from backend.email_service import send_password_changed_email
-        send_password_changed_email(users[username].get("email", ""), username)
+        send_password_changed_email(user.get("email", ""), username)
     except:
         pass
     
@@ -183,16 +287,4 @@ def reset_password(token: str, new_pass: str) -> Tuple[bool, str]:
 # ========== QUOTA ==========
 
 def get_user_quotas(username: str) -> Dict:
-    users = _load_users()
-    if username not in users:
-        return {"query_quota": 0}
-    return {"query_quota": users[username].get("query_quota", 0)}
-
-def decrement_quota(username: str, quota_type: str) -> bool:
-    users = _load_users()
-    if username not in users or users[username].get(quota_type, 0) <= 0:
-        return False
-    
-    users[username][quota_type] -= 1
-    _save_users(users)
-    return True
+    return {"query_quota": user_store.get_quota(username, "query_quota")}
@@ -7,40 +7,144 @@ load_dotenv()
 # API Keys
 GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
 GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL") or None  # Point at a local fake server for testing
+
+# LLM gateway
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))  # In-flight Groq calls per worker
+LLM_MAX_QUEUE = 32  # Waiting calls beyond this are rejected immediately
+LLM_QUEUE_TIMEOUT_SECONDS = 30
+LLM_TIMEOUT_SECONDS = 60  # Per-attempt HTTP timeout
+LLM_MAX_RETRIES = 3  # Retries on 429/5xx/connection errors
+LLM_BACKOFF_BASE_SECONDS = 0.5
+LLM_BACKOFF_MAX_SECONDS = 8
+LLM_BREAKER_FAILURES = 5  # Consecutive failed attempts before the circuit opens
+LLM_BREAKER_COOLDOWN_SECONDS = 30
+
+# Observability
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"  # Stage timings and /metrics; off costs ~nothing
+TRACE_LOG = os.getenv("TRACE_LOG", "0") == "1"  # Print each request's stage timings as one JSON line
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)  # Seconds
 
 # JWT
 JWT_SECRET = os.getenv("JWT_SECRET", "change-this-in-production")
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRY_HOURS = 24
+TOKEN_CACHE_SIZE = 4096  # Verified tokens kept in memory per worker
+TOKEN_CACHE_TTL_SECONDS = 300  # Capped by each token's own exp
+PROFILE_CACHE_SIZE = 4096
+PROFILE_CACHE_TTL_SECONDS = 60  # Bounds staleness across workers
+REVOCATION_REFRESH_SECONDS = 2  # How late a worker may see another worker's logout
 
 # Database
 QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
-USERS_DB_FILE = "users.json"
+USERS_DB_FILE = "users.json"  # Legacy store, imported once into USERS_DB_PATH
+USERS_DB_PATH = os.getenv("USERS_DB_PATH", "users.db")
 
 # Email
 SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
 SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
 SMTP_EMAIL = os.getenv("SMTP_EMAIL", "")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") == "1"  # Off for a local debugging server
+EMAIL_OUTBOX_PATH = os.getenv("EMAIL_OUTBOX_PATH", "outbox.db")  # SQLite queue drained by backend.email_outbox
+EMAIL_BATCH_SIZE = 50  # Messages claimed at a time; a drain sends all due batches over one SMTP session
+EMAIL_POLL_SECONDS = 5  # Worker wakes at least this often for retries and other workers' messages
+EMAIL_CLAIM_SECONDS = 300  # Lease on claimed messages; a dead worker's are retried after it
+EMAIL_SMTP_TIMEOUT_SECONDS = 30
+EMAIL_MAX_ATTEMPTS = 8
+EMAIL_BACKOFF_BASE_SECONDS = 30
+EMAIL_BACKOFF_MAX_SECONDS = 3600
 
 # Paths
 UPLOADS_DIR = "uploads"
 CHAT_HISTORY_DIR = "chat_history"
 CACHE_DIR = "cache"
+ANALYSIS_CACHE_DIR = "cache/analysis"
+ANALYSIS_CACHE_MAX_BYTES = 256 * 1024 * 1024  # In-memory budget per worker; the rest lives on disk
+ANALYSIS_DISK_MAX_BYTES = 2 * 1024 * 1024 * 1024  # Shared disk budget; least recently used results are pruned past it
 
-# RAG Parameters
+# Uploads
+PDF_MAX_UPLOAD_MB = 50
+UPLOAD_CHUNK_BYTES = 1024 * 1024  # Uploads are streamed to disk in chunks of this size
+PDF_COUNT_PAGES = True  # Count pages while streaming and report them with the upload
+
+# Quotas and rate limits
 DEFAULT_QUERY_QUOTA = 50
+DEFAULT_UPLOAD_QUOTA = 100
+DEFAULT_ANALYSIS_QUOTA = 50
+# kind -> (burst capacity, sustained requests per minute)
+RATE_LIMITS = {
+    "query": (10, 20),      # /rag/query
+    "upload": (5, 10),      # /rag/upload
+    "analysis": (5, 10),    # /data/upload, /data/query
+}
+QUOTA_FLUSH_SECONDS = 10  # How often per-worker usage counters are written to the user store
+QUOTA_EXEMPT_CACHED = os.getenv("QUOTA_EXEMPT_CACHED", "true").lower() == "true"
+
+# Startup
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "1") == "1"  # Load heavy subsystems in the background after startup
+READINESS_REQUIRED = ["vector_db", "embedding_model"]  # Subsystems that must be warm for /ready to pass
+STARTUP_IMPORT_BUDGET_SECONDS = 1.5  # Budget for importing backend.main, checked by benchmarks.bench_startup
+
+# RAG Parameters
 DEFAULT_TOP_K = 5  # Increased for better context
-EMBEDDING_DIM = 384
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_DIM = 384  # Must match EMBEDDING_MODEL's output size
+EMBED_BATCH_SIZE = 32
+EMBEDDING_SOCKET = os.getenv("EMBEDDING_SOCKET", "")  # Unix socket of backend.rag.embed_server; empty = load the model in-process
+EMBED_SIDECAR_TIMEOUT_SECONDS = 60
+EMBED_SIDECAR_MAX_BATCH = 256  # Texts from concurrent requests encoded together by the sidecar
+EMBED_SIDECAR_WAIT_MS = 2  # How long the sidecar waits for more requests to join a batch
 COLLECTION_NAME = "docs"
+DELETE_BACKGROUND_MIN_POINTS = 2000  # Documents with more points are purged after DELETE /documents returns
 CHUNK_SIZE = 512
 CHUNK_OVERLAP = 50
+PDF_CHUNKER = os.getenv("PDF_CHUNKER", "structured")  # "structured" (pypdf, headings/tables, page metadata) or "sentence" (llama_index SentenceSplitter)
+PDF_PARSE_WORKERS = min(4, os.cpu_count() or 1)  # Processes extracting and chunking page ranges of large PDFs
+PDF_PARALLEL_MIN_PAGES = 16  # Smaller PDFs are chunked in-process
+SMALL_TO_BIG = os.getenv("SMALL_TO_BIG", "1") == "1"  # Embed small child chunks, answer from their CHUNK_SIZE parents
+CHILD_CHUNK_SIZE = 128  # Tokens per embedded child chunk
+CHILD_CHUNK_OVERLAP = 16
+CHILD_TOP_K_FACTOR = 3  # Children retrieved per requested result, since several often share a parent
+DOCUMENT_CONTEXT_TOKENS = 3000  # Budget for expanded parent contexts in document mode
+SUMMARY_CONTEXT_TOKENS = 3000  # Budget for summary mode
 SCORE_THRESHOLD = 0.3  # Lowered for broader matches
+QUERY_SCORE_THRESHOLD = 0.25  # Minimum similarity for a chunk to be retrieved for a question
+DOCUMENT_CONTEXT_LIMIT = 8  # Retrieved chunks sent to the LLM in document mode
+COALESCE_TIMEOUT_SECONDS = 60  # Max time a duplicate query waits on the in-flight one
 
 # Context confidence thresholds
 MIN_CONTEXT_CHUNKS = 1  # Minimum chunks to consider context valid
 MIN_SIMILARITY_SCORE = 0.35  # Minimum score for confident context
 FALLBACK_THRESHOLD = 0.4  # If best score below this, use general knowledge
 
+# Data analysis
+DATA_MAX_UPLOAD_MB = 200  # Uploads are converted to Parquet once, so large files stay cheap to re-read
+DATA_CHUNK_ROWS = 100_000  # Rows per chunk when streaming CSVs
+DATA_CHUNK_CELLS = 5_000_000  # Caps chunk rows for wide tables
+DATA_SAMPLE_ROWS = 10_000  # Reservoir sample kept for charts and previews
+DATA_SHEET_WORKERS = min(4, os.cpu_count() or 1)  # Processes analysing workbook sheets in parallel
+DATA_QUERY_DEFAULT_LIMIT = 20  # Rows returned by a data question's query plan unless it sets a limit
+DATA_QUERY_MAX_ROWS = 200  # Upper bound on a query plan's limit
+TREND_MIN_R2 = 0.3  # Fit needed before a regression slope is reported as a trend
+TREND_SEASONALITY_MIN_ACF = 0.3  # Detrended autocorrelation at the seasonal lag needed to report seasonality
+TREND_CHANGE_POINT_MIN_SCORE = 4.0  # t-like score of a mean shift needed to report a change point
+TREND_SERIES_MAX_COLS = 5  # Resampled series kept for charts and LLM insights
+
+# Charts (built on first request from the full data, aggregated server-side)
+CHART_HIST_BINS = 30
+CHART_MAX_POINTS = 2000  # Scatter plots above this many rows are binned into a density grid
+CHART_SCATTER_GRID = 60  # Density grid is at most GRID x GRID cells
+CHART_BOX_MAX_OUTLIERS = 200  # Most extreme outliers drawn on box plots
+CHART_HEATMAP_MAX_COLS = 20
+
+# Tables indexed for RAG (aggregates, not every row, so large files stay bounded)
+TABLE_INDEX_MAX_SEGMENTS = 40  # Row ranges summarized per sheet
+TABLE_INDEX_SEGMENT_COLS = 12  # Columns described in each row-range summary
+TABLE_INDEX_MAX_COLUMN_DOCS = 100  # Per-column statistics documents per sheet
+TABLE_INDEX_ROW_DOCS_MAX_ROWS = 500  # Sheets this small also have their rows indexed
+TABLE_INDEX_ROWS_PER_DOC = 25
+TABLE_INDEX_EMBED_BATCH = 128  # Documents embedded and upserted per batch
+
 # CORS
 CORS_ORIGINS = os.getenv("CORS_ORIGINS", "http://localhost:3000,http://127.0.0.1:3000").split(",")
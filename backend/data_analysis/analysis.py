@@ -1,97 +1,40 @@
 """Data analysis and statistics generation."""
-import pandas as pd
 import numpy as np
-from typing import Dict, Any, List
+import pandas as pd
+from typing import Dict, Any, List, Optional, Tuple
+from backend.data_analysis.timeseries import series_from_frame, time_trends, row_trends
 
-def generate_statistics(df: pd.DataFrame) -> Dict[str, Any]:
-    """Generate comprehensive statistics for the dataset."""
-    
-    stats = {
-        'basic': {
-            'rows': len(df),
-            'columns': len(df.columns),
-            'total_cells': df.size,
-            'memory_mb': df.memory_usage(deep=True).sum() / 1024 / 1024
-        },
-        'missing_values': {
-            'total': int(df.isna().sum().sum()),
-            'by_column': {col: int(df[col].isna().sum()) for col in df.columns}
-        },
-        'numeric_stats': {},
-        'categorical_stats': {},
-        'correlations': None,
-        'outliers': {},
-        'trends': {}
-    }
-    
-    # Numeric columns analysis
-    numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
-    if numeric_cols:
-        desc = df[numeric_cols].describe().to_dict()
-        stats['numeric_stats'] = desc
-        
-        # Correlations
-        if len(numeric_cols) > 1:
-            corr = df[numeric_cols].corr()
-            stats['correlations'] = corr.to_dict()
-        
-        # Detect outliers using IQR
-        for col in numeric_cols:
-            Q1 = df[col].quantile(0.25)
-            Q3 = df[col].quantile(0.75)
-            IQR = Q3 - Q1
-            outliers = df[(df[col] < Q1 - 1.5 * IQR) | (df[col] > Q3 + 1.5 * IQR)][col]
-            if len(outliers) > 0:
-                stats['outliers'][col] = {
-                    'count': len(outliers),
-                    'values': outliers.head(10).tolist()
-                }
-    
-    # Categorical columns analysis
-    categorical_cols = df.select_dtypes(include=['object', 'category']).columns.tolist()
-    if categorical_cols:
-        for col in categorical_cols[:5]:  # Limit to first 5
-            value_counts = df[col].value_counts().head(10)
-            stats['categorical_stats'][col] = {
-                'unique': int(df[col].nunique()),
-                'top_values': value_counts.to_dict(),
-                'mode': df[col].mode()[0] if len(df[col].mode()) > 0 else None
-            }
-    
-    return stats
+def strong_correlations(corr: pd.DataFrame, threshold: float = 0.7) -> List[Tuple[str, str, float]]:
+    """(col1, col2, r) for each upper-triangle pair with |r| > threshold, in row-major order."""
+    values = corr.to_numpy(dtype=float)
+    rows, cols = np.triu_indices(len(corr.columns), k=1)
+    hits = np.abs(values[rows, cols]) > threshold
+    names = corr.columns
+    return [(names[i], names[j], float(values[i, j])) for i, j in zip(rows[hits], cols[hits])]
 
-def detect_trends(df: pd.DataFrame) -> Dict[str, Any]:
-    """Detect trends in numeric columns."""
-    trends = {}
-    numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+def detect_trends(df: pd.DataFrame, series: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Detect trends in numeric columns.
     
-    for col in numeric_cols[:5]:  # Limit to first 5
-        if len(df[col].dropna()) > 2:
-            values = df[col].dropna().values
-            # Simple trend detection
-            if len(values) > 1:
-                diff = values[-1] - values[0]
-                pct_change = (diff / values[0] * 100) if values[0] != 0 else 0
-                
-                trends[col] = {
-                    'direction': 'increasing' if diff > 0 else 'decreasing' if diff < 0 else 'stable',
-                    'change': float(diff),
-                    'percent_change': float(pct_change),
-                    'min': float(values.min()),
-                    'max': float(values.max()),
-                    'mean': float(values.mean())
-                }
-    
-    return trends
+    `series` is the loader's per-day aggregate over the full file. Without
+    it, the date column (if any) of `df` is used; tables with no dates are
+    analysed in file order.
+    """
+    if series is None:
+        series = series_from_frame(df)
+    if series is not None:
+        trends = time_trends(series)
+        if trends is not None:
+            return trends
+    return row_trends(df)
 
-def find_insights(df: pd.DataFrame, stats: Dict) -> List[str]:
+def find_insights(df: pd.DataFrame, stats: Dict, trends: Optional[Dict] = None) -> List[str]:
     """Generate automatic insights from data."""
     insights = []
     
     # Missing data insights
     total_missing = stats['missing_values']['total']
     if total_missing > 0:
-        pct = (total_missing / (df.shape[0] * df.shape[1])) * 100
+        pct = (total_missing / stats['basic']['total_cells']) * 100
         insights.append(f"Dataset has {total_missing} missing values ({pct:.1f}% of total data)")
     
     # Outlier insights
@@ -103,13 +46,20 @@ def find_insights(df: pd.DataFrame, stats: Dict) -> List[str]:
     if stats['correlations']:
         corr_df = pd.DataFrame(stats['correlations'])
         # Find strong correlations (>0.7 or <-0.7)
-        for i in range(len(corr_df.columns)):
-            for j in range(i+1, len(corr_df.columns)):
-                corr_val = corr_df.iloc[i, j]
-                if abs(corr_val) > 0.7:
-                    col1 = corr_df.columns[i]
-                    col2 = corr_df.columns[j]
-                    insights.append(f"Strong correlation ({corr_val:.2f}) between '{col1}' and '{col2}'")
+        for col1, col2, corr_val in strong_correlations(corr_df, 0.7):
+            insights.append(f"Strong correlation ({corr_val:.2f}) between '{col1}' and '{col2}'")
+    
+    # Trend insights (over time only; file order rarely means anything)
+    if trends and trends.get('axis') == 'time':
+        over = f"{trends['date_column']} ({ {'day': 'daily', 'week': 'weekly', 'month': 'monthly'}[trends['grain']]})"
+        for col, t in trends['columns'].items():
+            if t['direction'] != 'stable':
+                insights.append(f"'{col}' is {t['direction']} over {over}: {t['percent_change']:+.1f}% (R² {t['r2']:.2f})")
+            if t['change_point']:
+                cp = t['change_point']
+                insights.append(f"'{col}' shifted from {cp['mean_before']:.2f} to {cp['mean_after']:.2f} around {cp['at'][:10]}")
+            if t['seasonality']:
+                insights.append(f"'{col}' repeats every {t['seasonality']['period']} {t['seasonality']['unit']}s")
     
     # Categorical insights
     if stats['categorical_stats']:
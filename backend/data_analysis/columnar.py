@@ -0,0 +1,264 @@
+"""Typed Parquet copies of uploaded spreadsheets.
+
+Each upload is parsed from CSV/Excel once and written as Parquet next to
+the original (``sales.csv`` -> ``sales.csv.parquet``); workbook sheets get
+one copy each (``sales.xlsx`` -> ``sales.xlsx.Q1-1a2b3c4d.parquet``). Dtypes are fixed
+at conversion time: integers, floats, booleans, datetimes and strings,
+with low-cardinality strings read back as categoricals. Every later read
+memory-maps the Parquet file instead of reparsing the source.
+"""
+import hashlib
+import json
+import re
+import warnings
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from backend.config import DATA_CHUNK_ROWS, DATA_CHUNK_CELLS
+
+SOURCE_EXTENSIONS = ['.xlsx', '.xls', '.csv']
+META_KEY = b"rag_columnar"
+CATEGORICAL_MAX_UNIQUE = 1000
+CATEGORICAL_MAX_RATIO = 0.5
+
+class _SchemaDrift(Exception):
+    """A later chunk no longer fits the dtype inferred from the first one."""
+
+    def __init__(self, column: str, dtype: str):
+        super().__init__(f"{column} -> {dtype}")
+        self.column = column
+        self.dtype = dtype
+
+def is_workbook(file_path) -> bool:
+    return Path(file_path).suffix.lower() in ['.xlsx', '.xls']
+
+def columnar_path(file_path, sheet: Optional[str] = None) -> Path:
+    path = Path(file_path)
+    if sheet is None:
+        return path.with_name(path.name + ".parquet")
+    # Sheet names may hold any character; keep a readable slug plus a hash to stay unique
+    slug = re.sub(r"[^A-Za-z0-9_-]+", "_", sheet)[:40]
+    suffix = hashlib.md5(sheet.encode()).hexdigest()[:8]
+    return path.with_name(f"{path.name}.{slug}-{suffix}.parquet")
+
+def list_sheets(file_path) -> List[str]:
+    """Sheet names of a workbook, without parsing any sheet. Empty for CSVs."""
+    if not is_workbook(file_path):
+        return []
+    with pd.ExcelFile(file_path) as book:
+        return [str(name) for name in book.sheet_names]
+
+def read_source_chunks(path: Path, sheet: Optional[str] = None) -> Iterator[pd.DataFrame]:
+    """Yield the source file in chunks. CSVs are streamed; Excel has no row-streaming reader in pandas."""
+    suffix = path.suffix.lower()
+    if suffix == '.csv':
+        # Size chunks by cell count so wide tables stay within the same memory budget
+        n_cols = max(len(pd.read_csv(path, nrows=0).columns), 1)
+        chunksize = max(1000, min(DATA_CHUNK_ROWS, DATA_CHUNK_CELLS // n_cols))
+        yield from pd.read_csv(path, chunksize=chunksize)
+    elif suffix in ['.xlsx', '.xls']:
+        # First sheet unless one is named
+        yield pd.read_excel(path, sheet_name=0 if sheet is None else sheet)
+    else:
+        raise ValueError(f"Unsupported file type: {path.suffix}")
+
+# ========== DTYPE INFERENCE ==========
+
+def _looks_like_dates(values: pd.Series) -> bool:
+    sample = values.dropna().head(200)
+    if sample.empty or pd.api.types.is_numeric_dtype(sample):
+        return False
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        parsed = pd.to_datetime(sample, errors="coerce")
+    return parsed.notna().mean() >= 0.9
+
+def _infer_dtypes(chunk: pd.DataFrame) -> Dict[str, str]:
+    dtypes = {}
+    for col in chunk.columns:
+        s = chunk[col]
+        if pd.api.types.is_bool_dtype(s):
+            dtypes[col] = "boolean"
+        elif pd.api.types.is_integer_dtype(s):
+            dtypes[col] = "Int64"
+        elif pd.api.types.is_float_dtype(s):
+            dtypes[col] = "float64"
+        elif pd.api.types.is_datetime64_any_dtype(s) or _looks_like_dates(s):
+            dtypes[col] = "datetime64[ns]"
+        else:
+            dtypes[col] = "string"
+    return dtypes
+
+def _coerce(chunk: pd.DataFrame, dtypes: Dict[str, str]) -> pd.DataFrame:
+    out = {}
+    for col, dtype in dtypes.items():
+        s = chunk[col]
+        try:
+            if dtype in ("Int64", "float64"):
+                numeric = pd.to_numeric(s, errors="coerce")
+                # Mostly unparseable (e.g. the first chunk was all blank): it's really text
+                if numeric.notna().sum() < 0.5 * s.notna().sum():
+                    raise _SchemaDrift(col, "string")
+                out[col] = numeric.astype(dtype)
+            elif dtype == "boolean":
+                out[col] = s.astype("boolean")
+            elif dtype == "datetime64[ns]":
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore")
+                    out[col] = pd.to_datetime(s, errors="coerce").astype("datetime64[ns]")
+            else:
+                out[col] = s.map(str, na_action="ignore").astype(object)
+        except (TypeError, ValueError):
+            raise _SchemaDrift(col, "float64" if dtype == "Int64" else "string")
+    return pd.DataFrame(out, index=chunk.index)
+
+def _categoricals(chunk: pd.DataFrame, dtypes: Dict[str, str]) -> List[str]:
+    result = []
+    for col, dtype in dtypes.items():
+        if dtype != "string":
+            continue
+        unique = chunk[col].nunique()
+        if unique <= CATEGORICAL_MAX_UNIQUE and unique <= CATEGORICAL_MAX_RATIO * max(len(chunk), 1):
+            result.append(col)
+    return result
+
+# ========== CONVERSION ==========
+
+ARROW_TYPES = {
+    "Int64": pa.int64(),
+    "float64": pa.float64(),
+    "boolean": pa.bool_(),
+    "datetime64[ns]": pa.timestamp("ns"),
+    "string": pa.large_string(),
+}
+
+def _write(chunks: Iterable[pd.DataFrame], dest: Path, overrides: Dict[str, str]) -> None:
+    tmp = dest.with_name(dest.name + ".tmp")
+    writer = None
+    try:
+        for chunk in chunks:
+            chunk = chunk.dropna(how="all")
+            if writer is None:
+                dtypes = {**_infer_dtypes(chunk), **overrides}
+                chunk = _coerce(chunk, dtypes)
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                meta = {"dtypes": dtypes, "categoricals": _categoricals(chunk, dtypes)}
+                # Fixed Arrow types, so all-null or drifting chunks still match; keep
+                # pandas metadata so nullable ints and booleans round-trip
+                schema = pa.schema(
+                    [pa.field(col, ARROW_TYPES[dtype]) for col, dtype in dtypes.items()],
+                    metadata={**(table.schema.metadata or {}), META_KEY: json.dumps(meta).encode()}
+                )
+                writer = pq.ParquetWriter(tmp, schema, compression="zstd")
+            else:
+                table = pa.Table.from_pandas(_coerce(chunk, dtypes), preserve_index=False)
+            writer.write_table(table.cast(schema))
+        if writer is None:
+            raise ValueError("File contains no data")
+        writer.close()
+        writer = None
+        tmp.replace(dest)
+    finally:
+        if writer is not None:
+            writer.close()
+        tmp.unlink(missing_ok=True)
+
+def _convert(chunks: Callable[[], Iterable[pd.DataFrame]], dest: Path, label: str) -> Path:
+    overrides: Dict[str, str] = {}
+    while True:
+        try:
+            _write(chunks(), dest, overrides)
+            return dest
+        except _SchemaDrift as e:
+            # Widen the column (int -> float, anything -> string) and convert again
+            print(f"[COLUMNAR] Widening {e.column} to {e.dtype} in {label}")
+            overrides[e.column] = e.dtype
+
+def _is_fresh(src: Path, dest: Path) -> bool:
+    return dest.exists() and dest.stat().st_mtime >= src.stat().st_mtime
+
+def convert_to_parquet(file_path, sheet: Optional[str] = None) -> Path:
+    """Convert an uploaded CSV/Excel file (or one sheet of it) to a typed Parquet copy and return its path."""
+    src = Path(file_path)
+    label = src.name if sheet is None else f"{src.name}[{sheet}]"
+    return _convert(lambda: read_source_chunks(src, sheet), columnar_path(src, sheet), label)
+
+def ensure_columnar(file_path, sheet: Optional[str] = None) -> Optional[Path]:
+    """Return an up-to-date Parquet copy, converting on first use. None if conversion fails."""
+    src = Path(file_path)
+    dest = columnar_path(src, sheet)
+    if _is_fresh(src, dest):
+        return dest
+    try:
+        return convert_to_parquet(src, sheet)
+    except Exception as e:
+        print(f"[COLUMNAR ERROR] {src.name}: {e}")
+        return None
+
+def ensure_workbook_columnar(file_path, sheets: List[str]) -> Dict[str, Optional[Path]]:
+    """Bring several sheets' Parquet copies up to date, opening the workbook once.
+
+    Sheets that already have a fresh copy are not parsed. A sheet whose
+    conversion fails maps to None, like ensure_columnar.
+    """
+    src = Path(file_path)
+    paths: Dict[str, Optional[Path]] = {}
+    stale = []
+    for sheet in sheets:
+        dest = columnar_path(src, sheet)
+        if _is_fresh(src, dest):
+            paths[sheet] = dest
+        else:
+            stale.append(sheet)
+    if not stale:
+        return paths
+
+    try:
+        with pd.ExcelFile(src) as book:
+            for sheet in stale:
+                try:
+                    frame = book.parse(sheet)
+                    paths[sheet] = _convert(lambda: [frame], columnar_path(src, sheet), f"{src.name}[{sheet}]")
+                except Exception as e:
+                    print(f"[COLUMNAR ERROR] {src.name}[{sheet}]: {e}")
+                    paths[sheet] = None
+    except Exception as e:
+        print(f"[COLUMNAR ERROR] {src.name}: {e}")
+        paths.update({sheet: None for sheet in stale})
+    return paths
+
+# ========== READING ==========
+
+def _meta(pf: pq.ParquetFile) -> Dict:
+    raw = (pf.schema_arrow.metadata or {}).get(META_KEY)
+    return json.loads(raw) if raw else {"dtypes": {}, "categoricals": []}
+
+def _open(path: Path, columns: Optional[List[str]] = None) -> pq.ParquetFile:
+    meta = _meta(pq.ParquetFile(path, memory_map=True))
+    categoricals = [c for c in meta["categoricals"] if columns is None or c in columns]
+    return pq.ParquetFile(path, memory_map=True, read_dictionary=categoricals)
+
+def read_columnar(path, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Read (a subset of columns of) a Parquet copy via memory mapping."""
+    return _open(Path(path), columns).read(columns=columns).to_pandas()
+
+def iter_columnar_chunks(path, columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+    """Yield a Parquet copy one row group at a time."""
+    pf = _open(Path(path), columns)
+    offset = 0
+    for i in range(pf.num_row_groups):
+        chunk = pf.read_row_group(i, columns=columns).to_pandas()
+        # Keep a global row index, as chunked read_csv does
+        chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+        offset += len(chunk)
+        yield chunk
+
+def load_dataframe(file_path, columns: Optional[List[str]] = None, sheet: Optional[str] = None) -> pd.DataFrame:
+    """Load an uploaded data file (or one of its sheets), preferring its columnar copy."""
+    columnar = ensure_columnar(file_path, sheet)
+    if columnar is not None:
+        return read_columnar(columnar, columns)
+    df = pd.concat(read_source_chunks(Path(file_path), sheet))
+    return df[columns] if columns else df
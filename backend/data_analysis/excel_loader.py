@@ -1,49 +1,61 @@
 """Excel and CSV data loader with pandas."""
 import pandas as pd
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
+from backend.config import DATA_SAMPLE_ROWS
+from backend.data_analysis.columnar import ensure_columnar, iter_columnar_chunks, read_source_chunks
+from backend.data_analysis.streaming_stats import TableProfiler
+from backend.data_analysis.timeseries import SeriesAccumulator
 
-def load_excel_or_csv(file_path: str) -> Dict[str, Any]:
-    """Load Excel or CSV file and return DataFrame with metadata."""
+def load_excel_or_csv(file_path: str, sheet: Optional[str] = None) -> Dict[str, Any]:
+    """Load Excel or CSV file and return a row sample, exact statistics and metadata.
+    
+    The whole file (or the named workbook sheet; the first one by default) is
+    scanned once in chunks. 'stats' covers every row; 'dataframe' is a uniform
+    sample of at most DATA_SAMPLE_ROWS rows in file order. 'series' holds
+    per-day aggregates for trend detection if the table has a date column.
+    """
     path = Path(file_path)
     
     try:
-        # Load based on extension
-        if path.suffix.lower() == '.csv':
-            df = pd.read_csv(file_path)
-        elif path.suffix.lower() in ['.xlsx', '.xls']:
-            # Read first sheet by default
-            df = pd.read_excel(file_path, sheet_name=0)
-        else:
-            raise ValueError(f"Unsupported file type: {path.suffix}")
+        # Prefer the typed, memory-mapped Parquet copy; reparse the source only if conversion fails
+        columnar = ensure_columnar(path, sheet)
+        chunks = iter_columnar_chunks(columnar) if columnar else read_source_chunks(path, sheet)
         
-        # Handle large datasets - sample if needed
-        original_rows = len(df)
-        if original_rows > 10000:
-            df = df.sample(n=10000, random_state=42)
-            sampled = True
-        else:
-            sampled = False
+        profiler = TableProfiler(sample_size=DATA_SAMPLE_ROWS)
+        series = None
+        for i, chunk in enumerate(chunks):
+            profiler.update(chunk)
+            if i == 0:
+                series = SeriesAccumulator.for_chunk(chunk)
+            if series is not None:
+                series.update(chunk)
+        profile = profiler.result()
         
-        # Clean data
-        df = df.dropna(how='all')  # Remove completely empty rows
-        df = df.dropna(axis=1, how='all')  # Remove completely empty columns
+        if profile['stats'] is None:
+            raise ValueError("File contains no data")
+        
+        df = profile['sample']
         
         # Get metadata
         metadata = {
             'filename': path.name,
-            'rows': len(df),
-            'original_rows': original_rows,
-            'sampled': sampled,
+            'sheet': sheet,
+            'rows': profile['rows'],
+            'original_rows': profile['rows_read'],
+            'sampled': len(df) < profile['rows'],
+            'sample_rows': len(df),
             'columns': df.columns.tolist(),
             'dtypes': {col: str(dtype) for col, dtype in df.dtypes.items()},
-            'shape': df.shape,
-            'preview': df.head(10).to_dict('records'),
-            'memory_usage': df.memory_usage(deep=True).sum() / 1024 / 1024  # MB
+            'shape': (profile['rows'], len(df.columns)),
+            'preview': profile['preview'].to_dict('records'),
+            'memory_usage': profile['memory_mb']  # MB, whole file
         }
         
         return {
             'dataframe': df,
+            'stats': profile['stats'],
+            'series': series.result() if series is not None else None,
             'metadata': metadata,
             'success': True
         }
@@ -51,35 +63,66 @@ def load_excel_or_csv(file_path: str) -> Dict[str, Any]:
     except Exception as e:
         return {
             'dataframe': None,
+            'stats': None,
+            'series': None,
             'metadata': None,
             'success': False,
             'error': str(e)
         }
 
-def get_column_info(df: pd.DataFrame) -> List[Dict]:
-    """Get detailed information about each column."""
+def get_column_info(df: pd.DataFrame, stats: Optional[Dict] = None) -> List[Dict]:
+    """Get detailed information about each column.
+    
+    When full-data `stats` from the loader are given, counts and numeric
+    summaries come from them rather than from the (possibly sampled) df.
+    """
     column_info = []
+    # Counts and numeric summaries for all columns at once, not column by column
+    null_counts = df.isna().sum()
+    unique_counts = df.nunique()
+    numeric = df.select_dtypes(include='number')
+    mins, maxs, means = numeric.min(), numeric.max(), numeric.mean()
     
     for col in df.columns:
+        non_null = len(df) - int(null_counts[col])
         info = {
             'name': col,
             'type': str(df[col].dtype),
-            'non_null': int(df[col].count()),
-            'null': int(df[col].isna().sum()),
-            'unique': int(df[col].nunique()),
+            'non_null': non_null,
+            'null': int(null_counts[col]),
+            'unique': int(unique_counts[col]),
             'sample_values': df[col].dropna().head(5).tolist()
         }
         
         # Add type-specific info
         if pd.api.types.is_numeric_dtype(df[col]):
             info['numeric'] = True
-            info['min'] = float(df[col].min()) if not df[col].isna().all() else None
-            info['max'] = float(df[col].max()) if not df[col].isna().all() else None
-            info['mean'] = float(df[col].mean()) if not df[col].isna().all() else None
+            if non_null == 0:
+                info['min'] = info['max'] = info['mean'] = None
+            elif col in numeric.columns:
+                info['min'] = float(mins[col])
+                info['max'] = float(maxs[col])
+                info['mean'] = float(means[col])
+            else:
+                # Boolean columns are numeric to pandas but left out of select_dtypes('number')
+                info['min'] = float(df[col].min())
+                info['max'] = float(df[col].max())
+                info['mean'] = float(df[col].mean())
         else:
             info['numeric'] = False
             info['categorical'] = True
         
+        if stats:
+            rows = stats['basic']['rows']
+            null = stats['missing_values']['by_column'].get(col, info['null'])
+            info['null'] = null
+            info['non_null'] = rows - null
+            if col in stats.get('numeric_stats', {}):
+                num = stats['numeric_stats'][col]
+                info['min'], info['max'], info['mean'] = num['min'], num['max'], num['mean']
+            if col in stats.get('categorical_stats', {}):
+                info['unique'] = stats['categorical_stats'][col]['unique']
+        
         column_info.append(info)
     
     return column_info
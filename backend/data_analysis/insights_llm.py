@@ -1,12 +1,11 @@
 """LLM-powered insights generation with grounding."""
-from groq import Groq
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import json
+from backend.llm_gateway import chat_completion, PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
+from backend.data_analysis import result_store
 
-def generate_llm_insights(stats: Dict[str, Any], groq_api_key: str, groq_model: str) -> str:
-    """Generate natural language insights using LLM with grounded statistics."""
-    
-    # Prepare grounded context from computed statistics
+def _insights_context(stats: Dict[str, Any], trends: Optional[Dict[str, Any]] = None) -> str:
+    """Grounded context for insights: the only part of the prompt that depends on the data."""
     context = f"""Dataset Statistics:
 - Total Rows: {stats['basic']['rows']}
 - Total Columns: {stats['basic']['columns']}
@@ -35,6 +34,29 @@ def generate_llm_insights(stats: Dict[str, Any], groq_api_key: str, groq_model:
     if stats.get('correlations'):
         context += "\nCorrelations: Available between numeric columns\n"
     
+    # Add time-series trends
+    if trends and trends.get('axis') == 'time' and trends.get('columns'):
+        context += f"\nTrends over {trends['date_column']} ({trends['periods']} {trends['grain']}s, {trends['start'][:10]} to {trends['end'][:10]}):\n"
+        for col, t in list(trends['columns'].items())[:5]:
+            context += f"- {col}: {t['direction']}, {t['percent_change']:+.1f}% over the period (R²={t['r2']:.2f})"
+            if t['seasonality']:
+                context += f", repeats every {t['seasonality']['period']} {t['seasonality']['unit']}s"
+            if t['change_point']:
+                cp = t['change_point']
+                context += f", level shift from {cp['mean_before']:.2f} to {cp['mean_after']:.2f} around {cp['at'][:10]}"
+            context += "\n"
+    
+    return context
+
+def memoized_llm_insights(stats: Dict[str, Any], groq_api_key: str, groq_model: str,
+                          trends: Optional[Dict[str, Any]] = None) -> str:
+    """Generate insights, reusing any earlier answer for the same context and model. Raises on LLM errors."""
+    context = _insights_context(stats, trends)
+    key = result_store.content_hash(f"llm_insights\0{groq_model}\0{context}".encode())
+    stored = result_store.get_by_hash(key)
+    if stored is not None:
+        return stored['text']
+    
     prompt = f"""You are a data analyst. Analyze the following dataset statistics and provide insights.
 
 {context}
@@ -47,20 +69,26 @@ Provide:
 
 IMPORTANT: Only use the statistics provided above. Do not invent numbers or facts."""
     
+    text = chat_completion(
+        [
+            {"role": "system", "content": "You are a data analyst who provides insights based strictly on provided statistics. Never fabricate data."},
+            {"role": "user", "content": prompt}
+        ],
+        mode="data_insights",
+        temperature=0.3,
+        max_tokens=600,
+        priority=PRIORITY_BACKGROUND,
+        api_key=groq_api_key,
+        model=groq_model
+    )
+    result_store.put(key, {'text': text})
+    return text
+
+def generate_llm_insights(stats: Dict[str, Any], groq_api_key: str, groq_model: str,
+                          trends: Optional[Dict[str, Any]] = None) -> str:
+    """Generate natural language insights using LLM with grounded statistics."""
     try:
-        client = Groq(api_key=groq_api_key)
-        completion = client.chat.completions.create(
-            model=groq_model,
-            messages=[
-                {"role": "system", "content": "You are a data analyst who provides insights based strictly on provided statistics. Never fabricate data."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,
-            max_tokens=600
-        )
-        
-        return completion.choices[0].message.content.strip()
-    
+        return memoized_llm_insights(stats, groq_api_key, groq_model, trends)
     except Exception as e:
         return f"Unable to generate insights: {str(e)}"
 
@@ -101,18 +129,111 @@ Rules:
 4. Do not invent or estimate values"""
     
     try:
-        client = Groq(api_key=groq_api_key)
-        completion = client.chat.completions.create(
-            model=groq_model,
-            messages=[
+        return chat_completion(
+            [
                 {"role": "system", "content": "You are a data analyst assistant. Answer questions using only provided statistics. Never fabricate data."},
                 {"role": "user", "content": prompt}
             ],
+            mode="data_question",
+            temperature=0.2,
+            max_tokens=400,
+            priority=PRIORITY_INTERACTIVE,
+            api_key=groq_api_key,
+            model=groq_model
+        )
+    
+    except Exception as e:
+        return f"Unable to answer question: {str(e)}"
+
+def _parse_json(text: str) -> Any:
+    """Parse a JSON object from an LLM reply, tolerating code fences and surrounding prose."""
+    start, end = text.find('{'), text.rfind('}')
+    if start == -1 or end < start:
+        raise ValueError("No JSON object in response")
+    return json.loads(text[start:end + 1])
+
+def plan_data_query(question: str, stats: Dict[str, Any], df_info: Dict, groq_api_key: str, groq_model: str) -> Optional[Dict]:
+    """Ask the LLM for a query plan answering the question; None if summary statistics suffice."""
+    
+    columns = []
+    for col, dtype in df_info.get('dtypes', {}).items():
+        line = f"- {col} ({dtype})"
+        top = stats.get('categorical_stats', {}).get(col, {}).get('top_values')
+        if top:
+            line += f", e.g. {', '.join(str(v) for v in list(top)[:5])}"
+        columns.append(line)
+    
+    prompt = f"""Translate the user's question about a table into a JSON query plan.
+
+Columns:
+{chr(10).join(columns)}
+
+Plan format (all keys optional):
+{{
+  "filters": [{{"column": "<col>", "op": "==|!=|<|<=|>|>=|in|not_in|between|contains|is_null|not_null", "value": <value or list>}}],
+  "group_by": ["<col>" or {{"column": "<date col>", "grain": "day|week|month|quarter|year"}}],
+  "aggregations": [{{"column": "<col or *>", "func": "count|sum|mean|median|min|max|std|nunique", "as": "<name>"}}],
+  "select": ["<col>"],
+  "sort": [{{"by": "<group column or aggregation name>", "desc": true}}],
+  "limit": <number>
+}}
+
+Use "select" (with filters, sort and limit) only to list individual rows.
+If the question is about the dataset as a whole and needs no computation (e.g. "how many columns are there"),
+reply with {{"plan": null}}.
+
+User Question: {question}
+
+Reply with the JSON only."""
+    
+    reply = chat_completion(
+        [
+            {"role": "system", "content": "You translate questions into JSON query plans. Use only the listed columns. Reply with JSON only."},
+            {"role": "user", "content": prompt}
+        ],
+        mode="data_query_plan",
+        temperature=0.0,
+        max_tokens=400,
+        priority=PRIORITY_INTERACTIVE,
+        api_key=groq_api_key,
+        model=groq_model
+    )
+    plan = _parse_json(reply)
+    if 'plan' in plan and len(plan) == 1:
+        plan = plan['plan']
+    return plan or None
+
+def phrase_query_result(question: str, plan: Dict, result: Dict, groq_api_key: str, groq_model: str) -> str:
+    """Answer the question in words from an executed query plan's result."""
+    
+    table = json.dumps(result['rows'], default=str)
+    prompt = f"""Answer the user's question using ONLY the query result below, computed from the full dataset.
+
+User Question: {question}
+
+Query plan: {json.dumps(plan)}
+Rows matching the filters: {result['matched_rows']}
+Result ({result['total_rows']} rows{', first ' + str(len(result['rows'])) + ' shown' if result['truncated'] else ''}):
+{table}
+
+Rules:
+1. Quote the numbers from the result; do not recompute or estimate them
+2. If the result is empty, say no rows matched
+3. Be concise"""
+    
+    try:
+        return chat_completion(
+            [
+                {"role": "system", "content": "You are a data analyst assistant. Answer using only the provided query result. Never fabricate data."},
+                {"role": "user", "content": prompt}
+            ],
+            mode="data_question",
             temperature=0.2,
-            max_tokens=400
+            max_tokens=400,
+            priority=PRIORITY_INTERACTIVE,
+            api_key=groq_api_key,
+            model=groq_model
         )
-        
-        return completion.choices[0].message.content.strip()
     
     except Exception as e:
         return f"Unable to answer question: {str(e)}"
@@ -0,0 +1,260 @@
+"""Restricted aggregation plans for answering data questions.
+
+The LLM turns a question into a small JSON plan instead of code:
+
+    {
+      "filters": [{"column": "region", "op": "==", "value": "West"}],
+      "group_by": ["region", {"column": "order_date", "grain": "month"}],
+      "aggregations": [{"column": "revenue", "func": "sum", "as": "total_revenue"}],
+      "select": [],
+      "sort": [{"by": "total_revenue", "desc": true}],
+      "limit": 10
+    }
+
+validate_plan() checks it against the file's columns and types, and
+execute_plan() runs it with vectorized pandas over only the referenced
+columns of the Parquet copy. Nothing from the plan is ever evaluated.
+"""
+import json
+import warnings
+from typing import Any, Dict, List, Optional
+import pandas as pd
+from backend.config import DATA_QUERY_DEFAULT_LIMIT, DATA_QUERY_MAX_ROWS
+from backend.data_analysis.columnar import load_dataframe
+
+FILTER_OPS = ['==', '!=', '<', '<=', '>', '>=', 'in', 'not_in', 'between', 'contains', 'is_null', 'not_null']
+AGG_FUNCS = ['count', 'sum', 'mean', 'median', 'min', 'max', 'std', 'nunique']
+NUMERIC_FUNCS = ['sum', 'mean', 'median', 'std']
+GRAINS = {'day': 'D', 'week': 'W', 'month': 'M', 'quarter': 'Q', 'year': 'Y'}
+
+class QueryPlanError(ValueError):
+    """The plan is malformed or refers to columns/operations the data doesn't support."""
+
+def _kind(dtype: str) -> str:
+    dtype = dtype.lower()
+    if dtype.startswith(('int', 'uint', 'float')):
+        return 'numeric'
+    if dtype.startswith('bool'):
+        return 'boolean'
+    if dtype.startswith('datetime'):
+        return 'datetime'
+    return 'text'
+
+# ========== VALIDATION ==========
+
+def _column(name: Any, dtypes: Dict[str, str], where: str) -> str:
+    if not isinstance(name, str) or name not in dtypes:
+        raise QueryPlanError(f"Unknown column in {where}: {name!r}")
+    return name
+
+def validate_plan(plan: Dict[str, Any], dtypes: Dict[str, str]) -> Dict[str, Any]:
+    """Return a normalized copy of the plan, or raise QueryPlanError."""
+    if not isinstance(plan, dict):
+        raise QueryPlanError("Plan must be a JSON object")
+    
+    filters = []
+    for f in plan.get('filters') or []:
+        col = _column(f.get('column'), dtypes, 'filters')
+        op = f.get('op')
+        if op not in FILTER_OPS:
+            raise QueryPlanError(f"Unsupported filter operator: {op!r}")
+        value = f.get('value')
+        if op in ('in', 'not_in') and not isinstance(value, list):
+            raise QueryPlanError(f"'{op}' needs a list value")
+        if op == 'between' and not (isinstance(value, list) and len(value) == 2):
+            raise QueryPlanError("'between' needs a [low, high] value")
+        filters.append({'column': col, 'op': op, 'value': value})
+    
+    group_by = []
+    for g in plan.get('group_by') or []:
+        if isinstance(g, str):
+            g = {'column': g}
+        col = _column(g.get('column'), dtypes, 'group_by')
+        grain = g.get('grain')
+        if grain is not None:
+            if grain not in GRAINS:
+                raise QueryPlanError(f"Unsupported time grain: {grain!r}")
+            if _kind(dtypes[col]) != 'datetime':
+                raise QueryPlanError(f"Time grain needs a date column, {col} is {dtypes[col]}")
+        group_by.append({'column': col, 'grain': grain})
+    
+    aggregations = []
+    for a in plan.get('aggregations') or []:
+        func = a.get('func')
+        if func not in AGG_FUNCS:
+            raise QueryPlanError(f"Unsupported aggregation: {func!r}")
+        col = a.get('column') or '*'
+        if col == '*':
+            if func != 'count':
+                raise QueryPlanError(f"'{func}' needs a column")
+        else:
+            _column(col, dtypes, 'aggregations')
+            if func in NUMERIC_FUNCS and _kind(dtypes[col]) not in ('numeric', 'boolean'):
+                raise QueryPlanError(f"'{func}' needs a numeric column, {col} is {dtypes[col]}")
+        alias = a.get('as') or (f"{func}_{col}" if col != '*' else 'count')
+        aggregations.append({'column': col, 'func': func, 'as': str(alias)})
+    
+    select = [_column(c, dtypes, 'select') for c in plan.get('select') or []]
+    if not aggregations and not group_by and not select:
+        raise QueryPlanError("Plan has no aggregations, group_by or select")
+    
+    outputs = ([g['column'] for g in group_by] + [a['as'] for a in aggregations]) if (aggregations or group_by) else select
+    if not aggregations and group_by:
+        outputs.append('count')
+    duplicates = sorted({name for name in outputs if outputs.count(name) > 1})
+    if duplicates:
+        raise QueryPlanError(f"Duplicate result columns: {', '.join(duplicates)} (give aggregations distinct 'as' names)")
+    sort = []
+    for s in plan.get('sort') or []:
+        if isinstance(s, str):
+            s = {'by': s}
+        if s.get('by') not in outputs:
+            raise QueryPlanError(f"Sort column must be in the result: {s.get('by')!r}")
+        sort.append({'by': s['by'], 'desc': bool(s.get('desc', False))})
+    
+    try:
+        limit = int(plan.get('limit') or DATA_QUERY_DEFAULT_LIMIT)
+    except (TypeError, ValueError):
+        raise QueryPlanError(f"Invalid limit: {plan.get('limit')!r}")
+    
+    return {
+        'filters': filters,
+        'group_by': group_by,
+        'aggregations': aggregations,
+        'select': select,
+        'sort': sort,
+        'limit': max(1, min(limit, DATA_QUERY_MAX_ROWS))
+    }
+
+def plan_columns(plan: Dict[str, Any]) -> List[str]:
+    """Columns a validated plan reads, so only those are loaded."""
+    columns = [f['column'] for f in plan['filters']]
+    columns += [g['column'] for g in plan['group_by']]
+    columns += [a['column'] for a in plan['aggregations'] if a['column'] != '*']
+    columns += plan['select']
+    return list(dict.fromkeys(columns))
+
+def canonical(plan: Dict[str, Any]) -> str:
+    """Stable text form of a validated plan, used as its cache key."""
+    return json.dumps(plan, sort_keys=True, default=str)
+
+# ========== EXECUTION ==========
+
+def _coerce_value(value: Any, kind: str) -> Any:
+    if kind == 'datetime':
+        return pd.Timestamp(value)
+    if kind == 'numeric':
+        return float(value)
+    return value
+
+def _mask(df: pd.DataFrame, f: Dict[str, Any], kind: str) -> pd.Series:
+    s = df[f['column']]
+    op, value = f['op'], f['value']
+    if op == 'is_null':
+        return s.isna()
+    if op == 'not_null':
+        return s.notna()
+    
+    if kind == 'text':
+        # Text matches are case-insensitive; the LLM rarely knows the exact casing
+        s = s.astype('string').str.casefold()
+        fold = lambda v: str(v).casefold()
+        if op == 'contains':
+            return s.str.contains(fold(value), regex=False).fillna(False).astype(bool)
+        if op in ('in', 'not_in'):
+            mask = s.isin([fold(v) for v in value]).fillna(False).astype(bool)
+            return mask if op == 'in' else ~mask & s.notna()
+        value = [fold(v) for v in value] if op == 'between' else fold(value)
+    else:
+        if op == 'contains':
+            raise QueryPlanError(f"'contains' needs a text column, {f['column']} is not")
+        try:
+            if op in ('in', 'not_in', 'between'):
+                value = [_coerce_value(v, kind) for v in value]
+            else:
+                value = _coerce_value(value, kind)
+        except (TypeError, ValueError) as e:
+            raise QueryPlanError(f"Bad value for {f['column']}: {e}")
+        if op in ('in', 'not_in'):
+            mask = s.isin(value)
+            return mask if op == 'in' else ~mask & s.notna()
+    
+    if op == 'between':
+        mask = (s >= value[0]) & (s <= value[1])
+    else:
+        mask = {
+            '==': lambda: s == value, '!=': lambda: s != value,
+            '<': lambda: s < value, '<=': lambda: s <= value,
+            '>': lambda: s > value, '>=': lambda: s >= value
+        }[op]()
+    return mask.fillna(False).astype(bool)
+
+def _group_keys(df: pd.DataFrame, group_by: List[Dict[str, Any]]) -> List[pd.Series]:
+    keys = []
+    for g in group_by:
+        s = df[g['column']]
+        if g['grain']:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")  # to_period drops timezone info
+                s = s.dt.to_period(GRAINS[g['grain']]).astype(str).where(s.notna())
+        keys.append(s.rename(g['column']))
+    return keys
+
+def _aggregate(series: pd.Series, func: str) -> Any:
+    if func == 'count':
+        return series.count()
+    if pd.api.types.is_bool_dtype(series) and func in NUMERIC_FUNCS:
+        series = series.astype(float)
+    return getattr(series, func)()
+
+def execute_plan(plan: Dict[str, Any], df: pd.DataFrame, dtypes: Dict[str, str]) -> Dict[str, Any]:
+    """Run a validated plan and return {'columns', 'rows', 'total_rows', 'truncated', 'matched_rows'}."""
+    mask = pd.Series(True, index=df.index)
+    for f in plan['filters']:
+        mask &= _mask(df, f, _kind(dtypes[f['column']]))
+    df = df[mask]
+    
+    aggs, group_by = plan['aggregations'], plan['group_by']
+    if group_by:
+        keys = _group_keys(df, group_by)
+        parts = {}
+        for a in aggs:
+            if a['column'] == '*':
+                parts[a['as']] = df.groupby(keys, observed=True).size()
+            else:
+                col = df[a['column']]
+                if pd.api.types.is_bool_dtype(col) and a['func'] in NUMERIC_FUNCS:
+                    col = col.astype(float)
+                parts[a['as']] = getattr(col.groupby(keys, observed=True), a['func'])()
+        if not aggs:
+            parts['count'] = df.groupby(keys, observed=True).size()
+        result = pd.DataFrame(parts).reset_index()
+    elif aggs:
+        result = pd.DataFrame([{
+            a['as']: len(df) if a['column'] == '*' else _aggregate(df[a['column']], a['func'])
+            for a in aggs
+        }])
+    else:
+        result = df[plan['select']]
+    
+    if plan['sort']:
+        result = result.sort_values([s['by'] for s in plan['sort']],
+                                    ascending=[not s['desc'] for s in plan['sort']],
+                                    kind='stable')
+    total = len(result)
+    result = result.head(plan['limit'])
+    # Plain Python values for JSON; NaN/NaT become None
+    result = result.astype(object).where(result.notna(), None)
+    
+    return {
+        'columns': [str(c) for c in result.columns],
+        'rows': result.to_dict('records'),
+        'total_rows': total,
+        'truncated': total > len(result),
+        'matched_rows': int(mask.sum())
+    }
+
+def run_plan(plan: Dict[str, Any], file_path: str, sheet: Optional[str], dtypes: Dict[str, str]) -> Dict[str, Any]:
+    """Load just the plan's columns from the file's columnar copy and execute it."""
+    df = load_dataframe(file_path, columns=plan_columns(plan), sheet=sheet)
+    return execute_plan(plan, df, dtypes)
@@ -0,0 +1,267 @@
+"""Bounded, persistent storage for data analysis results.
+
+Results are keyed by a hash of the uploaded file's content, kept in a
+per-process LRU with a byte budget and spilled to gzipped JSON on disk so
+they survive restarts and are shared between uvicorn workers. A small
+index file maps each (user, filename) to the content hash it last held.
+
+The disk side is a cache too: past ANALYSIS_DISK_MAX_BYTES, the results
+least recently read or written (by file mtime) are pruned. Entries stored
+with pinned=True, such as PDF parents, live in their own directory and are
+never pruned.
+
+Markers (put_marker/get_marker) are small records that change in place,
+such as what a source currently has indexed. They are never pruned and
+never cached in memory: every read goes to disk, so a worker can't act on
+a marker another worker has since rewritten.
+
+For workbooks, the entry under the content hash is the default sheet's
+result and lists every sheet; other sheets live under sheet_key(). Sections
+built in the background (charts, LLM insights) are stored separately under
+section_key(), and data question results under query_key().
+"""
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+from backend.config import ANALYSIS_CACHE_DIR, ANALYSIS_CACHE_MAX_BYTES, ANALYSIS_DISK_MAX_BYTES
+
+RESULTS_DIR = Path(ANALYSIS_CACHE_DIR) / "results"
+PINNED_DIR = Path(ANALYSIS_CACHE_DIR) / "pinned"
+INDEX_DIR = Path(ANALYSIS_CACHE_DIR) / "index"
+MARKERS_DIR = Path(ANALYSIS_CACHE_DIR) / "markers"
+RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+PINNED_DIR.mkdir(parents=True, exist_ok=True)
+MARKERS_DIR.mkdir(parents=True, exist_ok=True)
+INDEX_DIR.mkdir(parents=True, exist_ok=True)
+
+PRUNE_EVERY_BYTES = ANALYSIS_DISK_MAX_BYTES // 20  # Sweep the results directory after writing this much
+TOUCH_EVERY_SECONDS = 3600  # How often a result served from memory refreshes its file's mtime
+STALE_TMP_SECONDS = 3600  # Temp files older than this were left by a crashed write
+
+_lock = threading.Lock()
+_memory: "OrderedDict[str, list]" = OrderedDict()  # content hash -> [result, nbytes, last touched]
+_memory_bytes = 0
+_prune_lock = threading.Lock()
+_written = PRUNE_EVERY_BYTES  # So the first write of a run sweeps what earlier runs left
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def sheet_key(digest: str, sheet: str) -> str:
+    return content_hash(f"{digest}\0{sheet}".encode())
+
+def section_key(digest: str, sheet: Optional[str], section: str) -> str:
+    return content_hash(f"{digest}\0{section}\0{sheet or ''}".encode())
+
+def query_key(digest: str, sheet: Optional[str], plan: str) -> str:
+    return content_hash(f"{digest}\0query\0{sheet or ''}\0{plan}".encode())
+
+def _json_default(value: Any) -> Any:
+    # numpy scalars and arrays, without importing numpy here
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    # Write to a temp file in the same directory, then rename: readers in other
+    # workers only ever see a complete file.
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except Exception:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+def _index_file(username: str, filename: str) -> Path:
+    return INDEX_DIR / f"{hashlib.md5(f'{username}/{filename}'.encode()).hexdigest()}.json"
+
+def _result_file(digest: str, pinned: bool = False) -> Path:
+    return (PINNED_DIR if pinned else RESULTS_DIR) / f"{digest}.json.gz"
+
+def _touch(path: Path) -> None:
+    try:
+        os.utime(path)
+    except OSError:
+        pass  # Pruned meanwhile or pinned; either way nothing to keep fresh
+
+def _remember(digest: str, result: Dict, nbytes: int) -> None:
+    global _memory_bytes
+    with _lock:
+        if digest in _memory:
+            _memory_bytes -= _memory.pop(digest)[1]
+        _memory[digest] = [result, nbytes, time.time()]
+        _memory_bytes += nbytes
+        # Evict least recently used; everything evicted is already on disk
+        while _memory_bytes > ANALYSIS_CACHE_MAX_BYTES and len(_memory) > 1:
+            _, (_, evicted, _) = _memory.popitem(last=False)
+            _memory_bytes -= evicted
+
+def _prune() -> None:
+    """Delete the least recently used results until the directory is back under its disk budget."""
+    now = time.time()
+    files, total = [], 0
+    for entry in os.scandir(RESULTS_DIR):
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        if entry.name.startswith(".tmp-"):
+            if now - stat.st_mtime > STALE_TMP_SECONDS:
+                Path(entry.path).unlink(missing_ok=True)
+            continue
+        files.append((stat.st_mtime, stat.st_size, entry.name, entry.path))
+        total += stat.st_size
+    if total <= ANALYSIS_DISK_MAX_BYTES:
+        return
+
+    with _lock:
+        hot = set(_memory)
+    target, removed = ANALYSIS_DISK_MAX_BYTES * 0.9, 0  # Some headroom, so the next writes don't sweep again
+    for _, size, name, path in sorted(files):
+        if total <= target:
+            break
+        if name.split(".", 1)[0] in hot:
+            continue
+        Path(path).unlink(missing_ok=True)
+        total -= size
+        removed += 1
+    print(f"[ANALYSIS STORE] Pruned {removed} results, {total / 1024 / 1024:.0f} MB left on disk")
+
+def _wrote(nbytes: int) -> None:
+    global _written
+    with _prune_lock:
+        _written += nbytes
+        if _written < PRUNE_EVERY_BYTES:
+            return
+        _written = 0
+        try:
+            _prune()
+        except OSError as e:
+            print(f"[ANALYSIS STORE] Could not prune results: {e}")
+
+# ========== PUBLIC API ==========
+
+def get_by_hash(digest: str) -> Optional[Dict]:
+    """Return a stored result, reloading it from disk on a memory miss."""
+    with _lock:
+        entry = _memory.get(digest)
+        if entry is not None:
+            _memory.move_to_end(digest)
+            touch = time.time() - entry[2] > TOUCH_EVERY_SECONDS
+            if touch:
+                entry[2] = time.time()
+    if entry is not None:
+        if touch:
+            # Other workers prune by mtime and can't see this worker's memory
+            _touch(_result_file(digest))
+        return entry[0]
+
+    path = _result_file(digest)
+    if not path.exists():
+        path = _result_file(digest, pinned=True)
+        if not path.exists():
+            return None
+    try:
+        raw = gzip.decompress(path.read_bytes())
+        result = json.loads(raw)
+    except Exception as e:
+        print(f"[ANALYSIS STORE] Unreadable result {path.name}: {e}")
+        return None
+
+    _touch(path)
+    _remember(digest, result, len(raw))
+    return result
+
+def put(digest: str, result: Dict, pinned: bool = False) -> Dict:
+    """Store a result under a content hash and return its JSON-normalized form.
+
+    Pinned results are kept on disk whatever the budget; use it for anything
+    that can't be rebuilt from the uploaded file on a miss.
+    """
+    raw = json.dumps(result, default=_json_default).encode()
+    data = gzip.compress(raw, compresslevel=6)
+    _atomic_write(_result_file(digest, pinned), data)
+    if pinned:
+        _result_file(digest).unlink(missing_ok=True)  # An unpinned copy would be read first
+    else:
+        _wrote(len(data))
+    normalized = json.loads(raw)
+    _remember(digest, normalized, len(raw))
+    return normalized
+
+def put_if_absent(digest: str, result: Dict) -> Optional[Dict]:
+    """Store a result only if nothing is stored under `digest` yet, across workers too.
+
+    Returns its JSON-normalized form, or None if another writer got there first.
+    """
+    raw = json.dumps(result, default=_json_default).encode()
+    path = _result_file(digest)
+    with _lock:  # Threads of this worker; the hard link below settles it between workers
+        if digest in _memory:
+            return None
+        data = gzip.compress(raw, compresslevel=6)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            # Linking fails if the name exists, and publishes a complete file if it doesn't
+            os.link(tmp, path)
+        except FileExistsError:
+            return None
+        finally:
+            Path(tmp).unlink(missing_ok=True)
+    _wrote(len(data))
+    normalized = json.loads(raw)
+    _remember(digest, normalized, len(raw))
+    return normalized
+
+def get_marker(key: str) -> Optional[Dict]:
+    """Return a marker as last written by any worker, or None."""
+    path = MARKERS_DIR / f"{key}.json"
+    try:
+        return json.loads(path.read_bytes())
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"[ANALYSIS STORE] Unreadable marker {path.name}: {e}")
+        return None
+
+def put_marker(key: str, value: Dict) -> None:
+    _atomic_write(MARKERS_DIR / f"{key}.json", json.dumps(value, default=_json_default).encode())
+
+def link(username: str, filename: str, digest: str) -> None:
+    """Point a user's file at a stored result."""
+    _atomic_write(_index_file(username, filename), json.dumps({"filename": filename, "hash": digest}).encode())
+
+def lookup_hash(username: str, filename: str) -> Optional[str]:
+    path = _index_file(username, filename)
+    if not path.exists():
+        return None
+    try:
+        return json.loads(path.read_text())["hash"]
+    except Exception:
+        return None
+
+def get_sheet(digest: str, sheet: Optional[str] = None) -> Optional[Dict]:
+    """Return one sheet's result (the default sheet if none is named), or None if not analyzed yet."""
+    result = get_by_hash(digest)
+    if result is None or sheet is None or sheet == result.get('sheet'):
+        return result
+    return get_by_hash(sheet_key(digest, sheet))
+
+def get(username: str, filename: str, sheet: Optional[str] = None) -> Optional[Dict]:
+    """Return the analysis for a user's file (or one of its sheets), or None if it has never been analyzed."""
+    digest = lookup_hash(username, filename)
+    return get_sheet(digest, sheet) if digest else None
@@ -0,0 +1,313 @@
+"""One-pass, bounded-memory statistics for large tables.
+
+Tables are fed chunk by chunk into a TableProfiler, which keeps:
+- exact counts, missing values, min/max and mean/variance (Welford/Chan merge)
+- exact pairwise Pearson correlations from running cross-products
+- approximate quantiles (merging t-digest)
+- approximate top-k categorical counts (Misra-Gries) and distinct counts (KMV)
+- a uniform reservoir sample of rows for charts and previews
+"""
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional
+
+# ========== SKETCHES ==========
+
+class TDigest:
+    """Merging t-digest with vectorized compression."""
+
+    def __init__(self, compression: int = 200):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values: np.ndarray) -> None:
+        if len(values) == 0:
+            return
+        self.count += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+        means = np.concatenate([self.means, values])
+        weights = np.concatenate([self.weights, np.ones(len(values))])
+        order = np.argsort(means, kind="mergesort")
+        means, weights = means[order], weights[order]
+
+        # Group adjacent points by the arcsine scale function: small clusters
+        # at the tails, large ones near the median, at most `compression` total
+        cum = np.cumsum(weights)
+        q = (cum - weights / 2) / cum[-1]
+        k = np.floor(self.compression * (np.arcsin(2 * q - 1) / np.pi + 0.5))
+        starts = np.flatnonzero(np.r_[True, k[1:] != k[:-1]])
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    def _curve(self):
+        cum = np.cumsum(self.weights)
+        positions = np.r_[0.0, cum - self.weights / 2, cum[-1]]
+        values = np.r_[self.min, self.means, self.max]
+        return positions, values
+
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            return float("nan")
+        if len(self.means) == self.count:
+            # Still uncompressed: match pandas' linear interpolation exactly
+            return float(np.quantile(self.means, q))
+        positions, values = self._curve()
+        return float(np.interp(q * self.count, positions, values))
+
+    def cdf(self, x: float) -> float:
+        if self.count == 0:
+            return float("nan")
+        positions, values = self._curve()
+        return float(np.interp(x, values, positions) / self.count)
+
+
+class HeavyHitters:
+    """Misra-Gries top-k counter; exact while distinct values fit in `capacity`."""
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity = capacity
+        self.counts = pd.Series(dtype="float64")
+        self.error = 0  # Upper bound on how much any count may be underestimated
+
+    def update(self, values: pd.Series) -> None:
+        counts = values.value_counts(dropna=True)
+        if counts.empty:
+            return
+        merged = self.counts.add(counts, fill_value=0)
+        if len(merged) > self.capacity:
+            cutoff = merged.nlargest(self.capacity + 1).iloc[-1]
+            merged = merged - cutoff
+            merged = merged[merged > 0]
+            self.error += cutoff
+        self.counts = merged
+
+    def top(self, n: int) -> Dict:
+        return {k: int(v) for k, v in self.counts.nlargest(n).items()}
+
+
+class DistinctCounter:
+    """K-minimum-values distinct count estimate; exact below `k` distinct values."""
+
+    def __init__(self, k: int = 4096):
+        self.k = k
+        self.hashes = np.empty(0, dtype=np.uint64)
+
+    def update(self, values: pd.Series) -> None:
+        values = values.dropna()
+        if values.empty:
+            return
+        hashes = pd.util.hash_pandas_object(values, index=False).to_numpy()
+        self.hashes = np.unique(np.concatenate([self.hashes, hashes]))[:self.k]
+
+    def estimate(self) -> int:
+        if len(self.hashes) < self.k:
+            return len(self.hashes)
+        return int((self.k - 1) * 2.0 ** 64 / float(self.hashes[-1]))
+
+# ========== TABLE PROFILER ==========
+
+class TableProfiler:
+    """Accumulate statistics over a table delivered in chunks."""
+
+    def __init__(self, sample_size: int = 10000, seed: int = 42, max_categorical: int = 5):
+        self.sample_size = sample_size
+        self.max_categorical = max_categorical
+        self.rng = np.random.default_rng(seed)
+        self.columns: Optional[List[str]] = None
+        self.numeric_cols: List[str] = []
+        self.categorical_cols: List[str] = []
+        self.rows = 0
+        self.rows_read = 0
+        self.memory_bytes = 0
+        self.preview: Optional[pd.DataFrame] = None
+        self.sample: Optional[pd.DataFrame] = None
+        self.sample_keys = np.empty(0)
+
+    def _init_columns(self, chunk: pd.DataFrame) -> None:
+        self.columns = chunk.columns.tolist()
+        self.numeric_cols = chunk.select_dtypes(include=[np.number]).columns.tolist()
+        self.categorical_cols = chunk.select_dtypes(include=["object", "category"]).columns.tolist()
+        self.missing = pd.Series(0, index=self.columns, dtype="int64")
+
+        p = len(self.numeric_cols)
+        self.n = np.zeros(p)
+        self.mean = np.zeros(p)
+        self.m2 = np.zeros(p)
+        self.min = np.full(p, np.inf)
+        self.max = np.full(p, -np.inf)
+        self.digests = [TDigest() for _ in range(p)]
+        # Cross-products are accumulated around a shift to limit cancellation
+        self.shift = np.nan_to_num(chunk[self.numeric_cols].mean().to_numpy(dtype=float)) if p else np.zeros(0)
+        self.pair_n = np.zeros((p, p))
+        self.pair_sx = np.zeros((p, p))
+        self.pair_sxx = np.zeros((p, p))
+        self.pair_sxy = np.zeros((p, p))
+
+        self.heavy = {col: HeavyHitters() for col in self.categorical_cols}
+        self.distinct = {col: DistinctCounter() for col in self.categorical_cols}
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        self.rows_read += len(chunk)
+        chunk = chunk.dropna(how="all")
+        if chunk.empty:
+            return
+        if self.columns is None:
+            self._init_columns(chunk)
+            self.preview = chunk.head(10)
+
+        self.rows += len(chunk)
+        self.memory_bytes += int(chunk.memory_usage(deep=True).sum())
+        self.missing += chunk.isna().sum().reindex(self.columns, fill_value=0)
+
+        if self.numeric_cols:
+            # Later chunks may infer a different dtype; coerce to the first chunk's schema
+            numeric = chunk[self.numeric_cols].apply(pd.to_numeric, errors="coerce")
+            self._update_numeric(numeric.to_numpy(dtype=float, na_value=np.nan))
+
+        for col in self.categorical_cols:
+            values = chunk[col].astype(str).where(chunk[col].notna())
+            self.heavy[col].update(values)
+            self.distinct[col].update(values)
+
+        self._update_sample(chunk)
+
+    def _update_numeric(self, X: np.ndarray) -> None:
+        mask = ~np.isnan(X)
+        cnt = mask.sum(axis=0).astype(float)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            chunk_mean = np.where(cnt > 0, np.nansum(X, axis=0) / cnt, 0.0)
+            chunk_m2 = np.nansum((X - chunk_mean) ** 2, axis=0)
+            total = self.n + cnt
+            delta = chunk_mean - self.mean
+            self.mean = np.where(total > 0, self.mean + delta * cnt / total, 0.0)
+            self.m2 = self.m2 + chunk_m2 + np.where(total > 0, delta ** 2 * self.n * cnt / total, 0.0)
+        self.n = total
+        self.min = np.fmin(self.min, np.where(cnt > 0, np.nanmin(np.where(mask, X, np.inf), axis=0), np.inf))
+        self.max = np.fmax(self.max, np.where(cnt > 0, np.nanmax(np.where(mask, X, -np.inf), axis=0), -np.inf))
+
+        for i, digest in enumerate(self.digests):
+            digest.update(X[mask[:, i], i])
+
+        X0 = np.where(mask, X - self.shift, 0.0)
+        M = mask.astype(float)
+        self.pair_n += M.T @ M
+        self.pair_sx += X0.T @ M
+        self.pair_sxx += (X0 ** 2).T @ M
+        self.pair_sxy += X0.T @ X0
+
+    def _update_sample(self, chunk: pd.DataFrame) -> None:
+        # Bottom-k sampling: every row gets a uniform key, keep the k smallest
+        keys = self.rng.random(len(chunk))
+        if self.sample is not None and len(self.sample_keys) >= self.sample_size:
+            keep = keys < self.sample_keys.max()
+            chunk, keys = chunk[keep], keys[keep]
+            if chunk.empty:
+                return
+        sample = chunk if self.sample is None else pd.concat([self.sample, chunk])
+        all_keys = np.concatenate([self.sample_keys, keys])
+        if len(all_keys) > self.sample_size:
+            idx = np.argpartition(all_keys, self.sample_size)[:self.sample_size]
+            sample, all_keys = sample.iloc[idx], all_keys[idx]
+        self.sample, self.sample_keys = sample, all_keys
+
+    def correlations(self) -> Optional[pd.DataFrame]:
+        if len(self.numeric_cols) < 2:
+            return None
+        n, sx, sxy = self.pair_n, self.pair_sx, self.pair_sxy
+        sy, syy = sx.T, self.pair_sxx.T
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cov = n * sxy - sx * sy
+            var_x = n * self.pair_sxx - sx ** 2
+            var_y = n * syy - sy ** 2
+            corr = cov / np.sqrt(var_x * var_y)
+        corr = np.clip(corr, -1.0, 1.0)
+        corr[n < 2] = np.nan
+        return pd.DataFrame(corr, index=self.numeric_cols, columns=self.numeric_cols)
+
+    def result(self) -> Dict[str, Any]:
+        """Return {'stats', 'sample', 'preview', 'rows', 'rows_read', 'memory_mb'}."""
+        if self.columns is None:
+            return {"stats": None, "sample": pd.DataFrame(), "preview": pd.DataFrame(),
+                    "rows": 0, "rows_read": self.rows_read, "memory_mb": 0.0}
+
+        # Drop columns that were empty in every chunk, as the eager loader did
+        empty = set(self.missing[self.missing >= self.rows].index)
+        columns = [c for c in self.columns if c not in empty]
+        num_idx = [i for i, c in enumerate(self.numeric_cols) if c not in empty]
+        numeric_cols = [self.numeric_cols[i] for i in num_idx]
+        categorical_cols = [c for c in self.categorical_cols if c not in empty]
+
+        sample = self.sample.drop(columns=list(empty)).sort_index()
+        missing = self.missing[columns]
+
+        stats = {
+            "basic": {
+                "rows": self.rows,
+                "columns": len(columns),
+                "total_cells": self.rows * len(columns),
+                "memory_mb": self.memory_bytes / 1024 / 1024
+            },
+            "missing_values": {
+                "total": int(missing.sum()),
+                "by_column": {col: int(v) for col, v in missing.items()}
+            },
+            "numeric_stats": {},
+            "categorical_stats": {},
+            "correlations": None,
+            "outliers": {},
+            "trends": {},
+            "approximate": ["quantiles", "outliers.count", "categorical_stats.unique"]
+        }
+
+        for i in num_idx:
+            col, digest = self.numeric_cols[i], self.digests[i]
+            n = self.n[i]
+            q1, q2, q3 = (digest.quantile(q) for q in (0.25, 0.5, 0.75))
+            stats["numeric_stats"][col] = {
+                "count": float(n),
+                "mean": float(self.mean[i]),
+                "std": float(np.sqrt(self.m2[i] / (n - 1))) if n > 1 else float("nan"),
+                "min": float(self.min[i]),
+                "25%": q1,
+                "50%": q2,
+                "75%": q3,
+                "max": float(self.max[i])
+            }
+
+            iqr = q3 - q1
+            low, high = q1 - 1.5 * iqr, q3 + 1.5 * iqr
+            if self.min[i] < low or self.max[i] > high:
+                count = int(round(n * (digest.cdf(low) + 1 - digest.cdf(high))))
+                values = sample[col][(sample[col] < low) | (sample[col] > high)]
+                if count > 0 or len(values) > 0:
+                    stats["outliers"][col] = {
+                        "count": max(count, len(values)),
+                        "values": values.head(10).tolist()
+                    }
+
+        corr = self.correlations()
+        if corr is not None and len(numeric_cols) > 1:
+            stats["correlations"] = corr.loc[numeric_cols, numeric_cols].to_dict()
+
+        for col in categorical_cols[:self.max_categorical]:
+            top = self.heavy[col].top(10)
+            stats["categorical_stats"][col] = {
+                "unique": self.distinct[col].estimate(),
+                "top_values": top,
+                "mode": next(iter(top), None)
+            }
+
+        return {
+            "stats": stats,
+            "sample": sample,
+            "preview": self.preview.drop(columns=list(empty)),
+            "rows": self.rows,
+            "rows_read": self.rows_read,
+            "memory_mb": self.memory_bytes / 1024 / 1024
+        }
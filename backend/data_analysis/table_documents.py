@@ -0,0 +1,209 @@
+"""Text documents describing an analysed table, for the RAG vector store.
+
+A sheet becomes a bounded set of retrievable units built from its stored
+analysis and its Parquet copy, never one document per row:
+- table_profile: shape, columns and types, headline insights and trends
+- table_column: one per column, with its statistics
+- table_segment: aggregates over contiguous row ranges (at most
+  TABLE_INDEX_MAX_SEGMENTS, whatever the row count)
+- table_rows: the rows themselves, only for small sheets
+
+Each document is {"key", "type", "text"}; the key is stable for a given
+sheet so re-indexing overwrites the same points.
+"""
+import math
+from typing import Any, Dict, Iterator, List, Optional
+import numpy as np
+import pandas as pd
+from backend.config import (
+    TABLE_INDEX_MAX_SEGMENTS, TABLE_INDEX_SEGMENT_COLS, TABLE_INDEX_MAX_COLUMN_DOCS,
+    TABLE_INDEX_ROW_DOCS_MAX_ROWS, TABLE_INDEX_ROWS_PER_DOC
+)
+from backend.data_analysis.columnar import ensure_columnar, iter_columnar_chunks, read_columnar
+
+DOCUMENT_TYPES = ['table_profile', 'table_column', 'table_segment', 'table_rows']
+SEGMENT_MAX_UNIQUE = 50  # Categoricals summarized per segment by their top values
+TOP_VALUES = 3
+
+def _fmt(value: Any) -> str:
+    if isinstance(value, (float, np.floating)):
+        if math.isnan(value):
+            return "n/a"
+        if float(value).is_integer() or abs(value) >= 1e4:
+            return f"{value:,.0f}"
+        return f"{value:.4g}"
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat(sep=" ").removesuffix(" 00:00:00")
+    return str(value)
+
+def _label(filename: str, sheet: Optional[str]) -> str:
+    return f"Table {filename}" + (f", sheet {sheet}" if sheet else "")
+
+def _is_date(info: Dict) -> bool:
+    return str(info.get('type', '')).startswith('datetime')
+
+# ========== PROFILE AND COLUMNS ==========
+
+def _profile_doc(label: str, result: Dict) -> str:
+    stats = result['stats']
+    basic = stats['basic']
+    columns = ", ".join(f"{c['name']} ({c['type']})" for c in result['column_info'])
+    lines = [f"{label}: {basic['rows']:,} rows and {basic['columns']} columns.", f"Columns: {columns}."]
+    missing = stats.get('missing_values', {})
+    if missing.get('total'):
+        worst = sorted(missing['by_column'].items(), key=lambda kv: -kv[1])[:5]
+        lines.append("Missing values: " + ", ".join(f"{col} {n:,}" for col, n in worst if n) + ".")
+    if result.get('insights'):
+        lines.append("Findings: " + "; ".join(result['insights']) + ".")
+    return "\n".join(lines)
+
+def _column_doc(label: str, info: Dict, stats: Dict, trends: Dict) -> str:
+    name = info['name']
+    lines = [f"{label}, column {name} ({info['type']}): {info['non_null']:,} values, {info['null']:,} missing, {info['unique']:,} distinct."]
+    numeric = stats.get('numeric_stats', {}).get(name)
+    if numeric:
+        lines.append(
+            f"Min {_fmt(numeric['min'])}, median {_fmt(numeric['50%'])}, mean {_fmt(numeric['mean'])}, "
+            f"max {_fmt(numeric['max'])}, standard deviation {_fmt(numeric['std'])}."
+        )
+        total = numeric['mean'] * numeric['count']
+        lines.append(f"Total {_fmt(total)}.")
+    categorical = stats.get('categorical_stats', {}).get(name)
+    if categorical:
+        top = ", ".join(f"{value} ({count:,})" for value, count in categorical['top_values'].items())
+        lines.append(f"Most frequent values: {top}.")
+    outliers = stats.get('outliers', {}).get(name)
+    if outliers:
+        lines.append(f"{outliers['count']:,} outliers.")
+    if name == trends.get('date_column'):
+        lines.append(f"Spans {trends['start']} to {trends['end']}.")
+    trend = (trends.get('columns') or {}).get(name)
+    if trend:
+        over = f"per {trends['grain']} by {trends['date_column']}" if trends.get('axis') == 'time' else "in row order"
+        lines.append(f"Trend {over}: {trend['direction']}, {_fmt(trend['percent_change'])}% change over the span.")
+        if trend.get('seasonality'):
+            season = trend['seasonality']
+            lines.append(f"Seasonal, repeating every {season['period']} {season['unit'] or 'row'}s.")
+        if trend.get('change_point'):
+            point = trend['change_point']
+            lines.append(f"Level shift at {point['at']} from mean {_fmt(point['mean_before'])} to {_fmt(point['mean_after'])}.")
+    if not numeric and not categorical and info.get('sample_values'):
+        lines.append("Examples: " + ", ".join(_fmt(v) for v in info['sample_values']) + ".")
+    return " ".join(lines)
+
+# ========== ROW SEGMENTS ==========
+
+class _Segment:
+    """Mergeable aggregates over a contiguous range of rows."""
+
+    def __init__(self, start: int, numeric: List[str], categorical: List[str], dates: List[str]):
+        self.start = start
+        self.rows = 0
+        self.numeric, self.categorical, self.dates = numeric, categorical, dates
+        self.mins = self.maxs = self.sums = self.counts = None
+        self.values = {col: pd.Series(dtype=float) for col in categorical}
+        self.first = {col: pd.NaT for col in dates}
+        self.last = {col: pd.NaT for col in dates}
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        self.rows += len(chunk)
+        if self.numeric:
+            x = chunk[self.numeric].astype(float)
+            mins, maxs, sums, counts = x.min(), x.max(), x.sum(), x.count()
+            if self.mins is None:
+                self.mins, self.maxs, self.sums, self.counts = mins, maxs, sums, counts
+            else:
+                self.mins = np.fmin(self.mins, mins)
+                self.maxs = np.fmax(self.maxs, maxs)
+                self.sums, self.counts = self.sums + sums, self.counts + counts
+        for col in self.categorical:
+            self.values[col] = self.values[col].add(chunk[col].value_counts(), fill_value=0)
+        for col in self.dates:
+            lo, hi = chunk[col].min(), chunk[col].max()
+            self.first[col] = lo if pd.isna(self.first[col]) else min(self.first[col], lo)
+            self.last[col] = hi if pd.isna(self.last[col]) else max(self.last[col], hi)
+
+    def text(self, label: str, total_rows: int) -> str:
+        parts = []
+        for col in self.dates:
+            if pd.notna(self.first[col]):
+                parts.append(f"{col} from {_fmt(self.first[col])} to {_fmt(self.last[col])}")
+        for col in self.numeric:
+            if self.counts[col]:
+                parts.append(
+                    f"{col} between {_fmt(self.mins[col])} and {_fmt(self.maxs[col])}, "
+                    f"mean {_fmt(self.sums[col] / self.counts[col])}, total {_fmt(self.sums[col])}"
+                )
+        for col in self.categorical:
+            counts = self.values[col].nlargest(TOP_VALUES)
+            if self.rows and len(counts):
+                parts.append(f"{col} mostly " + ", ".join(f"{v} ({c / self.rows:.0%})" for v, c in counts.items()))
+        end = self.start + self.rows
+        return f"{label}, rows {self.start + 1:,} to {end:,} of {total_rows:,}: " + "; ".join(parts) + "."
+
+def _segment_columns(result: Dict) -> Dict[str, List[str]]:
+    stats = result['stats']
+    numeric = list(stats.get('numeric_stats', {}))
+    categorical = [
+        col for col, s in stats.get('categorical_stats', {}).items() if s.get('unique', 0) <= SEGMENT_MAX_UNIQUE
+    ]
+    dates = [c['name'] for c in result['column_info'] if _is_date(c)]
+    # Dates first: they say where in the table a segment sits
+    dates = dates[:1]
+    budget = TABLE_INDEX_SEGMENT_COLS - len(dates)
+    categorical = categorical[:budget // 3]
+    numeric = numeric[:budget - len(categorical)]
+    return {'numeric': numeric, 'categorical': categorical, 'dates': dates}
+
+def _segments(path, label: str, result: Dict) -> Iterator[str]:
+    total = result['stats']['basic']['rows']
+    cols = _segment_columns(result)
+    columns = cols['dates'] + cols['numeric'] + cols['categorical']
+    if not total or not columns:
+        return
+    size = math.ceil(total / TABLE_INDEX_MAX_SEGMENTS)
+    segment = _Segment(0, **cols)
+    for chunk in iter_columnar_chunks(path, columns):
+        while len(chunk):
+            take = size - segment.rows
+            segment.update(chunk.iloc[:take])
+            chunk = chunk.iloc[take:]
+            if segment.rows == size:
+                yield segment.text(label, total)
+                segment = _Segment(segment.start + segment.rows, **cols)
+    if segment.rows:
+        yield segment.text(label, total)
+
+def _row_docs(path, label: str) -> Iterator[str]:
+    df = read_columnar(path)
+    for start in range(0, len(df), TABLE_INDEX_ROWS_PER_DOC):
+        rows = df.iloc[start:start + TABLE_INDEX_ROWS_PER_DOC]
+        lines = [
+            f"Row {i + 1}: " + "; ".join(f"{col} = {_fmt(v)}" for col, v in row.items() if pd.notna(v))
+            for i, row in zip(range(start, start + len(rows)), rows.to_dict('records'))
+        ]
+        yield f"{label}, rows {start + 1} to {start + len(rows)}:\n" + "\n".join(lines)
+
+# ========== PUBLIC API ==========
+
+def table_documents(file_path, filename: str, result: Dict) -> List[Dict[str, str]]:
+    """Documents for one analysed sheet (or CSV), in a stable order."""
+    sheet = result['metadata'].get('sheet')
+    label = _label(filename, sheet)
+    trends = result.get('trends') or {}
+    docs = [{'key': 'profile', 'type': 'table_profile', 'text': _profile_doc(label, result)}]
+    for info in result['column_info'][:TABLE_INDEX_MAX_COLUMN_DOCS]:
+        docs.append({
+            'key': f"column:{info['name']}", 'type': 'table_column',
+            'text': _column_doc(label, info, result['stats'], trends)
+        })
+
+    path = ensure_columnar(file_path, sheet)
+    if path is None:
+        return docs
+    for i, text in enumerate(_segments(path, label, result)):
+        docs.append({'key': f"segment:{i}", 'type': 'table_segment', 'text': text})
+    if result['stats']['basic']['rows'] <= TABLE_INDEX_ROW_DOCS_MAX_ROWS:
+        for i, text in enumerate(_row_docs(path, label)):
+            docs.append({'key': f"rows:{i}", 'type': 'table_rows', 'text': text})
+    return docs
@@ -0,0 +1,241 @@
+"""Time-series trend detection.
+
+If a table has a datetime column, every numeric column is aggregated per
+day while the file is streamed (SeriesAccumulator), then resampled to a
+day, week or month grain depending on the time span. On the resampled
+means, all columns at once get:
+- a least-squares slope with its R² and the fitted change over the span
+- a rolling mean
+- seasonality: detrended autocorrelation at the seasonal lag (7 days, 52 weeks, 12 months)
+- a change point: the largest mean shift found by a two-segment split
+
+Tables without a date column fall back to the same analysis in file order.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from backend.config import (
+    TREND_MIN_R2, TREND_SEASONALITY_MIN_ACF, TREND_CHANGE_POINT_MIN_SCORE, TREND_SERIES_MAX_COLS
+)
+
+RESAMPLE_RULES = {'day': 'D', 'week': 'W', 'month': 'MS'}
+SEASONAL_LAGS = {'day': 7, 'week': 52, 'month': 12}
+ROLLING_WINDOWS = {'day': 7, 'week': 4, 'month': 3, None: 50}
+MIN_PERIODS = 3
+
+def _numeric_cols(df: pd.DataFrame) -> List[str]:
+    return df.select_dtypes(include=[np.number]).columns.tolist()
+
+def pick_date_column(df: pd.DataFrame) -> Optional[str]:
+    """The datetime column with the most distinct values, if any."""
+    candidates = df.select_dtypes(include=['datetime', 'datetimetz']).columns
+    if len(candidates) == 0:
+        return None
+    return max(candidates, key=lambda col: df[col].nunique())
+
+# ========== AGGREGATION ==========
+
+class SeriesAccumulator:
+    """Per-day sums and counts of the numeric columns, keyed by one datetime column."""
+
+    def __init__(self, date_col: str, numeric_cols: List[str]):
+        self.date_col = date_col
+        self.numeric_cols = numeric_cols
+        self._sums: List[pd.DataFrame] = []
+        self._counts: List[pd.DataFrame] = []
+
+    @classmethod
+    def for_chunk(cls, chunk: pd.DataFrame) -> Optional["SeriesAccumulator"]:
+        """An accumulator for this table's layout, or None if it has no date or numeric columns."""
+        date_col = pick_date_column(chunk)
+        numeric_cols = _numeric_cols(chunk)
+        if date_col is None or not numeric_cols:
+            return None
+        return cls(date_col, numeric_cols)
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        dates = chunk[self.date_col]
+        valid = dates.notna().to_numpy()
+        if not valid.any():
+            return
+        days = dates[valid].dt.tz_localize(None) if dates.dt.tz is not None else dates[valid]
+        values = chunk.loc[valid, self.numeric_cols].to_numpy(dtype=float, na_value=np.nan)
+        frame = pd.DataFrame(values, columns=self.numeric_cols, index=days.dt.floor('D').to_numpy())
+        grouped = frame.groupby(level=0)
+        self._sums.append(grouped.sum())
+        self._counts.append(grouped.count())
+        if len(self._sums) >= 16:
+            self._compact()
+
+    def _compact(self) -> None:
+        self._sums = [pd.concat(self._sums).groupby(level=0).sum()]
+        self._counts = [pd.concat(self._counts).groupby(level=0).sum()]
+
+    def result(self) -> Optional[Dict[str, Any]]:
+        """{'date_column', 'sums', 'counts'} with one row per day, or None if no dated rows."""
+        if not self._sums:
+            return None
+        self._compact()
+        return {'date_column': self.date_col, 'sums': self._sums[0], 'counts': self._counts[0]}
+
+def series_from_frame(df: pd.DataFrame) -> Optional[Dict[str, Any]]:
+    """Daily aggregates of an in-memory DataFrame, or None if it has no date column."""
+    acc = SeriesAccumulator.for_chunk(df)
+    if acc is None:
+        return None
+    acc.update(df)
+    return acc.result()
+
+def _grain(start: pd.Timestamp, end: pd.Timestamp) -> str:
+    days = (end - start).days
+    if days > 730:
+        return 'month'
+    if days > 90:
+        return 'week'
+    return 'day'
+
+# ========== ANALYSIS ==========
+
+def _fit(Y: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Per-column least squares of Y (periods x columns) on 0..n-1, ignoring NaNs. Returns slope, intercept, r2."""
+    mask = np.isfinite(Y)
+    x = np.arange(len(Y), dtype=float)[:, None]
+    W = mask.astype(float)
+    y = np.where(mask, Y, 0.0)
+    n = W.sum(0)
+    sx, sy = (W * x).sum(0), y.sum(0)
+    sxx, sxy, syy = (W * x * x).sum(0), (x * y).sum(0), (y * y).sum(0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vx = n * sxx - sx ** 2
+        vy = n * syy - sy ** 2
+        cov = n * sxy - sx * sy
+        slope = np.where(vx > 0, cov / vx, 0.0)
+        intercept = (sy - slope * sx) / n
+        r2 = np.where((vx > 0) & (vy > 0), cov ** 2 / (vx * vy), 0.0)
+    return slope, intercept, r2
+
+def _seasonality(R: np.ndarray, lag: int) -> np.ndarray:
+    """Autocorrelation of residuals R (no NaNs) at `lag`, per column."""
+    if len(R) < 2 * lag:
+        return np.full(R.shape[1], np.nan)
+    denom = (R ** 2).sum(0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denom > 0, (R[lag:] * R[:-lag]).sum(0) / denom, np.nan)
+
+def _change_points(F: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Best two-segment split of each column of F (no NaNs): index of the last 'before' period, score, means."""
+    n = len(F)
+    S = np.cumsum(F, axis=0)
+    i = np.arange(2, n - 2)  # at least two periods on each side
+    left = (i + 1)[:, None]
+    right = (n - i - 1)[:, None]
+    before = S[i] / left
+    after = (S[-1] - S[i]) / right
+    std = F.std(axis=0, ddof=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        score = np.abs(after - before) / (std * np.sqrt(1 / left + 1 / right))
+    score = np.nan_to_num(score, nan=0.0, posinf=0.0)
+    best = score.argmax(axis=0)
+    cols = np.arange(F.shape[1])
+    return i[best], score[best, cols], before[best, cols], after[best, cols]
+
+def _analyze(Y: pd.DataFrame, grain: Optional[str]) -> Dict[str, Dict[str, Any]]:
+    """Per-column trend summary of a (periods x columns) frame of means."""
+    usable = [c for c in Y.columns if Y[c].notna().sum() >= MIN_PERIODS]
+    if not usable:
+        return {}
+    Y = Y[usable]
+    values = Y.to_numpy(dtype=float)
+    n = len(values)
+    slope, intercept, r2 = _fit(values)
+    
+    F = Y.interpolate(limit_direction='both').to_numpy(dtype=float)
+    rolling = pd.DataFrame(F).rolling(min(ROLLING_WINDOWS[grain], n), min_periods=1).mean().to_numpy()
+    fitted = intercept + slope * np.arange(n)[:, None]
+    lag = SEASONAL_LAGS.get(grain)
+    acf = _seasonality(F - fitted, lag) if lag else np.full(len(usable), np.nan)
+    if n >= 6:
+        cp_index, cp_score, cp_before, cp_after = _change_points(F)
+    else:
+        cp_index = cp_score = cp_before = cp_after = np.full(len(usable), np.nan)
+    
+    means = np.nanmean(values, axis=0)
+    labels = Y.index
+    columns = {}
+    for j, col in enumerate(usable):
+        start, end = intercept[j], intercept[j] + slope[j] * (n - 1)
+        change = end - start
+        trending = r2[j] >= TREND_MIN_R2 and change != 0
+        info = {
+            'direction': ('increasing' if change > 0 else 'decreasing') if trending else 'stable',
+            'change': float(change),
+            'percent_change': float(change / abs(start) * 100) if start != 0 else 0.0,
+            'slope': float(slope[j]),
+            'slope_percent': float(slope[j] / abs(means[j]) * 100) if means[j] != 0 else 0.0,
+            'r2': float(r2[j]),
+            'min': float(np.nanmin(values[:, j])),
+            'max': float(np.nanmax(values[:, j])),
+            'mean': float(means[j]),
+            'rolling_mean_last': float(rolling[-1, j]),
+            'seasonality': None,
+            'change_point': None
+        }
+        if np.isfinite(acf[j]) and acf[j] >= TREND_SEASONALITY_MIN_ACF:
+            info['seasonality'] = {'period': lag, 'unit': grain, 'strength': float(acf[j])}
+        if np.isfinite(cp_score[j]) and cp_score[j] >= TREND_CHANGE_POINT_MIN_SCORE:
+            at = labels[int(cp_index[j]) + 1]
+            info['change_point'] = {
+                'at': at.isoformat() if isinstance(at, pd.Timestamp) else int(at),
+                'mean_before': float(cp_before[j]),
+                'mean_after': float(cp_after[j]),
+                'score': float(cp_score[j])
+            }
+        columns[col] = info
+    return columns
+
+def time_trends(series: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Trends from SeriesAccumulator output, or None if there are too few periods."""
+    sums, counts = series['sums'], series['counts']
+    if len(sums) == 0:
+        return None
+    grain = _grain(sums.index.min(), sums.index.max())
+    rule = RESAMPLE_RULES[grain]
+    total = sums.resample(rule).sum()
+    n = counts.resample(rule).sum()
+    means = total / n.where(n > 0)
+    if len(means) < MIN_PERIODS:
+        return None
+    
+    columns = _analyze(means, grain)
+    if not columns:
+        return None
+    
+    shown = list(columns)[:TREND_SERIES_MAX_COLS]
+    rolling = means[shown].interpolate(limit_direction='both').rolling(
+        min(ROLLING_WINDOWS[grain], len(means)), min_periods=1).mean()
+    return {
+        'axis': 'time',
+        'date_column': series['date_column'],
+        'grain': grain,
+        'periods': len(means),
+        'start': means.index[0].isoformat(),
+        'end': means.index[-1].isoformat(),
+        'columns': columns,
+        'series': {
+            'index': [ts.date().isoformat() for ts in means.index],
+            'values': {col: means[col].round(6).tolist() for col in shown},
+            'rolling': {col: rolling[col].round(6).tolist() for col in shown}
+        }
+    }
+
+def row_trends(df: pd.DataFrame) -> Dict[str, Any]:
+    """Trends in file order, for tables without a date column."""
+    numeric = df[_numeric_cols(df)].astype(float)
+    return {
+        'axis': 'row',
+        'date_column': None,
+        'grain': None,
+        'periods': len(df),
+        'columns': _analyze(numeric.reset_index(drop=True), None) if len(df) >= MIN_PERIODS else {},
+        'series': None
+    }
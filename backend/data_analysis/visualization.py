@@ -1,78 +1,205 @@
-"""Visualization generation using Plotly."""
+"""Visualization generation using Plotly.
+
+Charts are built from aggregates rather than raw rows: pre-binned
+histograms, box-plot summary statistics and density-binned scatter plots,
+so the payload size does not grow with the number of rows. The aggregates
+are accumulated chunk by chunk, using the exact full-data statistics from
+the loader for bin edges and quartiles.
+"""
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from typing import List, Dict, Any
+from typing import Iterable, List, Dict, Any, Optional
 import numpy as np
+from backend.config import (
+    CHART_HIST_BINS, CHART_MAX_POINTS, CHART_SCATTER_GRID, CHART_BOX_MAX_OUTLIERS, CHART_HEATMAP_MAX_COLS
+)
+
+def _values(chunk: pd.DataFrame, col: str) -> np.ndarray:
+    values = chunk[col].to_numpy(dtype=float, na_value=np.nan)
+    return values[np.isfinite(values)]
+
+def _edges(num: Dict, bins: int) -> np.ndarray:
+    low, high = num['min'], num['max']
+    if not (np.isfinite(low) and np.isfinite(high)):
+        low, high = 0.0, 1.0
+    if high <= low:
+        low, high = low - 0.5, high + 0.5
+    return np.linspace(low, high, bins + 1)
 
-def generate_charts(df: pd.DataFrame) -> List[Dict[str, Any]]:
-    """Generate Plotly charts based on data types."""
-    charts = []
+class _Histogram:
+    def __init__(self, col: str, num: Dict):
+        self.col = col
+        self.edges = _edges(num, CHART_HIST_BINS)
+        self.counts = np.zeros(CHART_HIST_BINS, dtype=np.int64)
     
-    numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
-    categorical_cols = df.select_dtypes(include=['object', 'category']).columns.tolist()
+    def update(self, chunk: pd.DataFrame) -> None:
+        self.counts += np.histogram(_values(chunk, self.col), self.edges)[0]
     
-    # 1. Numeric distributions (histograms)
-    for col in numeric_cols[:3]:  # Limit to 3
-        fig = px.histogram(df, x=col, title=f'Distribution of {col}',
-                          labels={col: col}, nbins=30)
-        fig.update_layout(showlegend=False, height=400)
-        charts.append({
-            'type': 'histogram',
-            'title': f'Distribution of {col}',
-            'data': fig.to_json()
-        })
+    def chart(self) -> Dict[str, Any]:
+        centers = (self.edges[:-1] + self.edges[1:]) / 2
+        fig = go.Figure(go.Bar(x=centers, y=self.counts, width=np.diff(self.edges)))
+        fig.update_layout(title=f'Distribution of {self.col}', showlegend=False, height=400,
+                          bargap=0, xaxis_title=self.col, yaxis_title='count')
+        return {'type': 'histogram', 'title': f'Distribution of {self.col}', 'data': fig.to_json()}
+
+class _BoxPlot:
+    """Box from the loader's quartiles; exact whiskers and the most extreme outliers from the data."""
     
-    # 2. Categorical bar charts
-    for col in categorical_cols[:2]:  # Limit to 2
-        value_counts = df[col].value_counts().head(10)
-        fig = px.bar(x=value_counts.index, y=value_counts.values,
-                    title=f'Top Values in {col}',
-                    labels={'x': col, 'y': 'Count'})
-        fig.update_layout(showlegend=False, height=400)
-        charts.append({
-            'type': 'bar',
-            'title': f'Top Values in {col}',
-            'data': fig.to_json()
-        })
+    def __init__(self, col: str, num: Dict):
+        self.col = col
+        self.q1, self.median, self.q3 = num['25%'], num['50%'], num['75%']
+        iqr = self.q3 - self.q1
+        self.low, self.high = self.q1 - 1.5 * iqr, self.q3 + 1.5 * iqr
+        self.whisker_low, self.whisker_high = np.inf, -np.inf
+        self.outliers = np.empty(0)
     
-    # 3. Correlation heatmap (if multiple numeric columns)
-    if len(numeric_cols) > 1:
-        corr = df[numeric_cols].corr()
-        fig = px.imshow(corr, text_auto=True, aspect='auto',
-                       title='Correlation Heatmap',
-                       color_continuous_scale='RdBu_r')
-        fig.update_layout(height=500)
-        charts.append({
-            'type': 'heatmap',
-            'title': 'Correlation Heatmap',
-            'data': fig.to_json()
-        })
+    def update(self, chunk: pd.DataFrame) -> None:
+        values = _values(chunk, self.col)
+        inside = values[(values >= self.low) & (values <= self.high)]
+        if len(inside):
+            self.whisker_low = min(self.whisker_low, inside.min())
+            self.whisker_high = max(self.whisker_high, inside.max())
+        outliers = np.concatenate([self.outliers, values[(values < self.low) | (values > self.high)]])
+        if len(outliers) > CHART_BOX_MAX_OUTLIERS:
+            half = CHART_BOX_MAX_OUTLIERS // 2
+            outliers = np.sort(outliers)
+            outliers = np.concatenate([outliers[:half], outliers[-half:]])
+        self.outliers = outliers
     
-    # 4. Box plots for outlier detection
-    if len(numeric_cols) > 0:
-        col = numeric_cols[0]
-        fig = px.box(df, y=col, title=f'Box Plot - {col}')
-        fig.update_layout(showlegend=False, height=400)
-        charts.append({
-            'type': 'box',
-            'title': f'Box Plot - {col}',
-            'data': fig.to_json()
-        })
+    def chart(self) -> Dict[str, Any]:
+        low = self.whisker_low if np.isfinite(self.whisker_low) else self.q1
+        high = self.whisker_high if np.isfinite(self.whisker_high) else self.q3
+        fig = go.Figure(go.Box(x=[self.col], q1=[self.q1], median=[self.median], q3=[self.q3],
+                               lowerfence=[low], upperfence=[high], name=self.col))
+        if len(self.outliers):
+            fig.add_trace(go.Scatter(x=[self.col] * len(self.outliers), y=self.outliers,
+                                     mode='markers', name='outliers'))
+        fig.update_layout(title=f'Box Plot - {self.col}', showlegend=False, height=400, yaxis_title=self.col)
+        return {'type': 'box', 'title': f'Box Plot - {self.col}', 'data': fig.to_json()}
+
+class _Scatter:
+    """Raw points for small tables; above CHART_MAX_POINTS rows, one marker per occupied grid cell."""
     
-    # 5. Scatter plot if 2+ numeric columns
-    if len(numeric_cols) >= 2:
-        fig = px.scatter(df, x=numeric_cols[0], y=numeric_cols[1],
-                        title=f'{numeric_cols[0]} vs {numeric_cols[1]}',
-                        opacity=0.6)
-        fig.update_layout(height=400)
-        charts.append({
-            'type': 'scatter',
-            'title': f'{numeric_cols[0]} vs {numeric_cols[1]}',
-            'data': fig.to_json()
-        })
+    def __init__(self, x: str, y: str, num_x: Dict, num_y: Dict):
+        self.x, self.y = x, y
+        self.x_edges = _edges(num_x, CHART_SCATTER_GRID)
+        self.y_edges = _edges(num_y, CHART_SCATTER_GRID)
+        self.grid = np.zeros((CHART_SCATTER_GRID, CHART_SCATTER_GRID), dtype=np.int64)
+        self.points: Optional[List[np.ndarray]] = []
+        self.n = 0
     
-    return charts[:6]  # Max 6 charts
+    def update(self, chunk: pd.DataFrame) -> None:
+        xy = chunk[[self.x, self.y]].to_numpy(dtype=float, na_value=np.nan)
+        xy = xy[np.isfinite(xy).all(axis=1)]
+        self.grid += np.histogram2d(xy[:, 0], xy[:, 1], [self.x_edges, self.y_edges])[0].astype(np.int64)
+        self.n += len(xy)
+        if self.points is not None:
+            self.points.append(xy)
+            if self.n > CHART_MAX_POINTS:
+                self.points = None
+    
+    def chart(self) -> Dict[str, Any]:
+        title = f'{self.x} vs {self.y}'
+        if self.points is not None:
+            xy = np.concatenate(self.points) if self.points else np.empty((0, 2))
+            fig = go.Figure(go.Scattergl(x=xy[:, 0], y=xy[:, 1], mode='markers', opacity=0.6))
+        else:
+            ix, iy = np.nonzero(self.grid)
+            x_mid = (self.x_edges[:-1] + self.x_edges[1:]) / 2
+            y_mid = (self.y_edges[:-1] + self.y_edges[1:]) / 2
+            counts = self.grid[ix, iy]
+            fig = go.Figure(go.Scattergl(
+                x=x_mid[ix], y=y_mid[iy], mode='markers', text=counts,
+                hovertemplate='%{x}, %{y}: %{text} rows<extra></extra>',
+                marker=dict(color=np.log10(counts + 1), colorscale='Viridis', showscale=False)
+            ))
+            title += f' ({self.n:,} rows, binned)'
+        fig.update_layout(title=title, height=400, xaxis_title=self.x, yaxis_title=self.y)
+        return {'type': 'scatter', 'title': title, 'data': fig.to_json()}
+
+def _trend_chart(trends: Dict[str, Any]) -> Dict[str, Any]:
+    """Line chart of the resampled series and its rolling mean, already aggregated by detect_trends."""
+    series = trends['series']
+    col = next(iter(series['values']))
+    grain = trends['grain']
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=series['index'], y=series['values'][col], mode='lines', name=f'{col} ({grain} mean)'))
+    fig.add_trace(go.Scatter(x=series['index'], y=series['rolling'][col], mode='lines', name='rolling mean',
+                             line=dict(dash='dash')))
+    title = f'{col} by {grain} ({trends["date_column"]})'
+    fig.update_layout(title=title, height=400, xaxis_title=trends['date_column'], yaxis_title=col)
+    return {'type': 'line', 'title': title, 'data': fig.to_json()}
+
+class ChartBuilder:
+    """Accumulates chart aggregates over the chunks of one table.
+    
+    `stats` is the loader's full-data output; it chooses the
+    columns and supplies bin ranges, quartiles, correlations and top values.
+    `trends` (detect_trends output) adds a time-series chart when the table
+    has a date column. Feed every chunk to update(), then call charts().
+    """
+    
+    def __init__(self, stats: Dict[str, Any], trends: Optional[Dict[str, Any]] = None):
+        self.stats = stats
+        self.trends = trends
+        numeric = stats.get('numeric_stats') or {}
+        numeric_cols = list(numeric)
+        self.categorical_cols = list(stats.get('categorical_stats') or {})[:2]
+        
+        self.histograms = [_Histogram(col, numeric[col]) for col in numeric_cols[:3]]
+        self.box = _BoxPlot(numeric_cols[0], numeric[numeric_cols[0]]) if numeric_cols else None
+        self.scatter = (_Scatter(numeric_cols[0], numeric_cols[1], numeric[numeric_cols[0]], numeric[numeric_cols[1]])
+                        if len(numeric_cols) >= 2 else None)
+        # The only columns update() reads, so callers can load just these
+        self.columns = numeric_cols[:3]
+    
+    def _parts(self) -> list:
+        return self.histograms + [p for p in (self.box, self.scatter) if p is not None]
+    
+    def update(self, chunk: pd.DataFrame) -> None:
+        for part in self._parts():
+            part.update(chunk)
+    
+    def charts(self) -> List[Dict[str, Any]]:
+        charts = []
+        if self.trends and self.trends.get('series') and self.trends['series']['values']:
+            charts.append(_trend_chart(self.trends))
+        charts += [h.chart() for h in self.histograms]
+        
+        # Categorical bar charts, from the loader's top values
+        for col in self.categorical_cols:
+            top = self.stats['categorical_stats'][col].get('top_values') or {}
+            fig = px.bar(x=list(top.keys()), y=list(top.values()),
+                        title=f'Top Values in {col}',
+                        labels={'x': col, 'y': 'Count'})
+            fig.update_layout(showlegend=False, height=400)
+            charts.append({'type': 'bar', 'title': f'Top Values in {col}', 'data': fig.to_json()})
+        
+        # Correlation heatmap, capped so wide tables stay readable and small
+        if self.stats.get('correlations'):
+            corr = pd.DataFrame(self.stats['correlations']).iloc[:CHART_HEATMAP_MAX_COLS, :CHART_HEATMAP_MAX_COLS]
+            if len(corr.columns) > 1:
+                fig = px.imshow(corr.round(2), text_auto=True, aspect='auto',
+                               title='Correlation Heatmap',
+                               color_continuous_scale='RdBu_r')
+                fig.update_layout(height=500)
+                charts.append({'type': 'heatmap', 'title': 'Correlation Heatmap', 'data': fig.to_json()})
+        
+        if self.box is not None:
+            charts.append(self.box.chart())
+        if self.scatter is not None:
+            charts.append(self.scatter.chart())
+        
+        return charts[:6]  # Max 6 charts
+
+def build_charts(chunks: Iterable[pd.DataFrame], stats: Dict[str, Any],
+                 trends: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Build charts in one pass over a table's chunks."""
+    builder = ChartBuilder(stats, trends)
+    for chunk in chunks:
+        builder.update(chunk)
+    return builder.charts()
 
 def create_summary_chart(stats: Dict) -> Dict[str, Any]:
     """Create a summary visualization of key metrics."""
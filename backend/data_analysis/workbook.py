@@ -0,0 +1,97 @@
+"""Per-sheet analysis of uploaded workbooks across a process pool.
+
+The workbook is opened once to write a Parquet copy of every requested
+sheet; each sheet is then analysed in its own worker process, reading its
+copy through a memory map. CSVs are a single unnamed sheet. Charts are
+not part of the analysis; sheet_charts() builds them when first requested.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from backend.config import DATA_SHEET_WORKERS
+from backend.data_analysis.analysis import detect_trends, find_insights
+from backend.data_analysis.columnar import (
+    ensure_columnar, ensure_workbook_columnar, is_workbook, iter_columnar_chunks, read_source_chunks
+)
+from backend.data_analysis.excel_loader import load_excel_or_csv, get_column_info
+from backend.data_analysis.visualization import ChartBuilder
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawn rather than fork: the server process has threads (uvicorn, quota flusher)
+            _pool = ProcessPoolExecutor(
+                max_workers=DATA_SHEET_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+def analyze_sheet(file_path: str, sheet: Optional[str] = None) -> Dict[str, Any]:
+    """Load one sheet (or a CSV) and run the statistical analysis. LLM insights are left to the caller."""
+    result = load_excel_or_csv(file_path, sheet)
+    if not result['success']:
+        return {'success': False, 'error': result['error']}
+    
+    df = result['dataframe']
+    # Exact full-file statistics come from the streaming loader; `df` may be a sample
+    stats = result['stats']
+    trends = detect_trends(df, result['series'])
+    
+    return {
+        'success': True,
+        'metadata': result['metadata'],
+        'stats': stats,
+        'trends': trends,
+        'insights': find_insights(df, stats, trends),
+        'column_info': get_column_info(df, stats),
+        'df_info': {
+            'columns': df.columns.tolist(),
+            'dtypes': {col: str(dtype) for col, dtype in df.dtypes.items()}
+        }
+    }
+
+def analyze_sheets(file_path: str, sheets: List[Optional[str]]) -> Dict[Optional[str], Dict[str, Any]]:
+    """Analyse several sheets of one file, in parallel when there is more than one."""
+    if is_workbook(file_path):
+        # One pass over the workbook for every sheet that lacks a fresh Parquet copy
+        ensure_workbook_columnar(file_path, [s for s in sheets if s is not None])
+    
+    if len(sheets) == 1:
+        return {sheets[0]: analyze_sheet(file_path, sheets[0])}
+    
+    pool = get_pool()
+    futures = {sheet: pool.submit(analyze_sheet, file_path, sheet) for sheet in sheets}
+    results = {}
+    for sheet, future in futures.items():
+        try:
+            results[sheet] = future.result()
+        except Exception as e:
+            results[sheet] = {'success': False, 'error': str(e)}
+    return results
+
+def sheet_charts(file_path: str, sheet: Optional[str], stats: Dict[str, Any],
+                 trends: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Build one sheet's charts in a single pass over just the columns they plot."""
+    builder = ChartBuilder(stats, trends)
+    if builder.columns:
+        columnar = ensure_columnar(file_path, sheet)
+        if columnar is not None:
+            chunks = iter_columnar_chunks(columnar, columns=builder.columns)
+        else:
+            chunks = read_source_chunks(Path(file_path), sheet)
+        for chunk in chunks:
+            builder.update(chunk)
+    return builder.charts()
@@ -0,0 +1,238 @@
+"""Durable outbox for notification emails.
+
+Auth endpoints only enqueue (one local SQLite insert) and return; a worker
+thread per process drains the queue. Each drain opens one SMTP session
+(STARTTLS and login done once) and sends every due message through it, in
+batches of EMAIL_BATCH_SIZE. A message that hits a transient error is
+retried with exponential backoff; one the server refuses outright, or that
+runs out of attempts or outlives its expiry, is kept as 'failed'.
+
+Rows are claimed with a lease before sending, so several workers can share
+one outbox file without sending twice. A process that dies mid-send
+releases its claim when the lease runs out: delivery is at least once.
+
+To try it locally without a real mail server:
+
+    python -m aiosmtpd -n -l localhost:8025
+    SMTP_SERVER=localhost SMTP_PORT=8025 SMTP_EMAIL=noreply@localhost SMTP_STARTTLS=0 uvicorn backend.main:app
+
+(SMTP_PASSWORD empty skips login.) With no SMTP_EMAIL, messages are
+printed instead of sent, as before.
+"""
+import random
+import smtplib
+import sqlite3
+import threading
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Dict, List, Optional
+from backend.config import *
+from backend import metrics
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = set()
+_wake = threading.Event()
+_stop = threading.Event()
+_worker: Optional[threading.Thread] = None
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    to_email      TEXT NOT NULL,
+    subject       TEXT NOT NULL,
+    body          TEXT NOT NULL,
+    created_at    REAL NOT NULL,
+    expires_at    REAL,
+    status        TEXT NOT NULL DEFAULT 'pending',
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    next_attempt  REAL NOT NULL,
+    claimed_until REAL NOT NULL DEFAULT 0,
+    last_error    TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt);
+"""
+
+def _conn() -> sqlite3.Connection:
+    """Return this thread's connection, creating the schema on first use."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = sqlite3.connect(EMAIL_OUTBOX_PATH, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        with _init_lock:
+            if EMAIL_OUTBOX_PATH not in _initialized:
+                conn.executescript(SCHEMA)
+                _initialized.add(EMAIL_OUTBOX_PATH)
+    return conn
+
+def enqueue(to_email: str, subject: str, body: str, ttl_seconds: Optional[float] = None) -> bool:
+    """Queue an email for the worker. Messages not sent within `ttl_seconds` are dropped."""
+    now = time.time()
+    try:
+        _conn().execute(
+            "INSERT INTO outbox (to_email, subject, body, created_at, expires_at, next_attempt) VALUES (?, ?, ?, ?, ?, ?)",
+            (to_email, subject, body, now, now + ttl_seconds if ttl_seconds else None, now)
+        )
+    except sqlite3.Error as e:
+        print(f"[EMAIL ERROR] Could not queue '{subject}' for {to_email}: {e}")
+        return False
+    _wake.set()
+    return True
+
+def _claim(limit: int) -> List[sqlite3.Row]:
+    """Lease up to `limit` due messages to this worker."""
+    conn, now = _conn(), time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            "UPDATE outbox SET status = 'failed', last_error = 'expired' "
+            "WHERE status = 'pending' AND expires_at IS NOT NULL AND expires_at < ?", (now,)
+        )
+        rows = conn.execute(
+            "SELECT * FROM outbox WHERE status = 'pending' AND next_attempt <= ? AND claimed_until < ? "
+            "ORDER BY next_attempt, id LIMIT ?", (now, now, limit)
+        ).fetchall()
+        conn.executemany(
+            "UPDATE outbox SET claimed_until = ? WHERE id = ?",
+            [(now + EMAIL_CLAIM_SECONDS, row["id"]) for row in rows]
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return rows
+
+def _sent(row: sqlite3.Row) -> None:
+    _conn().execute("DELETE FROM outbox WHERE id = ?", (row["id"],))
+    metrics.inc("emails_total", result="sent")
+
+def _failed(row: sqlite3.Row, error: Exception, permanent: bool) -> None:
+    attempts = row["attempts"] + 1
+    if permanent or attempts >= EMAIL_MAX_ATTEMPTS:
+        _conn().execute(
+            "UPDATE outbox SET status = 'failed', attempts = ?, claimed_until = 0, last_error = ? WHERE id = ?",
+            (attempts, str(error)[:500], row["id"])
+        )
+        print(f"[EMAIL ERROR] Giving up on '{row['subject']}' for {row['to_email']} after {attempts} attempts: {error}")
+        metrics.inc("emails_total", result="failed")
+        return
+    delay = min(EMAIL_BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), EMAIL_BACKOFF_MAX_SECONDS)
+    delay *= random.uniform(0.5, 1.0)  # Jitter, so workers don't retry a recovering server in lockstep
+    _conn().execute(
+        "UPDATE outbox SET attempts = ?, next_attempt = ?, claimed_until = 0, last_error = ? WHERE id = ?",
+        (attempts, time.time() + delay, str(error)[:500], row["id"])
+    )
+    metrics.inc("emails_total", result="retry")
+
+def _release(rows: List[sqlite3.Row]) -> None:
+    """Return claimed messages to the queue untried, due again after the base backoff."""
+    _conn().executemany(
+        "UPDATE outbox SET next_attempt = ?, claimed_until = 0 WHERE id = ?",
+        [(time.time() + EMAIL_BACKOFF_BASE_SECONDS, row["id"]) for row in rows]
+    )
+
+def _message(row: sqlite3.Row) -> MIMEMultipart:
+    msg = MIMEMultipart()
+    msg['From'] = SMTP_EMAIL
+    msg['To'] = row["to_email"]
+    msg['Subject'] = row["subject"]
+    msg.attach(MIMEText(row["body"], 'html'))
+    return msg
+
+def _connect() -> smtplib.SMTP:
+    server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=EMAIL_SMTP_TIMEOUT_SECONDS)
+    try:
+        if SMTP_STARTTLS:
+            server.starttls()
+        if SMTP_PASSWORD:
+            server.login(SMTP_EMAIL, SMTP_PASSWORD)
+    except BaseException:
+        server.close()
+        raise
+    return server
+
+def _permanent(error: Exception) -> bool:
+    """Errors that will fail again however often the message is retried."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, (smtplib.SMTPSenderRefused, smtplib.SMTPDataError)):
+        return error.smtp_code >= 500
+    return False
+
+def drain() -> Dict[str, int]:
+    """Send every due message over one SMTP session. Blocking; returns counts by outcome."""
+    counts = {"sent": 0, "retry": 0, "failed": 0}
+    server: Optional[smtplib.SMTP] = None
+    try:
+        while True:
+            rows = _claim(EMAIL_BATCH_SIZE)
+            if not rows:
+                break
+            for n, row in enumerate(rows):
+                if not SMTP_EMAIL:
+                    print(f"\n[Email] To: {row['to_email']} | Subject: {row['subject']}\n{row['body']}\n")
+                    _sent(row)
+                    counts["sent"] += 1
+                    continue
+                try:
+                    if server is None:
+                        server = _connect()
+                    server.send_message(_message(row))
+                except (smtplib.SMTPException, OSError) as e:
+                    permanent = _permanent(e)
+                    _failed(row, e, permanent)
+                    counts["failed" if permanent or row["attempts"] + 1 >= EMAIL_MAX_ATTEMPTS else "retry"] += 1
+                    refused = isinstance(e, smtplib.SMTPRecipientsRefused) or (
+                        isinstance(e, smtplib.SMTPResponseException) and e.smtp_code != 421
+                    )
+                    if server is not None and refused:
+                        continue  # Refused this message; the session is still good
+                    # Unreachable, login refused or disconnected: hand the rest back for later
+                    _release(rows[n + 1:])
+                    return counts
+                _sent(row)
+                counts["sent"] += 1
+    finally:
+        if server is not None:
+            try:
+                server.quit()
+            except (smtplib.SMTPException, OSError):
+                server.close()
+    return counts
+
+def _run() -> None:
+    while not _stop.is_set():
+        _wake.wait(EMAIL_POLL_SECONDS)
+        _wake.clear()
+        try:
+            counts = drain()
+            if counts["sent"] or counts["retry"] or counts["failed"]:
+                print(f"[EMAIL] Sent {counts['sent']}, retrying {counts['retry']}, failed {counts['failed']}")
+        except Exception as e:
+            print(f"[EMAIL ERROR] Outbox drain failed, will retry: {e}")
+
+def start_worker() -> None:
+    global _worker
+    if _worker is not None and _worker.is_alive():
+        return
+    _stop.clear()
+    _wake.set()  # Pick up whatever was left queued by the last run
+    _worker = threading.Thread(target=_run, name="email-outbox", daemon=True)
+    _worker.start()
+
+def stop_worker(timeout: float = 10) -> None:
+    """Stop the worker after its current drain; unsent messages stay queued for the next start."""
+    global _worker
+    if _worker is None:
+        return
+    _stop.set()
+    _wake.set()
+    _worker.join(timeout)
+    _worker = None
+
+def pending() -> int:
+    return _conn().execute("SELECT COUNT(*) FROM outbox WHERE status = 'pending'").fetchone()[0]
@@ -1,30 +1,9 @@
 """Email notification service."""
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from backend.config import *
+from backend.email_outbox import enqueue
 
-def _send_email(to_email: str, subject: str, body: str) -> bool:
-    """Send email via SMTP."""
-    if not SMTP_EMAIL or not SMTP_PASSWORD:
-        print(f"\n[Email] To: {to_email} | Subject: {subject}\n{body}\n")
-        return True
-    
-    try:
-        msg = MIMEMultipart()
-        msg['From'] = SMTP_EMAIL
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        msg.attach(MIMEText(body, 'html'))
-        
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SMTP_EMAIL, SMTP_PASSWORD)
-            server.send_message(msg)
-        return True
-    except Exception as e:
-        print(f"Email error: {e}")
-        return False
+def _send_email(to_email: str, subject: str, body: str, ttl_seconds: float = None) -> bool:
+    """Queue an email; the outbox worker sends it (see backend.email_outbox)."""
+    return enqueue(to_email, subject, body, ttl_seconds)
 
 def send_welcome_email(email: str, username: str) -> bool:
     subject = "Welcome to RAG PDF Chat!"
@@ -45,7 +24,7 @@ def send_reset_email(email: str, username: str, token: str) -> bool:
     <p><a href="{reset_link}">{reset_link}</a></p>
     <p>This link expires in 1 hour.</p>
     """
-    return _send_email(email, subject, body)
+    return _send_email(email, subject, body, ttl_seconds=3600)
 
 def send_password_changed_email(email: str, username: str) -> bool:
     subject = "Password Changed"
@@ -0,0 +1,250 @@
+"""Central gateway for Groq chat completions.
+
+Every LLM call goes through chat_completion(), which adds:
+- a per-worker concurrency cap with a priority queue (interactive before background)
+- exponential backoff with jitter on 429, 5xx and connection errors
+- a circuit breaker that fails fast while the provider is down
+- per-mode call, token and latency accounting
+"""
+import heapq
+import itertools
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from backend.config import *
+from backend import metrics
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+class LLMUnavailableError(Exception):
+    """Raised when the LLM cannot be called (circuit open, queue full or retries exhausted)."""
+
+# ========== CONCURRENCY ==========
+
+class _PriorityGate:
+    """Counting semaphore that admits waiters by (priority, arrival order)."""
+
+    def __init__(self, limit: int, max_queue: int):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.active = 0
+        self._waiting: List[tuple] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def acquire(self, priority: int, timeout: float) -> None:
+        with self._cond:
+            if len(self._waiting) >= self.max_queue:
+                raise LLMUnavailableError("LLM queue is full, please retry shortly")
+
+            entry = (priority, next(self._seq))
+            heapq.heappush(self._waiting, entry)
+            deadline = time.monotonic() + timeout
+            while self.active >= self.limit or self._waiting[0] != entry:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                    self._cond.notify_all()
+                    raise LLMUnavailableError("Timed out waiting for an LLM slot")
+                self._cond.wait(remaining)
+
+            heapq.heappop(self._waiting)
+            self.active += 1
+            self._cond.notify_all()
+
+    def release(self) -> None:
+        with self._cond:
+            self.active -= 1
+            self._cond.notify_all()
+
+    def queued(self) -> int:
+        return len(self._waiting)
+
+# ========== CIRCUIT BREAKER ==========
+
+class _CircuitBreaker:
+    """Opens after N consecutive failures; lets one trial call through after the cooldown."""
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.state = "closed"
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._trial_owner: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                self._trial_owner = threading.get_ident()
+                return True
+            return False
+
+    def abandon_trial(self) -> None:
+        """Give up this thread's trial call without a verdict (it never reached the provider)."""
+        with self._lock:
+            if self._trial_in_flight and self._trial_owner == threading.get_ident():
+                self._trial_in_flight = False
+                self._trial_owner = None
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.state = "closed"
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == "half_open" or self.failures >= self.threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+# ========== ACCOUNTING ==========
+
+_stats_lock = threading.Lock()
+STATS: Dict[str, Dict[str, float]] = {}
+
+def _record(mode: str, latency: float, usage=None, error: bool = False, retries: int = 0) -> None:
+    with _stats_lock:
+        s = STATS.setdefault(mode, {
+            "calls": 0, "errors": 0, "retries": 0,
+            "prompt_tokens": 0, "completion_tokens": 0, "latency_seconds": 0.0
+        })
+        s["calls"] += 1
+        s["errors"] += int(error)
+        s["retries"] += retries
+        s["latency_seconds"] += latency
+        if usage is not None:
+            s["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+            s["completion_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+
+def get_stats() -> Dict:
+    """Snapshot of per-mode accounting plus gateway state."""
+    with _stats_lock:
+        modes = {mode: dict(s) for mode, s in STATS.items()}
+    return {
+        "modes": modes,
+        "active": _gate.active,
+        "queued": _gate.queued(),
+        "circuit": _breaker.state
+    }
+
+def _samples():
+    stats = get_stats()
+    for mode, s in stats["modes"].items():
+        for field in ("calls", "errors", "retries", "prompt_tokens", "completion_tokens"):
+            yield f"llm_{field}_total", "counter", {"mode": mode}, s[field]
+        yield "llm_latency_seconds_total", "counter", {"mode": mode}, s["latency_seconds"]
+    yield "llm_active_calls", "gauge", {}, stats["active"]
+    yield "llm_queued_calls", "gauge", {}, stats["queued"]
+    for state in ("closed", "open", "half_open"):
+        yield "llm_circuit_state", "gauge", {"state": state}, int(stats["circuit"] == state)
+
+metrics.register_collector(_samples)
+
+# ========== GATEWAY ==========
+
+_gate = _PriorityGate(LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE)
+_breaker = _CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN_SECONDS)
+_clients: Dict[str, Any] = {}
+_clients_lock = threading.Lock()
+
+def _client(api_key: str):
+    from groq import Groq  # Imported on first call, not at app startup
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            # Retries are handled here, not by the SDK, so they respect the breaker and queue
+            client = _clients[api_key] = Groq(
+                api_key=api_key,
+                base_url=GROQ_BASE_URL,
+                timeout=LLM_TIMEOUT_SECONDS,
+                max_retries=0
+            )
+        return client
+
+def _is_retryable(e: Exception) -> bool:
+    import groq
+    if isinstance(e, (groq.APIConnectionError, groq.APITimeoutError)):
+        return True
+    return isinstance(e, groq.APIStatusError) and (e.status_code == 429 or e.status_code >= 500)
+
+def _backoff(attempt: int, e: Exception) -> float:
+    import groq
+    retry_after = None
+    if isinstance(e, groq.APIStatusError):
+        try:
+            retry_after = float(e.response.headers.get("retry-after"))
+        except (TypeError, ValueError):
+            pass
+    if retry_after is not None:
+        return min(retry_after, LLM_BACKOFF_MAX_SECONDS)
+    # Full jitter: uniform in [0, base * 2^attempt]
+    return random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+def chat_completion(
+    messages: List[Dict[str, str]],
+    mode: str,
+    temperature: float,
+    max_tokens: int,
+    priority: int = PRIORITY_INTERACTIVE,
+    api_key: Optional[str] = None,
+    model: Optional[str] = None
+) -> str:
+    """Run a chat completion and return the stripped message content."""
+    client = _client(api_key or GROQ_API_KEY)
+    start = time.perf_counter()
+    attempt = 0
+
+    while True:
+        if not _breaker.allow():
+            _record(mode, time.perf_counter() - start, error=True, retries=attempt)
+            raise LLMUnavailableError("LLM temporarily unavailable, please retry shortly")
+
+        try:
+            _gate.acquire(priority, LLM_QUEUE_TIMEOUT_SECONDS)
+        except LLMUnavailableError:
+            # Otherwise a half-open breaker would wait forever on a trial that never ran
+            _breaker.abandon_trial()
+            _record(mode, time.perf_counter() - start, error=True, retries=attempt)
+            raise
+        try:
+            completion = client.chat.completions.create(
+                model=model or GROQ_MODEL,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens
+            )
+        except Exception as e:
+            retryable = _is_retryable(e)
+            if retryable:
+                _breaker.record_failure()
+            else:
+                _breaker.record_success()  # The provider answered; the request itself was bad
+            if not retryable or attempt >= LLM_MAX_RETRIES:
+                _record(mode, time.perf_counter() - start, error=True, retries=attempt)
+                raise
+            delay = _backoff(attempt, e)
+            print(f"[LLM] {mode}: {type(e).__name__}, retry {attempt + 1}/{LLM_MAX_RETRIES} in {delay:.1f}s")
+        else:
+            _breaker.record_success()
+            _record(mode, time.perf_counter() - start, usage=completion.usage, retries=attempt)
+            return completion.choices[0].message.content.strip()
+        finally:
+            _gate.release()
+
+        time.sleep(delay)
+        attempt += 1
@@ -1,29 +1,66 @@
 """Production FastAPI backend with JWT authentication."""
+import asyncio
+import sys
+import time
 import uuid
 import json
+from contextlib import asynccontextmanager, suppress
 from pathlib import Path
-from fastapi import FastAPI, UploadFile, File, Form, Depends, HTTPException
+from fastapi import FastAPI, Request, UploadFile, File, Form, Depends, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 from pydantic import BaseModel
-from groq import Groq
 
 from backend.config import *
-from backend.auth import signup, login, verify_token, get_user_profile, update_profile, change_password, request_reset, reset_password
+from backend.auth import signup, login, verify_token, create_token, revoke_token, get_user_profile, update_profile, change_password, request_reset, reset_password
 from backend.email_service import send_welcome_email
-from backend.rag.data_loader import load_and_chunk_pdf, embed_texts
+from backend import email_outbox
+from backend.llm_gateway import chat_completion
+from backend import metrics
+from backend.metrics import span
+from backend.uploads import save_stream, declared_size, UploadRejected
+from backend.rate_limit import rate_limited, record_usage, remaining_quota, flush_usage, flush_loop
+from backend.rag.data_loader import load_pdf_chunks, embed_texts, shutdown_pdf_pool
 from backend.rag.vector_db import QdrantStorage
-from backend.rag.cache import get_cached, cache_response
+from backend.rag.cache import cache_key, get_cached, cache_response
+from backend.rag.singleflight import SingleFlight
+from backend.rag.retrieval import kept_hits, citations, is_confident
+from backend.rag.parents import index_points, expand_hits
+from backend.rag.table_index import index_table, is_indexed
+from backend.rag.cleanup import purge_document
 from backend.user.user_data import add_chat, get_chat_history, get_user_documents, delete_user_document
+from backend import readiness
 
-# Data analysis imports
-from backend.data_analysis.excel_loader import load_excel_or_csv, get_column_info
-from backend.data_analysis.analysis import generate_statistics, detect_trends, find_insights
-from backend.data_analysis.visualization import generate_charts
-from backend.data_analysis.insights_llm import generate_llm_insights, answer_data_question
+# Data analysis imports (the pandas-based modules are imported where used, to keep startup light)
+from backend.data_analysis.insights_llm import memoized_llm_insights, answer_data_question, plan_data_query, phrase_query_result
+from backend.data_analysis import result_store as analysis_store
+from backend.data_analysis.result_store import content_hash
 
-app = FastAPI(title="RAG PDF Chat API", version="3.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    flush_task = asyncio.create_task(flush_loop())
+    email_outbox.start_worker()
+    warmup_task = None
+    if WARMUP_ON_STARTUP:
+        # Serve requests right away; heavy subsystems load behind them
+        warmup_task = asyncio.create_task(asyncio.to_thread(readiness.warm_up))
+    yield
+    if warmup_task is not None:
+        # Stops waiting for it; a model load already running in its thread can't be interrupted
+        warmup_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await warmup_task
+    flush_task.cancel()
+    flush_usage()
+    await asyncio.to_thread(email_outbox.stop_worker)
+    # Only if this worker ever loaded the data-analysis stack
+    workbook = sys.modules.get("backend.data_analysis.workbook")
+    if workbook is not None:
+        workbook.shutdown_pool()
+    shutdown_pdf_pool()
+
+app = FastAPI(title="RAG PDF Chat API", version="3.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -33,6 +70,41 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Body size limits per upload route, checked against Content-Length before the body is read
+UPLOAD_LIMITS_MB = {"/rag/upload": PDF_MAX_UPLOAD_MB, "/data/upload": DATA_MAX_UPLOAD_MB}
+MULTIPART_OVERHEAD_BYTES = 64 * 1024  # Boundaries and the other form fields
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    """Reject oversized uploads from their headers; the streamed copy enforces the limit otherwise."""
+    limit_mb = UPLOAD_LIMITS_MB.get(request.url.path)
+    if limit_mb is not None and request.method == "POST":
+        size = declared_size(request.headers.get("content-length"))
+        if size is not None and size > limit_mb * 1024 * 1024 + MULTIPART_OVERHEAD_BYTES:
+            return JSONResponse(
+                {"success": False, "message": f"File size must be less than {limit_mb}MB"}, status_code=413
+            )
+    return await call_next(request)
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Give every request a trace ID (X-Trace-ID header) and record its latency."""
+    trace_id = metrics.start_trace(f"{request.method} {request.url.path}")
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        # Label by route template, not raw path, to keep the series count bounded
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        metrics.observe("http_request_seconds", time.perf_counter() - start, method=request.method, path=path)
+        metrics.inc("http_requests_total", method=request.method, path=path, status=status)
+        metrics.finish_trace(status)
+    response.headers["X-Trace-ID"] = trace_id
+    return response
+
 # Mount static files (CSS, JS)
 app.mount("/css", StaticFiles(directory="frontend/css"), name="css")
 app.mount("/js", StaticFiles(directory="frontend/js"), name="js")
@@ -72,6 +144,7 @@ class QueryRequest(BaseModel):
 class DataQueryRequest(BaseModel):
     filename: str
     question: str
+    sheet: str | None = None
 
 # ========== AUTH ENDPOINTS ==========
 
@@ -93,6 +166,14 @@ async def login_endpoint(req: LoginRequest):
     except Exception as e:
         return {"success": False, "message": "Login failed"}
 
+@app.post("/auth/logout")
+async def logout_endpoint(authorization: str | None = Header(None), username: str = Depends(verify_token)):
+    try:
+        revoke_token(authorization.split(" ")[1])
+        return {"success": True, "message": "Logged out"}
+    except Exception as e:
+        return {"success": False, "message": "Logout failed"}
+
 @app.post("/auth/forgot-password")
 async def forgot_password_endpoint(req: ForgotPasswordRequest):
     try:
@@ -113,7 +194,8 @@ async def reset_password_endpoint(req: ResetPasswordRequest):
 async def change_password_endpoint(req: ChangePasswordRequest, username: str = Depends(verify_token)):
     try:
         success, msg = change_password(username, req.old_password, req.new_password)
-        return {"success": success, "message": msg}
+        # Every earlier token was revoked; this session carries on with a new one
+        return {"success": success, "message": msg, "data": {"token": create_token(username)} if success else None}
     except Exception as e:
         return {"success": False, "message": "Change failed"}
 
@@ -123,6 +205,9 @@ async def change_password_endpoint(req: ChangePasswordRequest, username: str = D
 async def get_profile_endpoint(username: str = Depends(verify_token)):
     try:
         profile = get_user_profile(username)
+        if profile:
+            for quota_type in ("query_quota", "upload_quota", "analysis_quota"):
+                profile[quota_type] = remaining_quota(username, quota_type)
         return {"success": True, "data": profile}
     except Exception as e:
         return {"success": False, "message": "Failed to fetch profile"}
@@ -149,12 +234,56 @@ async def get_documents_endpoint(username: str = Depends(verify_token)):
     except Exception as e:
         return {"success": False, "message": "Failed to fetch documents"}
 
+_purge_tasks: dict = {}  # (source, requested at) -> asyncio.Task removing its points and cached answers
+
+def _start_purge(username: str, doc: str, requested_at: float) -> asyncio.Task:
+    key = (f"{username}/{doc}", requested_at)
+    
+    async def run():
+        try:
+            return await asyncio.to_thread(purge_document, username, doc, requested_at)
+        except Exception as e:
+            # Whatever is left gets picked up by `python -m backend.rag.cleanup`
+            print(f"[DELETE] Purging {key[0]} failed: {e}")
+            return None
+        finally:
+            _purge_tasks.pop(key, None)
+    
+    _purge_tasks[key] = asyncio.create_task(run())
+    return _purge_tasks[key]
+
 @app.delete("/documents/{doc}")
 async def delete_document_endpoint(doc: str, username: str = Depends(verify_token)):
+    """Delete a PDF with its vectors and the cached answers citing it.
+    
+    Large documents are purged in the background; the file itself is gone
+    before the response either way.
+    """
     try:
-        success = delete_user_document(username, doc)
-        return {"success": success, "message": "Document deleted" if success else "Delete failed"}
+        if Path(doc).name != doc:
+            return {"success": False, "message": "Delete failed"}
+        # Only points indexed before now are purged, so a re-upload on any worker is safe
+        requested_at = time.time()
+        # Cleared before the file goes: a re-upload of the same content, on any worker,
+        # must index again rather than trust points about to be purged
+        analysis_store.put_marker(_pdf_marker_key(f"{username}/{doc}"), {})
+        if not delete_user_document(username, doc):
+            return {"success": False, "message": "Delete failed"}
+        
+        points = await asyncio.to_thread(QdrantStorage().count_source, f"{username}/{doc}")
+        task = _start_purge(username, doc, requested_at)
+        if points >= DELETE_BACKGROUND_MIN_POINTS:
+            return {
+                "success": True,
+                "message": "Document deleted; its index is being cleaned up in the background",
+                "data": {"points": points, "background": True}
+            }
+        removed = await asyncio.shield(task)
+        if removed is None:
+            return {"success": True, "message": "Document deleted; its index will be cleaned up by the next reconciliation"}
+        return {"success": True, "message": "Document deleted", "data": dict(removed, background=False)}
     except Exception as e:
+        print(f"[DELETE ERROR] {doc}: {e}")
         return {"success": False, "message": "Delete failed"}
 
 @app.get("/history")
@@ -167,8 +296,18 @@ async def get_history_endpoint(username: str = Depends(verify_token)):
 
 # ========== PDF UPLOAD ==========
 
+def _pdf_marker_key(source: str) -> str:
+    return content_hash(f"pdf_index\0{source}".encode())
+
+def _pdf_chunking() -> list:
+    return [PDF_CHUNKER, CHUNK_SIZE, CHUNK_OVERLAP, SMALL_TO_BIG and [CHILD_CHUNK_SIZE, CHILD_CHUNK_OVERLAP], EMBEDDING_MODEL]
+
+def _pdf_indexed(source: str) -> dict:
+    """What the last successful upload of this source indexed: {'digest', 'chunks', 'points', 'chunking'}, or {}."""
+    return analysis_store.get_marker(_pdf_marker_key(source)) or {}
+
 @app.post("/rag/upload")
-async def upload_endpoint(file: UploadFile = File(...), username: str = Depends(verify_token)):
+async def upload_endpoint(file: UploadFile = File(...), username: str = Depends(rate_limited("upload"))):
     try:
         print(f"\n[UPLOAD] User: {username}, File: {file.filename}")
         
@@ -176,36 +315,68 @@ async def upload_endpoint(file: UploadFile = File(...), username: str = Depends(
         if not file.filename.lower().endswith('.pdf'):
             return {"success": False, "message": "Only PDF files allowed"}
         
-        upload_path = Path(UPLOADS_DIR) / username
-        upload_path.mkdir(parents=True, exist_ok=True)
-        file_path = upload_path / file.filename
+        file_path = Path(UPLOADS_DIR) / username / file.filename
         
-        # Save file
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
-        print(f"[UPLOAD] Saved to: {file_path}")
+        # Stream to disk: constant memory per upload, size limit enforced as it's read
+        with span("upload", "save"):
+            try:
+                saved = await asyncio.to_thread(
+                    save_stream, file.file, file_path, PDF_MAX_UPLOAD_MB * 1024 * 1024, PDF_COUNT_PAGES, b"%PDF-"
+                )
+            except UploadRejected as e:
+                return {"success": False, "message": str(e)}
+        print(f"[UPLOAD] Saved to: {file_path} ({saved['size']} bytes, {saved['pages'] or '?'} pages)")
+        
+        source_id = f"{username}/{file.filename}"
+        
+        indexed = _pdf_indexed(source_id)
+        if indexed.get('digest') == saved['digest'] and indexed.get('chunking') == _pdf_chunking():
+            if await asyncio.to_thread(QdrantStorage().count_source, source_id) == indexed.get('points'):
+                print(f"[UPLOAD] Unchanged re-upload of {source_id}, keeping its index")
+                record_usage(username, "upload")
+                return {
+                    "success": True,
+                    "message": "Upload successful",
+                    "data": {
+                        "chunks": indexed['chunks'], "pages": saved['pages'], "deduplicated": True,
+                        "trace_id": metrics.trace_id(), "timings_ms": metrics.timings()
+                    }
+                }
         
         # Process PDF
-        chunks = load_and_chunk_pdf(str(file_path.resolve()))
+        with span("upload", "chunk"):
+            chunks = await asyncio.to_thread(load_pdf_chunks, str(file_path.resolve()))
         print(f"[UPLOAD] Chunked into {len(chunks)} pieces")
         
         if not chunks:
             return {"success": False, "message": "PDF appears to be empty"}
         
-        # Generate embeddings
-        vectors = embed_texts(chunks)
+        # Generate embeddings (of the small child chunks, with SMALL_TO_BIG)
+        points = await asyncio.to_thread(index_points, chunks, saved['digest'])
+        with span("upload", "embed"):
+            vectors = await asyncio.to_thread(embed_texts, [point["text"] for point in points])
         print(f"[UPLOAD] Generated {len(vectors)} embeddings")
         
         # Store in Qdrant
-        source_id = f"{username}/{file.filename}"
-        ids = [str(uuid.uuid5(uuid.NAMESPACE_URL, f"{source_id}:{i}")) for i in range(len(chunks))]
-        payloads = [{"text": chunk, "source": source_id} for chunk in chunks]
+        ids = [str(uuid.uuid5(uuid.NAMESPACE_URL, f"{source_id}:{i}")) for i in range(len(points))]
+        payloads = [dict(point, source=source_id, type="pdf", digest=saved['digest']) for point in points]
         
-        QdrantStorage().upsert(ids, vectors, payloads)
+        with span("upload", "upsert"):
+            store = QdrantStorage()
+            store.upsert(ids, vectors, payloads)
+            # Chunks of a previous, longer version beyond this one's count would otherwise linger
+            store.delete_stale(source_id, saved['digest'])
+        analysis_store.put_marker(_pdf_marker_key(source_id), {
+            'digest': saved['digest'], 'chunks': len(chunks), 'points': len(points), 'chunking': _pdf_chunking()
+        })
         print(f"[UPLOAD] Stored in Qdrant with source: {source_id}")
+        record_usage(username, "upload")
         
-        return {"success": True, "message": "Upload successful", "data": {"chunks": len(chunks)}}
+        return {
+            "success": True,
+            "message": "Upload successful",
+            "data": {"chunks": len(chunks), "pages": saved['pages'], "trace_id": metrics.trace_id(), "timings_ms": metrics.timings()}
+        }
     except Exception as e:
         print(f"[UPLOAD ERROR] {str(e)}")
         import traceback
@@ -214,199 +385,200 @@ async def upload_endpoint(file: UploadFile = File(...), username: str = Depends(
 
 # ========== RAG QUERY ==========
 
-@app.post("/rag/query")
-async def query_endpoint(req: QueryRequest, username: str = Depends(verify_token)):
-    try:
-        from backend.rag.prompts import (
-            DOCUMENT_SYSTEM_PROMPT, GENERAL_SYSTEM_PROMPT, CONVERSATIONAL_PROMPT, SUMMARY_SYSTEM_PROMPT,
-            create_document_prompt, create_general_prompt, create_conversational_prompt, create_summary_prompt,
-            format_response, is_conversational, is_summary_request
-        )
-        from backend.config import MIN_CONTEXT_CHUNKS, FALLBACK_THRESHOLD
-        
-        print(f"\n[QUERY] User: {username}, Question: {req.question}")
-        
-        # Handle conversational queries
-        if is_conversational(req.question):
-            print("[QUERY] Detected conversational query")
-            client = Groq(api_key=GROQ_API_KEY)
-            completion = client.chat.completions.create(
-                model=GROQ_MODEL,
-                messages=[
+# Identical in-flight queries (same cache key) share one retrieval + LLM call
+query_flight = SingleFlight("rag_query")
+
+def _run_query(req: QueryRequest, username: str) -> dict:
+    """Answer a RAG query. Blocking; runs in a worker thread."""
+    from backend.rag.prompts import (
+        DOCUMENT_SYSTEM_PROMPT, GENERAL_SYSTEM_PROMPT, CONVERSATIONAL_PROMPT, SUMMARY_SYSTEM_PROMPT,
+        create_document_prompt, create_general_prompt, create_conversational_prompt, create_summary_prompt,
+        format_response, is_conversational, is_summary_request
+    )
+    
+    print(f"\n[QUERY] User: {username}, Question: {req.question}")
+    
+    # Handle conversational queries
+    if is_conversational(req.question):
+        print("[QUERY] Detected conversational query")
+        with span("query", "llm"):
+            answer = format_response(chat_completion(
+                [
                     {"role": "system", "content": CONVERSATIONAL_PROMPT},
                     {"role": "user", "content": create_conversational_prompt(req.question)}
                 ],
+                mode="conversational",
                 temperature=0.3,
                 max_tokens=150
-            )
-            answer = format_response(completion.choices[0].message.content.strip())
-            response = {"answer": answer, "sources": [], "num_contexts": 0, "mode": "conversational"}
-            return {"success": True, "data": response}
-        
-        # Detect summary request BEFORE retrieval
-        if is_summary_request(req.question):
-            print("[QUERY] Detected FULL DOCUMENT SUMMARY request")
-            
-            # Get ALL chunks for user's documents (or selected documents)
-            store = QdrantStorage()
-            
-            # Retrieve many chunks (no semantic search, just get document content)
-            # Use a dummy vector to get all user's documents
-            from backend.rag.data_loader import get_model
-            dummy_query = "document content"
-            query_vector = get_model().encode([dummy_query], convert_to_numpy=True)[0].tolist()
-            
-            # Get up to 50 chunks (adjust based on token limits)
+            ))
+        response = {"answer": answer, "sources": [], "num_contexts": 0, "mode": "conversational"}
+        record_usage(username, "query")
+        return response
+    
+    # Detect summary request BEFORE retrieval
+    if is_summary_request(req.question):
+        print("[QUERY] Detected FULL DOCUMENT SUMMARY request")
+        
+        # Get ALL chunks for user's documents (or selected documents)
+        store = QdrantStorage()
+        
+        # Retrieve many chunks (no semantic search, just get document content)
+        # Use a dummy vector to get all user's documents
+        dummy_query = "document content"
+        with span("query", "embed"):
+            query_vector = embed_texts([dummy_query])[0]
+        
+        # Get up to 50 chunks (adjust based on token limits)
+        with span("query", "vector_search"):
             found = store.search(query_vector, top_k=50, score_threshold=0.0)  # No threshold, get all
-            
-            # Filter by username and selected documents
-            filtered_contexts, filtered_sources = [], []
-            for ctx, src in zip(found["contexts"], found["sources"]):
-                if not src.startswith(f"{username}/"):
-                    continue
-                if req.selected_documents:
-                    doc_name = src.split("/", 1)[1] if "/" in src else src
-                    if doc_name not in req.selected_documents:
-                        continue
-                filtered_contexts.append(ctx)
-                filtered_sources.append(src)
-            
-            print(f"[QUERY] SUMMARY MODE: Retrieved {len(filtered_contexts)} chunks")
-            
-            if not filtered_contexts:
-                # User has no documents uploaded
-                return {
-                    "success": True,
-                    "data": {
-                        "answer": "No documents have been uploaded yet. Please upload a PDF to get a summary.",
-                        "sources": [],
-                        "num_contexts": 0,
-                        "mode": "summary_no_docs"
-                    }
-                }
-            
-            # Combine chunks (token-safe: limit to ~3000 tokens = ~12000 chars)
-            combined_content = "\n\n".join(filtered_contexts[:30])  # ~30 chunks max
-            
-            client = Groq(api_key=GROQ_API_KEY)
-            completion = client.chat.completions.create(
-                model=GROQ_MODEL,
-                messages=[
-                    {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
-                    {"role": "user", "content": create_summary_prompt(combined_content)}
-                ],
-                temperature=0.2,
-                max_tokens=800
-            )
-            
-            answer = format_response(completion.choices[0].message.content.strip())
-            response = {
-                "answer": answer,
-                "sources": list(set(filtered_sources)),
-                "num_contexts": len(filtered_contexts),
-                "mode": "full_document_summary"
+        
+        # Filter by username and selected documents
+        with span("query", "filter"):
+            kept = kept_hits(found, username, req.selected_documents)
+        
+        print(f"[QUERY] SUMMARY MODE: Retrieved {len(kept)} chunks")
+        
+        if not kept:
+            # User has no documents uploaded
+            return {
+                "answer": "No documents have been uploaded yet. Please upload a PDF to get a summary.",
+                "sources": [],
+                "num_contexts": 0,
+                "mode": "summary_no_docs"
             }
-            
-            # Cache and save
+        
+        # Combine chunks (token-safe: ~30 chunks, or ~3000 tokens of parent passages)
+        with span("query", "expand"):
+            expanded = expand_hits(found, kept, 30, SUMMARY_CONTEXT_TOKENS if SMALL_TO_BIG else None)
+        with span("query", "prompt_build"):
+            combined_content = "\n\n".join(expanded["contexts"])
+            messages = [
+                {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+                {"role": "user", "content": create_summary_prompt(combined_content)}
+            ]
+        
+        with span("query", "llm"):
+            answer = format_response(chat_completion(messages, mode="summary", temperature=0.2, max_tokens=800))
+        response = {
+            "answer": answer,
+            "sources": list(set(expanded["sources"])),
+            "num_contexts": len(expanded["contexts"]),
+            "mode": "full_document_summary"
+        }
+        
+        # Cache and save
+        with span("query", "history_write"):
             cache_response(req.question, username, req.selected_documents or [], response)
             add_chat(username, req.question, answer, response["sources"])
-            
-            return {"success": True, "data": response}
+        record_usage(username, "query")
         
-        # Regular semantic search for specific questions
-        # Check cache
+        return response
+    
+    # Regular semantic search for specific questions
+    # Check cache
+    with span("query", "cache_lookup"):
         cached = get_cached(req.question, username, req.selected_documents or [])
-        if cached:
-            print("[QUERY] Returning cached response")
-            return {"success": True, "data": cached}
-        
-        # Search vector DB
-        store = QdrantStorage()
+    if cached:
+        print("[QUERY] Returning cached response")
+        if not QUOTA_EXEMPT_CACHED:
+            record_usage(username, "query")
+        return cached
+    
+    # Search vector DB
+    store = QdrantStorage()
+    with span("query", "embed"):
         query_vector = embed_texts([req.question])[0]
-        
-        # Use configured top_k
-        found = store.search(query_vector, req.top_k, score_threshold=0.25)
-        
-        print(f"[QUERY] Found {len(found['contexts'])} contexts, best score: {found.get('best_score', 0):.3f}")
+    
+    # Use configured top_k; children are small and often share a parent, so fetch more of them
+    with span("query", "vector_search"):
+        top_k = req.top_k * CHILD_TOP_K_FACTOR if SMALL_TO_BIG else req.top_k
+        found = store.search(query_vector, top_k, score_threshold=QUERY_SCORE_THRESHOLD)
+    
+    print(f"[QUERY] Found {len(found['contexts'])} contexts, best score: {found.get('best_score', 0):.3f}")
 
-        # Filter by username and selected documents
-        filtered_contexts, filtered_sources, filtered_scores = [], [], []
-        for i, (ctx, src) in enumerate(zip(found["contexts"], found["sources"])):
-            if not src.startswith(f"{username}/"):
-                continue
-            if req.selected_documents:
-                doc_name = src.split("/", 1)[1] if "/" in src else src
-                if doc_name not in req.selected_documents:
-                    continue
-            filtered_contexts.append(ctx)
-            filtered_sources.append(src)
-            if i < len(found.get("scores", [])):
-                filtered_scores.append(found["scores"][i])
-        
-        print(f"[QUERY] After filtering: {len(filtered_contexts)} contexts")
-        
-        # Determine if we have confident context
-        has_confident_context = (
-            len(filtered_contexts) >= MIN_CONTEXT_CHUNKS and
-            (filtered_scores and max(filtered_scores) >= FALLBACK_THRESHOLD)
-        )
-        
-        client = Groq(api_key=GROQ_API_KEY)
-        
-        if has_confident_context:
-            # Use document-based answering
-            print(f"[QUERY] Using DOCUMENT mode (score: {max(filtered_scores):.3f})")
-            context_limit = min(8, len(filtered_contexts))
-            context_block = "\n\n".join(filtered_contexts[:context_limit])
-            
-            completion = client.chat.completions.create(
-                model=GROQ_MODEL,
-                messages=[
-                    {"role": "system", "content": DOCUMENT_SYSTEM_PROMPT},
-                    {"role": "user", "content": create_document_prompt(context_block, req.question)}
-                ],
-                temperature=0.15,
-                max_tokens=600
+    # Filter by username and selected documents
+    with span("query", "filter"):
+        kept = kept_hits(found, username, req.selected_documents)
+        filtered_scores = [found["scores"][i] for i in kept]
+    
+    print(f"[QUERY] After filtering: {len(kept)} contexts")
+    
+    # Determine if we have confident context
+    if is_confident(filtered_scores):
+        # Use document-based answering
+        print(f"[QUERY] Using DOCUMENT mode (score: {max(filtered_scores):.3f})")
+        with span("query", "expand"):
+            # Parents of the best hits, adjacent ones merged, within the prompt budget
+            expanded = expand_hits(
+                found, kept, min(DOCUMENT_CONTEXT_LIMIT, req.top_k), DOCUMENT_CONTEXT_TOKENS if SMALL_TO_BIG else None
             )
-            
-            answer = format_response(completion.choices[0].message.content.strip())
-            response = {
-                "answer": answer,
-                "sources": list(set(filtered_sources[:context_limit])),
-                "num_contexts": context_limit,
-                "mode": "document",
-                "confidence": max(filtered_scores)
-            }
-            
-        else:
-            # Use general knowledge fallback ONLY when no chunks AND not summary request
-            print(f"[QUERY] Using GENERAL KNOWLEDGE mode (low/no context)")
-            completion = client.chat.completions.create(
-                model=GROQ_MODEL,
-                messages=[
+        with span("query", "prompt_build"):
+            context_block = "\n\n".join(expanded["contexts"])
+            messages = [
+                {"role": "system", "content": DOCUMENT_SYSTEM_PROMPT},
+                {"role": "user", "content": create_document_prompt(context_block, req.question)}
+            ]
+        
+        with span("query", "llm"):
+            answer = format_response(chat_completion(messages, mode="document", temperature=0.15, max_tokens=600))
+        response = {
+            "answer": answer,
+            "sources": list(set(expanded["sources"])),
+            "citations": citations(found, [i for group in expanded["indices"] for i in group]),
+            "num_contexts": len(expanded["contexts"]),
+            "mode": "document",
+            "confidence": max(filtered_scores)
+        }
+        
+    else:
+        # Use general knowledge fallback ONLY when no chunks AND not summary request
+        print(f"[QUERY] Using GENERAL KNOWLEDGE mode (low/no context)")
+        with span("query", "llm"):
+            answer = format_response(chat_completion(
+                [
                     {"role": "system", "content": GENERAL_SYSTEM_PROMPT},
                     {"role": "user", "content": create_general_prompt(req.question)}
                 ],
+                mode="general_knowledge",
                 temperature=0.2,
                 max_tokens=400
-            )
-            
-            answer = format_response(completion.choices[0].message.content.strip())
-            response = {
-                "answer": answer,
-                "sources": [],
-                "num_contexts": 0,
-                "mode": "general_knowledge",
-                "confidence": 0.0
-            }
-        
-        print(f"[QUERY] Mode: {response['mode']}, Answer length: {len(answer)} chars")
-        
-        # Cache and save
+            ))
+        response = {
+            "answer": answer,
+            "sources": [],
+            "num_contexts": 0,
+            "mode": "general_knowledge",
+            "confidence": 0.0
+        }
+    
+    print(f"[QUERY] Mode: {response['mode']}, Answer length: {len(answer)} chars")
+    
+    # Cache and save
+    with span("query", "history_write"):
         cache_response(req.question, username, req.selected_documents or [], response)
         add_chat(username, req.question, answer, response.get("sources", []))
-        
-        return {"success": True, "data": response}
+    record_usage(username, "query")
+    
+    return response
+
+@app.post("/rag/query")
+async def query_endpoint(req: QueryRequest, username: str = Depends(rate_limited("query"))):
+    try:
+        key = cache_key(req.question, username, req.selected_documents or [])
+        response, coalesced = await query_flight.do(
+            key,
+            lambda: asyncio.to_thread(_run_query, req, username),
+            timeout=COALESCE_TIMEOUT_SECONDS
+        )
+        if coalesced:
+            print(f"[QUERY] Coalesced with in-flight request for: {req.question}")
+            if not QUOTA_EXEMPT_CACHED:
+                record_usage(username, "query")
+            metrics.inc("rag_query_coalesced_total")
+        # Copy: the response dict is shared with coalesced callers and the cache
+        data = dict(response, trace_id=metrics.trace_id(), timings_ms=metrics.timings())
+        metrics.inc("rag_queries_total", mode=response.get("mode", "unknown"))
+        return {"success": True, "data": data}
         
     except Exception as e:
         print(f"[QUERY ERROR] {str(e)}")
@@ -417,12 +589,167 @@ async def query_endpoint(req: QueryRequest, username: str = Depends(verify_token
 
 # ========== DATA ANALYSIS ENDPOINTS ==========
 
-# Storage for analysis results (in production, use database)
-ANALYSIS_CACHE = {}
+sheet_flight = SingleFlight("data_sheet")
+
+# Built after upload, off the request path; /data/analysis reports their status
+BACKGROUND_SECTIONS = ['charts', 'llm_insights']
+
+def _requested_sheets(sheets: str | None, available: list) -> list:
+    """Parse the requested sheet subset (JSON list or comma-separated); all sheets by default."""
+    if not available:
+        return [None]  # CSV: a single unnamed sheet
+    if not sheets:
+        return available
+    requested = json.loads(sheets) if sheets.strip().startswith("[") else [s.strip() for s in sheets.split(",") if s.strip()]
+    missing = [s for s in requested if s not in available]
+    if missing:
+        raise ValueError(f"Sheet(s) not found: {', '.join(missing)}")
+    return list(dict.fromkeys(requested))
+
+_section_tasks: dict = {}   # section key -> asyncio.Task building it in this worker
+_section_errors: dict = {}  # section key -> error of its last failed build
+
+async def _build_section(name: str, file_path: Path, cached: dict):
+    if name == 'charts':
+        from backend.data_analysis.workbook import sheet_charts, get_pool
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            get_pool(), sheet_charts, str(file_path), cached['metadata'].get('sheet'), cached['stats'], cached.get('trends')
+        )
+    if name == 'llm_insights':
+        return await asyncio.to_thread(memoized_llm_insights, cached['stats'], GROQ_API_KEY, GROQ_MODEL, cached.get('trends'))
+    raise ValueError(f"Unknown section: {name}")
+
+def _start_section(name: str, digest: str, file_path: Path, cached: dict) -> asyncio.Task:
+    """Build and store a section in the background, unless this worker is already building it."""
+    key = analysis_store.section_key(digest, cached['metadata'].get('sheet'), name)
+    task = _section_tasks.get(key)
+    if task is not None:
+        return task
+    
+    async def run():
+        try:
+            value = await _build_section(name, file_path, cached)
+            analysis_store.put(key, {name: value})
+            _section_errors.pop(key, None)
+            return value
+        except Exception as e:
+            print(f"[DATA] Building {name} for {file_path.name} failed: {e}")
+            _section_errors[key] = str(e)
+            raise
+        finally:
+            _section_tasks.pop(key, None)
+    
+    task = _section_tasks[key] = asyncio.create_task(run())
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    return task
+
+def _section_status(name: str, digest: str, file_path: Path, cached: dict) -> dict:
+    """{'status': 'ready' | 'pending' | 'failed', 'value', 'error'}, starting the build if needed.
+    
+    A failure is reported once; the next request retries the build.
+    """
+    if name in cached:  # Stored inline by older versions
+        return {'status': 'ready', 'value': cached[name], 'error': None}
+    key = analysis_store.section_key(digest, cached['metadata'].get('sheet'), name)
+    stored = analysis_store.get_by_hash(key)
+    if stored is not None:
+        return {'status': 'ready', 'value': stored[name], 'error': None}
+    if key not in _section_tasks and key in _section_errors:
+        return {'status': 'failed', 'value': None, 'error': _section_errors.pop(key)}
+    _start_section(name, digest, file_path, cached)
+    return {'status': 'pending', 'value': None, 'error': None}
+
+async def _await_section(name: str, digest: str, file_path: Path, cached: dict):
+    """A section's value, waiting for (or starting) its build if it isn't stored yet."""
+    key = analysis_store.section_key(digest, cached['metadata'].get('sheet'), name)
+    stored = analysis_store.get_by_hash(key)
+    if stored is not None:
+        return stored[name]
+    # shield: a client disconnecting must not cancel the shared build
+    return await asyncio.shield(_start_section(name, digest, file_path, cached))
+
+_index_tasks: dict = {}  # (source, digest, sheet) -> asyncio.Task indexing it for RAG
+
+def _start_table_index(username: str, filename: str, file_path: Path, digest: str, cached: dict) -> None:
+    """Index an analysed sheet into the vector store in the background, so RAG questions can retrieve it."""
+    key = (f"{username}/{filename}", digest, cached['metadata'].get('sheet'))
+    if key in _index_tasks or is_indexed(*key):
+        return
+    
+    async def run():
+        try:
+            await asyncio.to_thread(index_table, username, filename, file_path, digest, cached)
+        except Exception as e:
+            print(f"[DATA] Indexing {filename} for RAG failed: {e}")
+        finally:
+            _index_tasks.pop(key, None)
+    
+    _index_tasks[key] = asyncio.create_task(run())
+
+async def _analyze_and_store(file_path: Path, digest: str, sheets: list, available: list) -> dict:
+    """Analyse sheets across the process pool and store each result.
+    
+    Returns {sheet: stored result or {'error': ...}}. The first sheet stored for
+    a file becomes its default and is kept under the content hash itself.
+    Charts and LLM insights are then built in the background.
+    """
+    from backend.data_analysis.workbook import analyze_sheets
+    results = await asyncio.to_thread(analyze_sheets, str(file_path), sheets)
+    
+    stored = {}
+    for sheet in sheets:
+        result = results[sheet]
+        if not result.pop('success'):
+            stored[sheet] = {'error': result['error']}
+            continue
+        # Another upload of the same content may have stored a default sheet meanwhile: never overwrite it
+        stored[sheet] = None
+        if analysis_store.get_by_hash(digest) is None:
+            stored[sheet] = analysis_store.put_if_absent(digest, dict(result, sheet=sheet, sheets=available))
+        if stored[sheet] is None:
+            stored[sheet] = analysis_store.put(analysis_store.sheet_key(digest, sheet), result)
+        for name in BACKGROUND_SECTIONS:
+            _section_status(name, digest, file_path, stored[sheet])
+    return stored
+
+async def _get_analysis(username: str, filename: str, sheet: str | None = None) -> dict | None:
+    """Stored analysis of a file or sheet. Sheets not requested at upload are analysed on first access."""
+    digest = analysis_store.lookup_hash(username, filename)
+    if digest is None:
+        return None
+    cached = analysis_store.get_sheet(digest, sheet)
+    if cached is not None:
+        return cached
+    
+    default = analysis_store.get_by_hash(digest)
+    file_path = Path(UPLOADS_DIR) / username / "data" / filename
+    if default is None or sheet not in default.get('sheets', []) or not file_path.exists():
+        return None
+    
+    print(f"[DATA] Analysing sheet '{sheet}' of {filename} on first access")
+    stored, coalesced = await sheet_flight.do(
+        f"{digest}/{sheet}",
+        lambda: _analyze_and_store(file_path, digest, [sheet], default['sheets'])
+    )
+    if 'error' in stored[sheet]:
+        raise ValueError(stored[sheet]['error'])
+    if not coalesced:
+        # Just analysed and stored; later fetches return from the store above
+        _start_table_index(username, filename, file_path, digest, stored[sheet])
+    return stored[sheet]
 
 @app.post("/data/upload")
-async def upload_data_file(file: UploadFile = File(...), username: str = Depends(verify_token)):
-    """Upload Excel or CSV file for analysis."""
+async def upload_data_file(
+    file: UploadFile = File(...),
+    sheets: str | None = Form(None),
+    username: str = Depends(rate_limited("analysis"))
+):
+    """Upload Excel or CSV file for analysis.
+    
+    For workbooks, `sheets` picks the sheets to analyse now (all by default);
+    the others are analysed when first requested.
+    """
     try:
         print(f"\n[DATA UPLOAD] User: {username}, File: {file.filename}")
         
@@ -432,69 +759,58 @@ async def upload_data_file(file: UploadFile = File(...), username: str = Depends
         if file_ext not in allowed_extensions:
             return {"success": False, "message": f"Only {', '.join(allowed_extensions)} files allowed"}
         
-        # Validate file size (10MB max)
-        content = await file.read()
-        if len(content) > 10 * 1024 * 1024:
-            return {"success": False, "message": "File size must be less than 10MB"}
+        # Stream to disk, hashing as it goes; the size limit is enforced while reading
+        file_path = Path(UPLOADS_DIR) / username / "data" / file.filename
+        try:
+            saved = await asyncio.to_thread(save_stream, file.file, file_path, DATA_MAX_UPLOAD_MB * 1024 * 1024)
+        except UploadRejected as e:
+            return {"success": False, "message": str(e)}
         
-        # Save file
-        data_path = Path(UPLOADS_DIR) / username / "data"
-        data_path.mkdir(parents=True, exist_ok=True)
-        file_path = data_path / file.filename
+        print(f"[DATA UPLOAD] Saved to: {file_path}")
         
-        with open(file_path, "wb") as f:
-            f.write(content)
+        from backend.data_analysis.columnar import list_sheets
+        available = list_sheets(file_path)
+        try:
+            requested = _requested_sheets(sheets, available)
+        except ValueError as e:
+            return {"success": False, "message": str(e)}
         
-        print(f"[DATA UPLOAD] Saved to: {file_path}")
+        # Identical content uploaded before (by anyone, under any name): reuse its analysis
+        digest = saved['digest']
+        pending = [sheet for sheet in requested if analysis_store.get_sheet(digest, sheet) is None]
+        if len(pending) < len(requested):
+            print(f"[DATA UPLOAD] Reusing stored analysis {digest[:12]}")
         
-        # Load and analyze
-        result = load_excel_or_csv(str(file_path))
-        
-        if not result['success']:
-            return {"success": False, "message": result['error']}
-        
-        df = result['dataframe']
-        metadata = result['metadata']
-        
-        # Generate statistics
-        stats = generate_statistics(df)
-        trends = detect_trends(df)
-        insights = find_insights(df, stats)
-        
-        # Generate charts
-        charts = generate_charts(df)
-        
-        # Generate LLM insights
-        llm_insights = generate_llm_insights(stats, GROQ_API_KEY, GROQ_MODEL)
-        
-        # Get column info
-        column_info = get_column_info(df)
-        
-        # Cache results
-        cache_key = f"{username}_{file.filename}"
-        ANALYSIS_CACHE[cache_key] = {
-            'metadata': metadata,
-            'stats': stats,
-            'trends': trends,
-            'insights': insights,
-            'charts': charts,
-            'llm_insights': llm_insights,
-            'column_info': column_info,
-            'df_info': {
-                'columns': df.columns.tolist(),
-                'dtypes': {col: str(dtype) for col, dtype in df.dtypes.items()}
-            }
-        }
+        failed = {}
+        if pending:
+            print(f"[DATA UPLOAD] Analysing {len(pending)} sheet(s): {pending}")
+            stored = await _analyze_and_store(file_path, digest, pending, available)
+            failed = {str(sheet): r['error'] for sheet, r in stored.items() if 'error' in r}
+            if analysis_store.get_by_hash(digest) is None:
+                return {"success": False, "message": next(iter(failed.values()))}
         
-        print(f"[DATA UPLOAD] Analysis complete: {len(charts)} charts generated")
+        analysis_store.link(username, file.filename, digest)
+        default = analysis_store.get_by_hash(digest)
+        for sheet in requested:
+            cached = analysis_store.get_sheet(digest, sheet)
+            if cached is not None:
+                _start_table_index(username, file.filename, file_path, digest, cached)
+        metadata = dict(default['metadata'], filename=file.filename)
+        
+        print(f"[DATA UPLOAD] Analysis complete: {len(requested) - len(failed)} sheet(s)")
+        if pending:
+            record_usage(username, "analysis")
         
         return {
             "success": True,
             "message": "File uploaded and analyzed successfully",
             "data": {
                 "filename": file.filename,
+                "sheet": default.get('sheet'),
+                "sheets": available,
+                "failed_sheets": failed,
                 "metadata": metadata,
-                "column_info": column_info,
+                "column_info": default['column_info'],
                 "preview": metadata['preview']
             }
         }
@@ -506,24 +822,38 @@ async def upload_data_file(file: UploadFile = File(...), username: str = Depends
         return {"success": False, "message": f"Upload failed: {str(e)}"}
 
 @app.get("/data/analysis/{filename}")
-async def get_data_analysis(filename: str, username: str = Depends(verify_token)):
-    """Get full analysis results for a file."""
+async def get_data_analysis(filename: str, sheet: str | None = None, username: str = Depends(verify_token)):
+    """Get full analysis results for a file, or for one sheet of a workbook."""
     try:
-        cache_key = f"{username}_{filename}"
+        cached = await _get_analysis(username, filename, sheet)
         
-        if cache_key not in ANALYSIS_CACHE:
+        if cached is None:
             return {"success": False, "message": "Analysis not found. Please upload the file first."}
         
-        cached = ANALYSIS_CACHE[cache_key]
+        digest = analysis_store.lookup_hash(username, filename)
+        file_path = Path(UPLOADS_DIR) / username / "data" / filename
+        llm = _section_status('llm_insights', digest, file_path, cached)
+        charts = _section_status('charts', digest, file_path, cached)
         
         return {
             "success": True,
             "data": {
+                "sheet": cached['metadata'].get('sheet'),
                 "stats": cached['stats'],
                 "trends": cached['trends'],
                 "insights": cached['insights'],
-                "llm_insights": cached['llm_insights'],
-                "column_info": cached['column_info']
+                "llm_insights": llm['value'],
+                "column_info": cached['column_info'],
+                # Statistics come from the upload's parsing pass; the rest is built in the background
+                "status": {
+                    "stats": "ready",
+                    "trends": "ready",
+                    "insights": "ready",
+                    "column_info": "ready",
+                    "charts": charts['status'],
+                    "llm_insights": llm['status']
+                },
+                "errors": {name: section['error'] for name, section in [('charts', charts), ('llm_insights', llm)] if section['error']}
             }
         }
         
@@ -531,19 +861,22 @@ async def get_data_analysis(filename: str, username: str = Depends(verify_token)
         return {"success": False, "message": f"Failed to retrieve analysis: {str(e)}"}
 
 @app.get("/data/charts/{filename}")
-async def get_data_charts(filename: str, username: str = Depends(verify_token)):
-    """Get visualization charts for a file."""
+async def get_data_charts(filename: str, sheet: str | None = None, username: str = Depends(verify_token)):
+    """Get visualization charts for a file, or for one sheet of a workbook."""
     try:
-        cache_key = f"{username}_{filename}"
+        cached = await _get_analysis(username, filename, sheet)
         
-        if cache_key not in ANALYSIS_CACHE:
+        if cached is None:
             return {"success": False, "message": "Charts not found. Please upload the file first."}
         
-        charts = ANALYSIS_CACHE[cache_key]['charts']
+        digest = analysis_store.lookup_hash(username, filename)
+        file_path = Path(UPLOADS_DIR) / username / "data" / filename
+        charts = await _await_section('charts', digest, file_path, cached)
         
         return {
             "success": True,
             "data": {
+                "sheet": cached['metadata'].get('sheet'),
                 "charts": charts,
                 "count": len(charts)
             }
@@ -552,32 +885,78 @@ async def get_data_charts(filename: str, username: str = Depends(verify_token)):
     except Exception as e:
         return {"success": False, "message": f"Failed to retrieve charts: {str(e)}"}
 
+async def _run_data_plan(username: str, filename: str, cached: dict, plan: dict) -> dict:
+    """Execute a validated query plan against the file's columnar copy, cached per (file, sheet, plan)."""
+    from backend.data_analysis.query_plan import run_plan, canonical
+    from backend.data_analysis.workbook import get_pool
+    sheet = cached['metadata'].get('sheet')
+    key = analysis_store.query_key(analysis_store.lookup_hash(username, filename), sheet, canonical(plan))
+    stored = analysis_store.get_by_hash(key)
+    if stored is not None:
+        return stored
+    
+    file_path = Path(UPLOADS_DIR) / username / "data" / filename
+    if not file_path.exists():
+        raise ValueError("Source file is no longer available")
+    
+    async def run():
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(get_pool(), run_plan, plan, str(file_path), sheet, cached['df_info']['dtypes'])
+        return analysis_store.put(key, result)
+    
+    result, _ = await sheet_flight.do(f"query/{key}", run)
+    return result
+
 @app.post("/data/query")
-async def query_data(req: DataQueryRequest, username: str = Depends(verify_token)):
-    """Answer questions about uploaded data."""
+async def query_data(req: DataQueryRequest, username: str = Depends(rate_limited("analysis"))):
+    """Answer questions about uploaded data.
+    
+    The LLM first turns the question into a restricted query plan, which is
+    validated and executed over the full data; the result is then phrased as
+    the answer. Questions that need no computation, or whose plan can't be
+    run, are answered from the summary statistics.
+    """
     try:
-        cache_key = f"{username}_{req.filename}"
+        cached = await _get_analysis(username, req.filename, req.sheet)
         
-        if cache_key not in ANALYSIS_CACHE:
+        if cached is None:
             return {"success": False, "message": "Data not found. Please upload the file first."}
         
-        cached = ANALYSIS_CACHE[cache_key]
+        plan, result = None, None
+        try:
+            raw_plan = await asyncio.to_thread(
+                plan_data_query, req.question, cached['stats'], cached['df_info'], GROQ_API_KEY, GROQ_MODEL
+            )
+            if raw_plan is not None:
+                from backend.data_analysis.query_plan import validate_plan
+                plan = validate_plan(raw_plan, cached['df_info']['dtypes'])
+                result = await _run_data_plan(username, req.filename, cached, plan)
+        except Exception as e:
+            print(f"[DATA QUERY] No usable query plan, answering from statistics: {e}")
+            plan, result = None, None
         
-        # Answer question using LLM with grounded statistics
-        answer = answer_data_question(
-            req.question,
-            cached['stats'],
-            cached['df_info'],
-            GROQ_API_KEY,
-            GROQ_MODEL
-        )
+        if result is not None:
+            answer = await asyncio.to_thread(phrase_query_result, req.question, plan, result, GROQ_API_KEY, GROQ_MODEL)
+        else:
+            # Answer question using LLM with grounded statistics
+            answer = await asyncio.to_thread(
+                answer_data_question,
+                req.question,
+                cached['stats'],
+                cached['df_info'],
+                GROQ_API_KEY,
+                GROQ_MODEL
+            )
+        record_usage(username, "analysis")
         
         return {
             "success": True,
             "data": {
                 "question": req.question,
                 "answer": answer,
-                "mode": "data_analysis"
+                "plan": plan,
+                "result": result,
+                "mode": "data_query" if result is not None else "data_analysis"
             }
         }
         
@@ -607,6 +986,41 @@ async def list_data_files(username: str = Depends(verify_token)):
         return {"success": False, "message": f"Failed to list files: {str(e)}"}
 
 
+# ========== METRICS ==========
+
+def _flight_samples():
+    for flight in (query_flight, sheet_flight):
+        for result, value in flight.stats.items():
+            yield "singleflight_calls_total", "counter", {"flight": flight.name, "result": result}, value
+        yield "singleflight_in_flight", "gauge", {"flight": flight.name}, flight.in_flight()
+    yield "data_background_tasks", "gauge", {"kind": "section"}, len(_section_tasks)
+    yield "data_background_tasks", "gauge", {"kind": "table_index"}, len(_index_tasks)
+    yield "data_background_tasks", "gauge", {"kind": "document_purge"}, len(_purge_tasks)
+    yield "email_outbox_pending", "gauge", {}, email_outbox.pending()
+
+metrics.register_collector(_flight_samples)
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus-style metrics of this worker: stage latencies, request counts, coalescing and LLM gateway stats."""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+# ========== HEALTH ==========
+
+@app.get("/health")
+async def health():
+    """Liveness: the worker is up and serving, whether or not it has warmed up."""
+    return {"success": True, "message": "ok"}
+
+@app.get("/ready")
+async def ready():
+    """Readiness: 200 once the subsystems in READINESS_REQUIRED are warm, 503 until then."""
+    status = readiness.status()
+    body = {"success": status["ready"], "message": "ready" if status["ready"] else "warming up", "data": status}
+    return JSONResponse(body, status_code=200 if status["ready"] else 503)
+
 # ========== FRONTEND ROUTES ==========
 
 @app.get("/")
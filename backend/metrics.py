@@ -0,0 +1,176 @@
+"""Request tracing, stage timings and Prometheus-style metrics.
+
+Each HTTP request gets a trace ID (start_trace). Code on the request path
+wraps its stages in span("stage"): the duration is added to the
+rag_stage_seconds histogram and to the current trace, which the endpoint
+can return as per-stage timings. Traces live in a context variable, so
+they follow the request into asyncio.to_thread workers.
+
+Metrics are per worker process and rendered by render() in the
+Prometheus text format. Other modules contribute gauges and counters
+through register_collector(). With METRICS_ENABLED off, span() returns a
+shared no-op context manager and nothing is recorded.
+"""
+import bisect
+import contextvars
+import json
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from backend.config import METRICS_ENABLED, TRACE_LOG, METRICS_BUCKETS
+
+Labels = Tuple[Tuple[str, str], ...]
+# A collector yields (name, type, labels, value) samples when /metrics is rendered
+Sample = Tuple[str, str, Dict[str, str], float]
+
+class _Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * len(METRICS_BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        i = bisect.bisect_left(METRICS_BUCKETS, value)
+        if i < len(self.counts):
+            self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+_lock = threading.Lock()
+_histograms: Dict[Tuple[str, Labels], _Histogram] = {}
+_counters: Dict[Tuple[str, Labels], float] = {}
+_collectors: List[Callable[[], Iterable[Sample]]] = []
+
+def _key(name: str, labels: Dict[str, str]) -> Tuple[str, Labels]:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def observe(name: str, value: float, **labels) -> None:
+    """Add a value (in seconds, for timings) to a histogram."""
+    if not METRICS_ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = _Histogram()
+        hist.observe(value)
+
+def inc(name: str, amount: float = 1, **labels) -> None:
+    if not METRICS_ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+def register_collector(fn: Callable[[], Iterable[Sample]]) -> None:
+    """Add samples computed at render time, e.g. from another module's stats dict."""
+    _collectors.append(fn)
+
+# ========== TRACES ==========
+
+_trace: contextvars.ContextVar[Optional[Dict]] = contextvars.ContextVar("trace", default=None)
+
+def start_trace(name: str) -> str:
+    """Start a trace for the current request (or task) and return its ID."""
+    trace_id = uuid.uuid4().hex[:16]
+    _trace.set({"id": trace_id, "name": name, "spans": []})
+    return trace_id
+
+def trace_id() -> Optional[str]:
+    trace = _trace.get()
+    return trace["id"] if trace else None
+
+def timings() -> Dict[str, float]:
+    """Milliseconds per stage of the current trace; repeated stages are summed."""
+    trace = _trace.get()
+    result: Dict[str, float] = {}
+    if trace:
+        for stage, seconds in trace["spans"]:
+            result[stage] = round(result.get(stage, 0.0) + seconds * 1000, 2)
+    return result
+
+def finish_trace(status: int) -> None:
+    if TRACE_LOG and METRICS_ENABLED:
+        trace = _trace.get()
+        if trace:
+            print(f"[TRACE] {json.dumps({'trace_id': trace['id'], 'name': trace['name'], 'status': status, 'timings_ms': timings()})}")
+
+class _Span:
+    __slots__ = ("pipeline", "stage", "start")
+
+    def __init__(self, pipeline: str, stage: str):
+        self.pipeline = pipeline
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        observe("rag_stage_seconds", elapsed, pipeline=self.pipeline, stage=self.stage)
+        if exc_type is not None:
+            inc("rag_stage_errors_total", pipeline=self.pipeline, stage=self.stage)
+        trace = _trace.get()
+        if trace is not None:
+            trace["spans"].append((self.stage, elapsed))
+        return False
+
+_NOOP = nullcontext()
+
+def span(pipeline: str, stage: str):
+    """Time one stage of a pipeline: `with span("query", "embed"): ...`"""
+    return _Span(pipeline, stage) if METRICS_ENABLED else _NOOP
+
+# ========== EXPOSITION ==========
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+def _with(labels: Labels, key: str, value: str) -> Labels:
+    return labels + ((key, value),)
+
+def render() -> str:
+    """All metrics of this worker in the Prometheus text exposition format."""
+    with _lock:
+        histograms = {key: (list(h.counts), h.sum, h.count) for key, h in _histograms.items()}
+        counters = dict(_counters)
+
+    lines: List[str] = []
+    typed = set()
+
+    def header(name: str, kind: str):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), (counts, total, count) in sorted(histograms.items()):
+        header(name, "histogram")
+        cumulative = 0
+        for bound, n in zip(METRICS_BUCKETS, counts):
+            cumulative += n
+            lines.append(f"{name}_bucket{_format_labels(_with(labels, 'le', repr(float(bound))))} {cumulative}")
+        lines.append(f"{name}_bucket{_format_labels(_with(labels, 'le', '+Inf'))} {count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+    for (name, labels), value in sorted(counters.items()):
+        header(name, "counter")
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    for collect in _collectors:
+        try:
+            for name, kind, labels, value in collect():
+                header(name, kind)
+                lines.append(f"{name}{_format_labels(_key(name, labels)[1])} {float(value)}")
+        except Exception as e:
+            print(f"[METRICS] Collector failed: {e}")
+    return "\n".join(lines) + "\n"
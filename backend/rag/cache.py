@@ -9,12 +9,12 @@ from backend.config import CACHE_DIR
 Path(CACHE_DIR).mkdir(exist_ok=True)
 CACHE_TTL_HOURS = 24
 
-def _cache_key(question: str, username: str, docs: list) -> str:
+def cache_key(question: str, username: str, docs: list) -> str:
     key = f"{question}:{username}:{sorted(docs or [])}"
     return hashlib.md5(key.encode()).hexdigest()
 
 def get_cached(question: str, username: str, docs: list = None) -> Optional[Dict]:
-    cache_file = Path(CACHE_DIR) / f"{_cache_key(question, username, docs or [])}.json"
+    cache_file = Path(CACHE_DIR) / f"{cache_key(question, username, docs or [])}.json"
     
     if not cache_file.exists():
         return None
@@ -31,9 +31,27 @@ def get_cached(question: str, username: str, docs: list = None) -> Optional[Dict
     return None
 
 def cache_response(question: str, username: str, docs: list, response: Dict) -> None:
-    cache_file = Path(CACHE_DIR) / f"{_cache_key(question, username, docs or [])}.json"
+    cache_file = Path(CACHE_DIR) / f"{cache_key(question, username, docs or [])}.json"
     data = {
         "timestamp": datetime.now().isoformat(),
+        "username": username,
+        "docs": sorted(docs or []),
         "response": response
     }
     cache_file.write_text(json.dumps(data, indent=2))
+
+def invalidate_document(username: str, filename: str) -> int:
+    """Remove cached responses that cite or were restricted to a user's document. Returns how many."""
+    source = f"{username}/{filename}"
+    removed = 0
+    for cache_file in Path(CACHE_DIR).glob("*.json"):
+        try:
+            data = json.loads(cache_file.read_text())
+        except (OSError, ValueError):
+            continue
+        cited = source in data.get("response", {}).get("sources", [])
+        selected = data.get("username") == username and filename in data.get("docs", [])
+        if cited or selected:
+            cache_file.unlink(missing_ok=True)
+            removed += 1
+    return removed
@@ -0,0 +1,220 @@
+"""Structure-aware chunking of extracted PDF page text.
+
+Each page's text is split into blocks (headings, tables, paragraphs) and
+packed into chunks of up to CHUNK_SIZE tokens that never span a heading or
+cut through a table: a new section starts a new chunk, and a table too big
+for one chunk is split between rows with its header row repeated. Only
+paragraphs too long for a chunk are split, at sentence boundaries with
+CHUNK_OVERLAP tokens of overlap.
+
+Chunks are {'text', 'page', 'section', 'start', 'end'}, with `start`/`end`
+character offsets into the page's text, so citations can point at them.
+Pages are chunked independently (and in parallel, see data_loader);
+assign_sections() then carries each page's last heading onto the next.
+child_spans() cuts a chunk further into the small pieces embedded for
+small-to-big retrieval (see parents).
+Pure Python and stdlib only, so it runs in pool workers cheaply.
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+from backend.config import CHUNK_SIZE, CHUNK_OVERLAP
+
+CHARS_PER_TOKEN = 4  # Rough and tokenizer-free; close enough for English prose
+
+_NUMBERED = re.compile(r"^(\d{1,3}(\.\d{1,3})*\.?|[IVXLC]{1,5}\.|[A-Z]\.)\s+[A-Z]")
+_KEYWORD = re.compile(r"^(chapter|section|part|appendix|annex)\b", re.IGNORECASE)
+_CELL_SPLIT = re.compile(r"\t| {2,}|\s*\|\s*")
+_NUMBER = re.compile(r"^[(\-+$€£]?\d[\d,.]*%?\)?$")
+_LINE = re.compile(r"[^\n]+")
+_SENTENCE = re.compile(r"[^.!?]*(?:[.!?]+[\"')\]]*(?=\s|$)|$)\s*")
+
+def tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def _is_heading(line: str, after_break: bool) -> bool:
+    words = line.split()
+    if not 1 <= len(words) <= 12 or len(line) > 80 or line[-1] in ".,;" or not any(c.isalpha() for c in line):
+        return False
+    if _NUMBERED.match(line) or _KEYWORD.match(line):
+        return True
+    letters = [c for c in line if c.isalpha()]
+    if len(letters) >= 3 and all(c.isupper() for c in letters):
+        return True
+    # Title Case only counts at a paragraph break, not as the short last line of a paragraph
+    long_words = [w for w in words if len(w) > 3]
+    return after_break and len(words) <= 8 and bool(long_words) and all(w[0].isupper() for w in long_words)
+
+def _is_table_row(line: str) -> bool:
+    cells = [c for c in _CELL_SPLIT.split(line.strip()) if c]
+    if len(cells) >= 3:
+        return True
+    words = line.split()
+    numeric = sum(bool(_NUMBER.match(w)) for w in words)
+    return len(words) >= 3 and numeric >= 2 and numeric * 2 >= len(words)
+
+def _blocks(text: str) -> List[Tuple[str, int, int]]:
+    """(kind, start, end) spans of the page: 'heading', 'table' or 'para'."""
+    blocks: List[Tuple[str, int, int]] = []
+    kind, start, end = None, 0, 0
+    after_break = True
+    for m in re.finditer(r"[^\n]*\n?", text):
+        line = m.group().strip()
+        if not line:
+            if kind is not None:
+                blocks.append((kind, start, end))
+                kind = None
+            after_break = True
+            continue
+        if _is_heading(line, after_break) and not _is_table_row(line):
+            line_kind = "heading"
+        elif _is_table_row(line):
+            line_kind = "table"
+        else:
+            line_kind = "para"
+        line_end = m.start() + len(m.group().rstrip())
+        if kind == line_kind and kind != "heading":
+            end = line_end
+        else:
+            if kind is not None:
+                blocks.append((kind, start, end))
+            kind, start, end = line_kind, m.start() + (len(m.group()) - len(m.group().lstrip())), line_end
+        after_break = line[-1] in ".!?:"
+    if kind is not None:
+        blocks.append((kind, start, end))
+    # A lone table-like line is just a line of text
+    return [("para" if k == "table" and "\n" not in text[s:e] else k, s, e) for k, s, e in blocks]
+
+def _sentences(text: str, start: int, end: int, limit: int) -> List[Tuple[int, int]]:
+    """Sentence spans within [start, end); sentences over `limit` characters are cut at word boundaries."""
+    spans = []
+    for m in _SENTENCE.finditer(text, start, end):
+        s, e = m.start(), m.end()
+        if s == e:
+            continue
+        while e - s > limit:
+            cut = text.rfind(" ", s, s + limit)
+            cut = cut if cut > s else s + limit
+            spans.append((s, cut))
+            s = cut
+        spans.append((s, e))
+    return spans
+
+def _pack(units: List[Tuple[int, int]], max_chars: int, overlap_chars: int) -> List[Tuple[int, int]]:
+    """Greedily join consecutive unit spans into pieces of up to `max_chars`; each piece
+    after the first starts early enough to repeat about `overlap_chars` of whole units."""
+    pieces, i = [], 0
+    while i < len(units):
+        j = i
+        while j + 1 < len(units) and units[j + 1][1] - units[i][0] <= max_chars:
+            j += 1
+        pieces.append((units[i][0], units[j][1]))
+        if j + 1 >= len(units):
+            break
+        k = j + 1
+        while k - 1 > i and units[j][1] - units[k - 1][0] <= overlap_chars:
+            k -= 1
+        i = k
+    return pieces
+
+class _Packer:
+    """Accumulates consecutive blocks of one page into chunks.
+
+    A chunk's span starts at its section heading when there is one; only
+    the body counts against the size limit, so the heading rides along.
+    """
+
+    def __init__(self, text: str, page: int, max_tokens: int, overlap: int):
+        self.text, self.page = text, page
+        self.max_chars, self.overlap_chars = max_tokens * CHARS_PER_TOKEN, overlap * CHARS_PER_TOKEN
+        self.chunks: List[Dict] = []
+        self.section: Optional[str] = None
+        self.span_start: Optional[int] = None  # Start of the chunk, pending headings included
+        self.body_start: Optional[int] = None
+        self.end = 0
+
+    def heading(self, start: int, end: int) -> None:
+        self.flush()
+        if self.span_start is None:
+            self.span_start = start
+        # Consecutive headings (chapter, then section) stay together; the innermost names the section
+        self.section = " ".join(self.text[start:end].split())
+        self.end = end
+
+    def block(self, kind: str, start: int, end: int) -> None:
+        if self.body_start is not None and end - self.body_start > self.max_chars:
+            self.flush()
+        if end - start <= self.max_chars:
+            if self.span_start is None:
+                self.span_start = start
+            if self.body_start is None:
+                self.body_start = start
+            self.end = end
+            return
+        lead = self.span_start if self.span_start is not None else start
+        if kind == "table":
+            self.split_table(lead, start, end)
+        else:
+            self.split_paragraph(lead, start, end)
+        self.span_start = None
+
+    def flush(self) -> None:
+        # A heading with nothing under it yet stays pending for the next chunk
+        if self.body_start is not None:
+            self.emit(self.span_start, self.end)
+            self.span_start = self.body_start = None
+
+    def emit(self, start: int, end: int, prefix: str = "") -> None:
+        body = self.text[start:end].strip()
+        if body:
+            self.chunks.append({
+                "text": f"{prefix}{body}", "page": self.page, "section": self.section, "start": start, "end": end
+            })
+
+    def split_paragraph(self, lead: int, start: int, end: int) -> None:
+        """Sentence-packed pieces of an over-long paragraph, overlapping by about `overlap`."""
+        pieces = _pack(_sentences(self.text, start, end, self.max_chars), self.max_chars, self.overlap_chars)
+        for n, (piece_start, piece_end) in enumerate(pieces):
+            self.emit(lead if n == 0 else piece_start, piece_end)
+
+    def split_table(self, lead: int, start: int, end: int) -> None:
+        """Row groups of an over-long table, each continuation after the table's first (header) row."""
+        rows = [(m.start(), m.end()) for m in _LINE.finditer(self.text, start, end)]
+        header = self.text[rows[0][0]:rows[0][1]].strip() + "\n"
+        group_start, prefix = lead, ""
+        for i in range(1, len(rows) + 1):
+            if i == len(rows) or rows[i][1] - group_start + len(prefix) > self.max_chars:
+                self.emit(group_start, rows[i - 1][1], prefix)
+                if i < len(rows):
+                    group_start, prefix = rows[i][0], header
+
+def chunk_page(text: str, page: int, max_tokens: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> Tuple[List[Dict], Optional[str]]:
+    """Chunks of one page's text, and the section in effect at its end (for the pages after it)."""
+    packer = _Packer(text, page, max_tokens, overlap)
+    for kind, start, end in _blocks(text):
+        if kind == "heading":
+            packer.heading(start, end)
+        else:
+            packer.block(kind, start, end)
+    packer.flush()
+    return packer.chunks, packer.section
+
+def child_spans(text: str, max_tokens: int, overlap: int) -> List[Tuple[int, int]]:
+    """Spans of `text` packed into pieces of up to `max_tokens`, breaking between lines
+    (so between table rows) and sentences, with about `overlap` tokens repeated."""
+    max_chars, overlap_chars = max_tokens * CHARS_PER_TOKEN, overlap * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return [(0, len(text))]
+    units = [span for line in _LINE.finditer(text) for span in _sentences(text, line.start(), line.end(), max_chars)]
+    return _pack(units, max_chars, overlap_chars)
+
+def assign_sections(pages: List[Tuple[List[Dict], Optional[str]]]) -> List[Dict]:
+    """Flatten per-page results in page order, giving chunks before a page's first heading the previous page's section."""
+    chunks, current = [], None
+    for page_chunks, section in pages:
+        for chunk in page_chunks:
+            if chunk["section"] is None:
+                chunk["section"] = current
+            chunks.append(chunk)
+        if section is not None:
+            current = section
+    return chunks
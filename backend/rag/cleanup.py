@@ -0,0 +1,67 @@
+"""Removing a document's vectors and cached answers, and finding orphaned vectors.
+
+purge_document() is what DELETE /documents/{doc} runs after unlinking the
+file. Points left behind by deletions from before it existed, or by a purge
+that failed, are found and removed with:
+
+    python -m backend.rag.cleanup [--dry-run]
+
+A source is orphaned when neither its PDF (uploads/<user>/<file>) nor its
+data file (uploads/<user>/data/<file>) exists any more.
+"""
+import argparse
+import time
+from pathlib import Path
+from typing import Dict
+from backend.config import UPLOADS_DIR
+from backend.rag.cache import invalidate_document
+from backend.rag.vector_db import QdrantStorage
+
+def purge_document(username: str, filename: str, before: float = None) -> Dict[str, int]:
+    """Delete a document's points indexed before `before` (default: now) and the cached answers that depend on it. Blocking.
+
+    Pass the time the delete was requested: points of a re-upload indexed
+    since then, by any worker, are kept.
+    """
+    source = f"{username}/{filename}"
+    store = QdrantStorage()
+    points = store.count_source(source)
+    if points:
+        store.delete_source(source, before if before is not None else time.time())
+    cache_entries = invalidate_document(username, filename)
+    print(f"[CLEANUP] {source}: deleted {points} points, {cache_entries} cached answers")
+    return {"points": points, "cache_entries": cache_entries}
+
+def _exists(source: str) -> bool:
+    username, _, filename = source.partition("/")
+    user_dir = Path(UPLOADS_DIR) / username
+    return (user_dir / filename).is_file() or (user_dir / "data" / filename).is_file()
+
+def find_orphans(store: QdrantStorage) -> Dict[str, int]:
+    """Point count per source whose upload is gone. Points without a user/file source are left alone."""
+    return {
+        source: count for source, count in store.sources().items()
+        if "/" in source and not _exists(source)
+    }
+
+def reconcile(dry_run: bool = False) -> Dict[str, int]:
+    store = QdrantStorage()
+    orphans = find_orphans(store)
+    for source in orphans:
+        if not dry_run:
+            username, _, filename = source.partition("/")
+            purge_document(username, filename)
+    return orphans
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Remove vectors whose document no longer exists")
+    parser.add_argument("--dry-run", action="store_true", help="Only list orphaned sources")
+    args = parser.parse_args()
+    orphans = reconcile(args.dry_run)
+    for source, count in sorted(orphans.items()):
+        print(f"{count:8d}  {source}")
+    verb = "Found" if args.dry_run else "Removed"
+    print(f"{verb} {sum(orphans.values())} orphaned points from {len(orphans)} sources")
+
+if __name__ == "__main__":
+    main()
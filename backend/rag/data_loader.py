@@ -1,30 +1,173 @@
-"""PDF loading and embedding."""
+"""PDF loading and embedding.
+
+llama_index and sentence-transformers (and with it torch) are imported on
+first use, not at import time, so the app starts without them loaded.
+With EMBEDDING_SOCKET set, texts are embedded by the shared sidecar
+(backend.rag.embed_server) and this process never loads the model.
+
+load_pdf_chunks() reads text-layer PDFs with pypdf directly, page ranges
+in parallel across a process pool, and chunks them by structure (see
+chunking). PDF_CHUNKER="sentence" keeps the llama_index reader and
+SentenceSplitter path instead.
+"""
+import multiprocessing
+import socket
+import sys
+import threading
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Optional
 from functools import lru_cache
-from llama_index.readers.file import PDFReader
-from llama_index.core.node_parser import SentenceSplitter
-from sentence_transformers import SentenceTransformer
 from backend.config import *
+from backend.rag.chunking import chunk_page, assign_sections
 
 @lru_cache(maxsize=1)
 def get_model():
-    return SentenceTransformer("all-MiniLM-L6-v2")
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBEDDING_MODEL)
 
-splitter = SentenceSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+@lru_cache(maxsize=1)
+def get_splitter():
+    from llama_index.core.node_parser import SentenceSplitter
+    return SentenceSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
 
-def load_and_chunk_pdf(path: str) -> List[str]:
+@lru_cache(maxsize=1)
+def get_pdf_reader():
+    from llama_index.readers.file import PDFReader
+    return PDFReader()
+
+def _check_pdf(path: str) -> Path:
     pdf_path = Path(path)
     if not pdf_path.exists() or pdf_path.suffix.lower() != ".pdf":
         raise ValueError("Invalid PDF path")
-    
-    docs = PDFReader().load_data(file=str(pdf_path))
+    return pdf_path
+
+def load_and_chunk_pdf(path: str) -> List[str]:
+    """Chunk texts from the llama_index reader and SentenceSplitter, without structure or metadata."""
+    pdf_path = _check_pdf(path)
+    docs = get_pdf_reader().load_data(file=str(pdf_path))
+    splitter = get_splitter()
     chunks = []
     for doc in docs:
         if doc.text:
             chunks.extend(splitter.split_text(doc.text))
     return chunks
 
+# ========== STRUCTURED CHUNKING ==========
+
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+_pdf_pool_lock = threading.Lock()
+
+def get_pdf_pool() -> ProcessPoolExecutor:
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            # Spawn rather than fork: the server process has threads
+            _pdf_pool = ProcessPoolExecutor(max_workers=PDF_PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pdf_pool
+
+def shutdown_pdf_pool() -> None:
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is not None:
+            _pdf_pool.shutdown(wait=False, cancel_futures=True)
+            _pdf_pool = None
+
+def _chunk_page_range(path: str, start: int, stop: int) -> list:
+    """Extract and chunk pages [start, stop) with pypdf. Runs in pool workers too."""
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    return [chunk_page(reader.pages[i].extract_text() or "", i + 1) for i in range(start, stop)]
+
+def _chunk_with_splitter(pdf_path: Path) -> List[Dict]:
+    chunks = []
+    # PDFReader gives one document per page. Pages are numbered 1.. as on the structured path,
+    # not by page_label, which is whatever the PDF prints ("iv", "A-3")
+    for page, doc in enumerate(get_pdf_reader().load_data(file=str(pdf_path)), start=1):
+        for text in get_splitter().split_text(doc.text or ""):
+            chunks.append({"text": text, "page": page, "section": None, "start": None, "end": None})
+    return chunks
+
+def load_pdf_chunks(path: str) -> List[Dict]:
+    """Chunks of a PDF as {'text', 'page', 'section', 'start', 'end'}, in reading order. Blocking."""
+    pdf_path = _check_pdf(path)
+    if PDF_CHUNKER == "sentence":
+        return _chunk_with_splitter(pdf_path)
+
+    from pypdf import PdfReader
+    pages = len(PdfReader(str(pdf_path)).pages)
+    if pages < PDF_PARALLEL_MIN_PAGES or PDF_PARSE_WORKERS < 2:
+        return assign_sections(_chunk_page_range(str(pdf_path), 0, pages))
+
+    # Contiguous page ranges, a few per worker so uneven pages even out
+    step = max(1, -(-pages // (PDF_PARSE_WORKERS * 4)))
+    pool = get_pdf_pool()
+    futures = [pool.submit(_chunk_page_range, str(pdf_path), s, min(s + step, pages)) for s in range(0, pages, step)]
+    return assign_sections([page for future in futures for page in future.result()])
+
+# ========== EMBEDDING ==========
+
+_local = threading.local()  # One sidecar connection per thread
+_warmed = False
+
+def _sidecar_connection() -> socket.socket:
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.settimeout(EMBED_SIDECAR_TIMEOUT_SECONDS)
+        conn.connect(EMBEDDING_SOCKET)
+        _local.conn = conn
+    return conn
+
+def _embed_remote(texts: List[str]) -> List[list]:
+    from backend.rag.embed_server import send_message, read_message, read_vectors
+    for attempt in range(2):
+        try:
+            conn = _sidecar_connection()
+            send_message(conn, {"texts": texts})
+            header = read_message(conn)
+            if header is None:
+                raise ConnectionError("Embedding sidecar closed the connection")
+            if "error" in header:
+                raise RuntimeError(f"Embedding sidecar failed: {header['error']}")
+            values = array("f", read_vectors(conn, header))
+            break
+        except (OSError, ConnectionError):
+            # The sidecar restarted or the connection went stale: reconnect once
+            conn = getattr(_local, "conn", None)
+            if conn is not None:
+                conn.close()
+            _local.conn = None
+            if attempt:
+                raise
+    if sys.byteorder == "big":
+        values.byteswap()  # Sent little-endian
+    dim = header["dim"]
+    return [values[i * dim:(i + 1) * dim].tolist() for i in range(header["rows"])]
+
 def embed_texts(texts: List[str]) -> List[list]:
-    embeddings = get_model().encode(texts, convert_to_numpy=True, batch_size=32, show_progress_bar=False)
+    if EMBEDDING_SOCKET:
+        return _embed_remote(texts)
+    embeddings = get_model().encode(texts, convert_to_numpy=True, batch_size=EMBED_BATCH_SIZE, show_progress_bar=False)
     return embeddings.tolist()
+
+def warm_up_batch() -> List[str]:
+    """A full batch of chunk-sized dummy texts, so warm-up runs the shapes real traffic will."""
+    text = " ".join(["warm-up"] * (CHUNK_SIZE // 2))
+    return [text] * EMBED_BATCH_SIZE
+
+def warm_up_model() -> float:
+    """Load the model (or connect to the sidecar) and run one dummy batch through it. Returns seconds taken."""
+    global _warmed
+    start = time.perf_counter()
+    embed_texts(warm_up_batch())
+    _warmed = True
+    return time.perf_counter() - start
+
+def model_ready() -> bool:
+    """Whether a query would embed without first loading the model."""
+    if EMBEDDING_SOCKET:
+        return _warmed
+    return _warmed or get_model.cache_info().currsize > 0
@@ -0,0 +1,174 @@
+"""Embedding sidecar: one process holds the model and serves every worker over a Unix socket.
+
+Run it next to the API and point the workers at it:
+
+    python -m backend.rag.embed_server --socket /tmp/rag-embed.sock
+    EMBEDDING_SOCKET=/tmp/rag-embed.sock uvicorn backend.main:app --workers 4
+
+uvicorn starts each worker as a fresh interpreter, so without the sidecar
+every worker loads its own copy of the model (and torch) on first use.
+With EMBEDDING_SOCKET set, workers never import either.
+
+Protocol, per message on a persistent connection: a 4-byte big-endian
+length and a JSON body. Requests are {"texts": [...]}; responses are a JSON
+header {"rows", "dim"} (or {"error"}) followed by rows * dim float32 values.
+Requests arriving together from different workers are encoded as one batch.
+"""
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+from typing import Callable, List, Optional
+
+from backend.config import EMBEDDING_SOCKET, EMBED_BATCH_SIZE, EMBED_SIDECAR_MAX_BATCH, EMBED_SIDECAR_WAIT_MS
+
+_HEADER = struct.Struct(">I")
+
+def send_message(sock: socket.socket, body: dict, payload: bytes = b"") -> None:
+    data = json.dumps(body).encode()
+    sock.sendall(_HEADER.pack(len(data)) + data + payload)
+
+def _read_exact(sock: socket.socket, size: int) -> Optional[bytes]:
+    buf = bytearray()
+    while len(buf) < size:
+        part = sock.recv(size - len(buf))
+        if not part:
+            return None
+        buf += part
+    return bytes(buf)
+
+def read_message(sock: socket.socket) -> Optional[dict]:
+    """The next JSON message, or None once the peer has closed the connection."""
+    header = _read_exact(sock, _HEADER.size)
+    if header is None:
+        return None
+    body = _read_exact(sock, _HEADER.unpack(header)[0])
+    return None if body is None else json.loads(body)
+
+def read_vectors(sock: socket.socket, header: dict) -> bytes:
+    data = _read_exact(sock, header["rows"] * header["dim"] * 4)
+    if data is None:
+        raise ConnectionError("Embedding sidecar closed the connection mid-response")
+    return data
+
+class _Request:
+    __slots__ = ("texts", "done", "vectors", "error")
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.done = threading.Event()
+        self.vectors = None
+        self.error = None
+
+class Batcher:
+    """Funnels concurrent requests into one encode call at a time.
+
+    A single thread owns the model: it takes the first waiting request, keeps
+    collecting for up to `wait_ms` or until `max_batch` texts, encodes them
+    together and hands each request its rows.
+    """
+
+    def __init__(self, encode: Callable, max_batch: int = EMBED_SIDECAR_MAX_BATCH, wait_ms: float = EMBED_SIDECAR_WAIT_MS):
+        self.encode = encode
+        self.max_batch = max_batch
+        self.wait = wait_ms / 1000
+        self.pending: "queue.Queue[_Request]" = queue.Queue()
+        self.batches = 0
+        threading.Thread(target=self._loop, name="embed-batcher", daemon=True).start()
+
+    def submit(self, texts: List[str]):
+        request = _Request(texts)
+        self.pending.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.vectors
+
+    def _loop(self):
+        while True:
+            batch = [self.pending.get()]
+            size = len(batch[0].texts)
+            deadline = time.monotonic() + self.wait
+            while size < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+                size += len(batch[-1].texts)
+
+            try:
+                vectors = self.encode([text for request in batch for text in request.texts])
+                start = 0
+                for request in batch:
+                    request.vectors = vectors[start:start + len(request.texts)]
+                    start += len(request.texts)
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+            self.batches += 1
+            for request in batch:
+                request.done.set()
+
+class EmbeddingServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128  # Every thread of every worker may connect at once
+
+    def __init__(self, path: str, encode: Callable):
+        self.batcher = Batcher(encode)
+        if os.path.exists(path):
+            os.unlink(path)  # Left behind by a previous run
+        super().__init__(path, _Handler)
+        os.chmod(path, 0o600)
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            message = read_message(self.request)
+            if message is None:
+                return
+            try:
+                texts = message["texts"]
+                vectors = self.server.batcher.submit(texts) if texts else None
+            except Exception as e:
+                send_message(self.request, {"error": str(e)})
+                continue
+            if vectors is None:
+                send_message(self.request, {"rows": 0, "dim": 0})
+            else:
+                send_message(self.request, {"rows": vectors.shape[0], "dim": vectors.shape[1]}, vectors.astype("<f4").tobytes())
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--socket", default=EMBEDDING_SOCKET or "/tmp/rag-embed.sock")
+    args = parser.parse_args()
+
+    from backend.rag.data_loader import get_model, warm_up_batch
+    start = time.perf_counter()
+    model = get_model()
+
+    def encode(texts):
+        return model.encode(texts, convert_to_numpy=True, batch_size=EMBED_BATCH_SIZE, show_progress_bar=False)
+
+    encode(warm_up_batch())
+    print(f"[EMBED SIDECAR] Model loaded and warmed up in {time.perf_counter() - start:.2f}s")
+
+    server = EmbeddingServer(args.socket, encode)
+    print(f"[EMBED SIDECAR] Serving on {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(args.socket)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Small-to-big retrieval: search small chunks, answer from their parents.
+
+At upload, each PDF chunk (a "parent", up to CHUNK_SIZE tokens) is cut
+into children of CHILD_CHUNK_SIZE tokens. Only the children are embedded;
+the parents are stored once per PDF content in the result store (gzipped,
+cached in memory) and never sent through the embedding model. Children
+match questions more precisely than whole chunks, and only the few parents
+of the final hits are loaded, merged and sent to the LLM.
+
+Points indexed without parents (older uploads, SMALL_TO_BIG off, tables)
+are passed through unchanged.
+"""
+from typing import Dict, List, Optional, Tuple
+from backend.config import CHILD_CHUNK_SIZE, CHILD_CHUNK_OVERLAP, CHUNK_SIZE, CHUNK_OVERLAP, PDF_CHUNKER, SMALL_TO_BIG
+from backend.data_analysis import result_store
+from backend.data_analysis.result_store import content_hash
+from backend.rag.chunking import child_spans, tokens
+
+PARENTS_VERSION = 1  # Bump when chunking changes in a way the settings below don't capture
+
+def parents_key(digest: str) -> str:
+    """Where a PDF's parents are stored: per content and everything that decides how it was chunked."""
+    return content_hash(f"parents\0{PARENTS_VERSION}\0{digest}\0{PDF_CHUNKER}\0{CHUNK_SIZE}\0{CHUNK_OVERLAP}".encode())
+
+def index_points(chunks: List[Dict], digest: str) -> List[Dict]:
+    """Payloads (with their text) to embed for a PDF's chunks: the chunks themselves,
+    or with SMALL_TO_BIG their children, each pointing at its stored parent."""
+    if not SMALL_TO_BIG:
+        return chunks
+    key = parents_key(digest)
+    # Always written: children are about to be indexed against exactly these parents
+    result_store.put(key, {"parents": chunks}, pinned=True)
+    children = []
+    for i, chunk in enumerate(chunks):
+        text = chunk["text"]
+        for start, end in child_spans(text, CHILD_CHUNK_SIZE, CHILD_CHUNK_OVERLAP):
+            children.append({
+                "text": text[start:end].strip(), "page": chunk["page"], "section": chunk["section"],
+                "parents": key, "parent": i
+            })
+    return children
+
+def _parent(location: Tuple[str, int]) -> Optional[Dict]:
+    stored = result_store.get_by_hash(location[0])
+    if stored is None or location[1] >= len(stored["parents"]):
+        return None
+    return stored["parents"][location[1]]
+
+def expand_hits(found: Dict, indices: List[int], limit: int, budget_tokens: Optional[int] = None) -> Dict:
+    """Contexts for the LLM from ranked hits, parents in place of children.
+
+    Hits from the same parent count once; parents that are neighbours in
+    their document are merged into one context, in document order. Stops at
+    `limit` contexts or when the next one would go over `budget_tokens`
+    (the first is always kept).
+    Returns {'contexts', 'sources', 'indices'}, `indices` being the hits
+    each context was built from.
+    """
+    parents = found.get("parents") or [None] * len(found["contexts"])
+    groups: List[Dict] = []  # {'source', 'location' or None, 'first', 'last', 'indices', 'text'}
+    seen: Dict[Tuple[str, int], Dict] = {}
+    used = 0
+    for i in indices:
+        location = tuple(parents[i]) if parents[i] else None
+        if location in seen:
+            seen[location]["indices"].append(i)
+            continue
+        parent = _parent(location) if location else None
+        text = parent["text"] if parent else found["contexts"][i]
+        neighbour = None
+        if parent:
+            neighbour = seen.get((location[0], location[1] - 1)) or seen.get((location[0], location[1] + 1))
+        if neighbour is None and len(groups) >= limit:
+            break
+        if budget_tokens is not None and groups and used + tokens(text) > budget_tokens:
+            break
+        used += tokens(text)
+        if neighbour is not None:
+            # Adjacent parents read as one passage
+            if location[1] < neighbour["first"]:
+                neighbour["text"], neighbour["first"] = f"{text}\n{neighbour['text']}", location[1]
+            else:
+                neighbour["text"], neighbour["last"] = f"{neighbour['text']}\n{text}", location[1]
+            neighbour["indices"].append(i)
+            group = neighbour
+        else:
+            group = {"source": found["sources"][i], "first": location[1] if location else None,
+                     "last": location[1] if location else None, "indices": [i], "text": text}
+            groups.append(group)
+        if location:
+            seen[location] = group
+    return {
+        "contexts": [g["text"] for g in groups],
+        "sources": [g["source"] for g in groups],
+        "indices": [g["indices"] for g in groups],
+    }
@@ -0,0 +1,38 @@
+"""Retrieval decisions shared by the query endpoint and the evaluation harness.
+
+Keeping hit filtering and the document-mode/fallback decision here means
+benchmarks.eval_retrieval scores exactly what /rag/query does.
+"""
+from typing import Dict, List, Optional
+from backend.config import MIN_CONTEXT_CHUNKS, FALLBACK_THRESHOLD
+
+def kept_hits(found: Dict, username: str, selected_documents: Optional[List[str]] = None) -> List[int]:
+    """Indices of the hits from a user's own (selected) documents, in rank order."""
+    kept = []
+    for i, src in enumerate(found["sources"]):
+        if not src.startswith(f"{username}/"):
+            continue
+        if selected_documents:
+            doc_name = src.split("/", 1)[1] if "/" in src else src
+            if doc_name not in selected_documents:
+                continue
+        kept.append(i)
+    return kept
+
+def citations(found: Dict, indices: List[int]) -> List[Dict]:
+    """Where the given hits come from: one {'source', 'page', 'section'} per distinct location, in rank order."""
+    cited, seen = [], set()
+    for i in indices:
+        location = (
+            found["sources"][i],
+            found.get("pages", [None] * (i + 1))[i],
+            found.get("sections", [None] * (i + 1))[i]
+        )
+        if location not in seen:
+            seen.add(location)
+            cited.append(dict(zip(("source", "page", "section"), location)))
+    return cited
+
+def is_confident(scores: List[float], min_chunks: int = MIN_CONTEXT_CHUNKS, threshold: float = FALLBACK_THRESHOLD) -> bool:
+    """True to answer from documents; False falls back to general knowledge."""
+    return len(scores) >= min_chunks and bool(scores) and max(scores) >= threshold
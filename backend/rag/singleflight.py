@@ -0,0 +1,45 @@
+"""Request coalescing for identical in-flight work."""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+class SingleFlight:
+    """Run at most one call per key at a time; concurrent callers share its result.
+
+    The first caller for a key (the leader) starts the work as its own task.
+    Callers arriving while it is in flight (followers) wait on that task
+    instead of repeating it. Every caller waits through a shield, so a caller
+    that is cancelled (client disconnect) or times out leaves the work, and
+    everyone else waiting on it, alone.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.stats = {"leaders": 0, "coalesced": 0, "timeouts": 0}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]], timeout: float = None) -> Tuple[Any, bool]:
+        """Return (result, coalesced). Followers raise asyncio.TimeoutError after `timeout` seconds."""
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+            try:
+                return await asyncio.wait_for(asyncio.shield(task), timeout), True
+            except asyncio.TimeoutError:
+                self.stats["timeouts"] += 1
+                raise
+
+        task = asyncio.ensure_future(fn())
+        self._inflight[key] = task
+        self.stats["leaders"] += 1
+
+        def done(t: asyncio.Task) -> None:
+            if self._inflight.get(key) is t:
+                del self._inflight[key]
+            # Mark the exception as retrieved so a failure nobody waited for isn't logged as unhandled
+            t.cancelled() or t.exception()
+
+        task.add_done_callback(done)
+        return await asyncio.shield(task), False
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
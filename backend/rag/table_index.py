@@ -0,0 +1,67 @@
+"""Index analysed tables into the vector store next to PDF chunks.
+
+Each sheet's documents (see data_analysis.table_documents) are embedded in
+batches and upserted under the file's source, with their type, sheet and
+the content hash they were built from in the payload. Point ids are
+stable per (source, sheet, document), and a per-source marker in the
+result store records which content and sheets are indexed: re-uploading
+unchanged content costs nothing, and new content first drops the points
+built from the old.
+"""
+import threading
+import uuid
+from typing import Dict
+from backend.config import TABLE_INDEX_EMBED_BATCH
+from backend.data_analysis import result_store
+from backend.data_analysis.result_store import content_hash
+from backend.rag.data_loader import embed_texts
+from backend.rag.vector_db import QdrantStorage
+
+_marker_lock = threading.Lock()
+
+def _marker_key(source: str) -> str:
+    return content_hash(f"rag_index\0{source}".encode())
+
+def _indexed(source: str) -> Dict:
+    return result_store.get_marker(_marker_key(source)) or {'digest': None, 'sheets': []}
+
+def is_indexed(source: str, digest: str, sheet) -> bool:
+    """Whether this content of the sheet is already in the vector store (a marker read, no Qdrant)."""
+    indexed = _indexed(source)
+    return indexed['digest'] == digest and (sheet or '') in indexed['sheets']
+
+def index_table(username: str, filename: str, file_path, digest: str, result: Dict) -> int:
+    """Index one analysed sheet (or CSV) of a user's file. Returns the number of documents written."""
+    from backend.data_analysis.table_documents import table_documents  # Pulls in pandas; keep it off app startup
+    source = f"{username}/{filename}"
+    sheet = result['metadata'].get('sheet')
+    if is_indexed(source, digest, sheet):
+        return 0
+    store = QdrantStorage()
+    with _marker_lock:
+        indexed = _indexed(source)
+        if indexed['digest'] == digest and (sheet or '') in indexed['sheets']:
+            return 0
+        if indexed['digest'] != digest:
+            # The file now holds different content: drop every point built from the old
+            store.delete_stale(source, digest)
+            result_store.put_marker(_marker_key(source), {'digest': digest, 'sheets': []})
+
+    docs = table_documents(file_path, filename, result)
+    for start in range(0, len(docs), TABLE_INDEX_EMBED_BATCH):
+        batch = docs[start:start + TABLE_INDEX_EMBED_BATCH]
+        vectors = embed_texts([doc['text'] for doc in batch])
+        ids = [str(uuid.uuid5(uuid.NAMESPACE_URL, f"{source}:{sheet or ''}:{doc['key']}")) for doc in batch]
+        payloads = [
+            {"text": doc['text'], "source": source, "type": doc['type'], "sheet": sheet, "digest": digest}
+            for doc in batch
+        ]
+        store.upsert(ids, vectors, payloads)
+
+    with _marker_lock:
+        indexed = _indexed(source)
+        if indexed['digest'] == digest:
+            sheets = sorted(set(indexed['sheets']) | {sheet or ''})
+            result_store.put_marker(_marker_key(source), dict(indexed, sheets=sheets))
+    print(f"[TABLE INDEX] {source}{f' [{sheet}]' if sheet else ''}: {len(docs)} documents")
+    return len(docs)
@@ -1,23 +1,82 @@
 """Vector database operations."""
-from qdrant_client import QdrantClient
-from qdrant_client.models import VectorParams, Distance, PointStruct
+import time
+from functools import lru_cache
+from typing import Dict
 from backend.config import *
 
+@lru_cache(maxsize=1)
+def get_client():
+    """One client per process, reusing its connections. QDRANT_URL=":memory:" gives an in-process store."""
+    from qdrant_client import QdrantClient
+    from qdrant_client.models import VectorParams, Distance, PayloadSchemaType
+    client = QdrantClient(location=QDRANT_URL, timeout=30)
+    if not client.collection_exists(COLLECTION_NAME):
+        client.create_collection(
+            collection_name=COLLECTION_NAME,
+            vectors_config=VectorParams(size=EMBEDDING_DIM, distance=Distance.COSINE)
+        )
+    if QDRANT_URL != ":memory:":
+        # Deletes and counts filter on source; idempotent, so existing collections get it too
+        client.create_payload_index(COLLECTION_NAME, field_name="source", field_schema=PayloadSchemaType.KEYWORD)
+        client.create_payload_index(COLLECTION_NAME, field_name="indexed_at", field_schema=PayloadSchemaType.FLOAT)
+    return client
+
+def _source_filter(source: str):
+    from qdrant_client.models import Filter, FieldCondition, MatchValue
+    return Filter(must=[FieldCondition(key="source", match=MatchValue(value=source))])
+
 class QdrantStorage:
     def __init__(self):
-        self.client = QdrantClient(url=QDRANT_URL, timeout=30)
+        self.client = get_client()
         self.collection = COLLECTION_NAME
 
-        if not self.client.collection_exists(self.collection):
-            self.client.create_collection(
-                collection_name=self.collection,
-                vectors_config=VectorParams(size=EMBEDDING_DIM, distance=Distance.COSINE)
-            )
-
     def upsert(self, ids, vectors, payloads):
-        points = [PointStruct(id=ids[i], vector=vectors[i], payload=payloads[i]) for i in range(len(ids))]
+        """Write points, stamping each payload with `indexed_at` so purges can spare newer points."""
+        from qdrant_client.models import PointStruct
+        now = time.time()
+        points = [PointStruct(id=ids[i], vector=vectors[i], payload=dict(payloads[i], indexed_at=now)) for i in range(len(ids))]
         self.client.upsert(self.collection, points=points)
 
+    def delete_stale(self, source: str, digest: str):
+        """Delete a source's points indexed from content other than `digest` (or recorded without one)."""
+        from qdrant_client.models import Filter, FieldCondition, MatchValue, FilterSelector
+        self.client.delete(self.collection, points_selector=FilterSelector(filter=Filter(
+            must=[FieldCondition(key="source", match=MatchValue(value=source))],
+            must_not=[FieldCondition(key="digest", match=MatchValue(value=digest))]
+        )))
+
+    def count_source(self, source: str) -> int:
+        return self.client.count(self.collection, count_filter=_source_filter(source), exact=True).count
+
+    def delete_source(self, source: str, before: float = None) -> None:
+        """Delete a source's points in one filtered request; with `before`, only those indexed earlier.
+
+        Points are upserted under stable ids, so a re-upload indexed after
+        `before` (on any worker) replaces the old points and is left alone.
+        """
+        from qdrant_client.models import Filter, FilterSelector, FieldCondition, IsEmptyCondition, PayloadField, Range
+        selected = _source_filter(source)
+        if before is not None:
+            selected = Filter(must=selected.must, should=[
+                FieldCondition(key="indexed_at", range=Range(lt=before)),
+                IsEmptyCondition(is_empty=PayloadField(key="indexed_at")),  # Indexed before points were stamped
+            ])
+        self.client.delete(self.collection, points_selector=FilterSelector(filter=selected))
+
+    def sources(self, batch: int = 1024) -> Dict[str, int]:
+        """Point count per source across the whole collection, scrolling payloads only."""
+        counts: Dict[str, int] = {}
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                self.collection, limit=batch, offset=offset, with_payload=["source"], with_vectors=False
+            )
+            for point in points:
+                source = (point.payload or {}).get("source", "")
+                counts[source] = counts.get(source, 0) + 1
+            if offset is None:
+                return counts
+
     def search(self, query_vector, top_k: int = DEFAULT_TOP_K, score_threshold: float = SCORE_THRESHOLD):
         results = self.client.search(
             collection_name=self.collection,
@@ -27,17 +86,25 @@ class QdrantStorage:
             score_threshold=score_threshold
         )
 
-        contexts, sources, scores = [], set(), []
+        # One source, type and location per context, so callers can filter hits pairwise
+        contexts, sources, types, pages, sections, parents, scores = [], [], [], [], [], [], []
         for r in results:
             if r.payload and "text" in r.payload:
                 contexts.append(r.payload["text"])
+                sources.append(r.payload.get("source", ""))
+                types.append(r.payload.get("type", "pdf"))
+                pages.append(r.payload.get("page"))
+                sections.append(r.payload.get("section") or r.payload.get("sheet"))
+                parents.append((r.payload["parents"], r.payload["parent"]) if "parents" in r.payload else None)
                 scores.append(r.score)
-            if r.payload and "source" in r.payload:
-                sources.add(r.payload["source"])
 
         return {
             "contexts": contexts, 
-            "sources": list(sources),
+            "sources": sources,
+            "types": types,
+            "pages": pages,
+            "sections": sections,
+            "parents": parents,
             "scores": scores,
             "best_score": max(scores) if scores else 0.0
         }
@@ -0,0 +1,195 @@
+"""Per-user rate limiting and quota tracking.
+
+Request rates are limited with in-memory token buckets. Quota usage is
+counted in memory and written to the user store in batches by a
+periodic flush, so no request pays for a database write.
+
+Each rate-limited request reserves one unit of quota up front, so
+concurrent requests can't all pass the check on the same last unit.
+record_usage() turns the reservation into usage; a reservation not used by
+the end of the request (a failure, a free cached answer) is handed back.
+"""
+import asyncio
+import contextvars
+import math
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from fastapi import Depends, HTTPException
+
+from backend.auth import verify_token
+from backend.config import *
+from backend.user import user_store
+
+QUOTA_TYPES = {
+    "query": "query_quota",
+    "upload": "upload_quota",
+    "analysis": "analysis_quota",
+}
+DEFAULT_QUOTAS = {
+    "query_quota": DEFAULT_QUERY_QUOTA,
+    "upload_quota": DEFAULT_UPLOAD_QUOTA,
+    "analysis_quota": DEFAULT_ANALYSIS_QUOTA,
+}
+
+class TokenBucket:
+    __slots__ = ("capacity", "rate", "tokens", "updated")
+
+    def __init__(self, capacity: int, per_minute: float):
+        self.capacity = capacity
+        self.rate = per_minute / 60.0
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Take one token. Returns 0 on success, else seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def is_full(self) -> bool:
+        elapsed = time.monotonic() - self.updated
+        return self.tokens + elapsed * self.rate >= self.capacity
+
+_lock = threading.Lock()
+_buckets: Dict[Tuple[str, str], TokenBucket] = {}
+# (username, quota_type) -> remaining as of the last flush
+_remaining: Dict[Tuple[str, str], int] = {}
+# (username, quota_type) -> usage not yet written to the store
+_pending: Dict[Tuple[str, str], int] = {}
+# (username, quota_type) -> units held by requests still running
+_reserved: Dict[Tuple[str, str], int] = {}
+
+class _Reservation:
+    __slots__ = ("key", "held")
+
+    def __init__(self, key: Tuple[str, str]):
+        self.key = key
+        self.held = True
+
+# The current request's reservation; to_thread copies it into worker threads
+_reservation: contextvars.ContextVar[Optional[_Reservation]] = contextvars.ContextVar("quota_reservation", default=None)
+
+def _stored_remaining(key: Tuple[str, str]) -> int:
+    """Remaining as of the last flush, read from the store (outside the lock) on first use."""
+    with _lock:
+        if key in _remaining:
+            return _remaining[key]
+    username, quota_type = key
+    user_store.ensure_quotas(username, DEFAULT_QUOTAS)
+    value = user_store.get_quota(username, quota_type)
+    with _lock:
+        return _remaining.setdefault(key, value)
+
+def _available(key: Tuple[str, str]) -> int:
+    # Call with _lock held
+    return _remaining[key] - _pending.get(key, 0) - _reserved.get(key, 0)
+
+def remaining_quota(username: str, quota_type: str) -> int:
+    """Remaining quota including usage not yet flushed and units reserved by running requests."""
+    key = (username, quota_type)
+    stored = _stored_remaining(key)
+    with _lock:
+        _remaining.setdefault(key, stored)  # A flush may have cleared it since
+        return max(_available(key), 0)
+
+def check_limit(username: str, kind: str) -> _Reservation:
+    """Enforce the rate limit and reserve one unit of quota. Raises HTTP 429 if either is used up."""
+    capacity, per_minute = RATE_LIMITS[kind]
+    key = (username, QUOTA_TYPES[kind])
+
+    with _lock:
+        bucket = _buckets.get((username, kind))
+        if bucket is None:
+            bucket = _buckets[(username, kind)] = TokenBucket(capacity, per_minute)
+        wait = bucket.take()
+
+    if wait > 0:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many {kind} requests. Please slow down.",
+            headers={"Retry-After": str(math.ceil(wait))}
+        )
+
+    stored = _stored_remaining(key)
+    with _lock:
+        _remaining.setdefault(key, stored)
+        if _available(key) <= 0:
+            raise HTTPException(status_code=429, detail=f"{key[1].replace('_', ' ').capitalize()} exhausted")
+        _reserved[key] = _reserved.get(key, 0) + 1
+    return _Reservation(key)
+
+def release(reservation: _Reservation) -> None:
+    """Hand back a reservation that wasn't turned into usage."""
+    with _lock:
+        if reservation.held:
+            reservation.held = False
+            _reserved[reservation.key] -= 1
+            if not _reserved[reservation.key]:
+                del _reserved[reservation.key]
+
+def record_usage(username: str, kind: str, amount: int = 1) -> None:
+    """Count usage against a quota, using up the request's reservation. Persisted on the next flush."""
+    key = (username, QUOTA_TYPES[kind])
+    reservation = _reservation.get()
+    with _lock:
+        _pending[key] = _pending.get(key, 0) + amount
+    if reservation is not None and reservation.key == key:
+        release(reservation)
+
+def rate_limited(kind: str):
+    """FastAPI dependency: verify the token, enforce the rate limit and return the username.
+
+    Async so the reservation set here is visible to the endpoint (same task).
+    """
+    async def dependency(username: str = Depends(verify_token)):
+        reservation = await asyncio.to_thread(check_limit, username, kind)
+        token = _reservation.set(reservation)
+        try:
+            yield username
+        finally:
+            release(reservation)
+            _reservation.reset(token)
+    return dependency
+
+def flush_usage() -> None:
+    """Write pending usage to the user store in one batch and resync remaining counts."""
+    with _lock:
+        batch = dict(_pending)
+        # Idle buckets are full again and can be recreated on demand
+        for key in [k for k, b in _buckets.items() if b.is_full()]:
+            del _buckets[key]
+
+    if not batch:
+        with _lock:
+            _remaining.clear()
+        return
+
+    try:
+        updated = user_store.consume_quotas(batch)
+    except Exception as e:
+        print(f"[QUOTA ERROR] Flush failed, will retry: {e}")
+        return
+
+    with _lock:
+        # Written usage leaves _pending in the same step as _remaining takes it in, so
+        # the quota never looks refunded in between; usage recorded meanwhile stays pending
+        for key, amount in batch.items():
+            left = _pending.get(key, 0) - amount
+            if left > 0:
+                _pending[key] = left
+            else:
+                _pending.pop(key, None)
+        # Drop everything else so admin changes and other workers' usage are picked up
+        _remaining.clear()
+        _remaining.update(updated)
+
+async def flush_loop() -> None:
+    """Background task that flushes usage every QUOTA_FLUSH_SECONDS."""
+    while True:
+        await asyncio.sleep(QUOTA_FLUSH_SECONDS)
+        await asyncio.to_thread(flush_usage)
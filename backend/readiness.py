@@ -0,0 +1,98 @@
+"""Warm-up and readiness of the heavy subsystems.
+
+The app imports none of the heavy subsystems at startup: the embedding
+model (torch; or just a connection, with the shared sidecar), the PDF
+reader (pypdf; llama_index with PDF_CHUNKER=sentence), the Qdrant client,
+the data-analysis stack (pandas, pyarrow, plotly) and the Groq SDK load on
+first use. warm_up() loads them ahead of traffic in a background thread.
+status() reports which are warm without loading anything, for the
+/ready endpoint.
+"""
+import sys
+import threading
+import time
+from typing import Dict
+
+from backend.config import GROQ_API_KEY, READINESS_REQUIRED, PDF_CHUNKER
+
+def _load_embedding_model():
+    from backend.rag.data_loader import warm_up_model
+    warm_up_model()
+
+def _load_pdf_reader():
+    if PDF_CHUNKER == "sentence":
+        from backend.rag.data_loader import get_pdf_reader, get_splitter
+        get_pdf_reader()
+        get_splitter()
+    else:
+        import pypdf
+
+def _load_vector_db():
+    from backend.rag.vector_db import get_client
+    get_client()
+
+def _load_data_analysis():
+    import backend.data_analysis.workbook
+    import backend.data_analysis.query_plan
+    import backend.data_analysis.table_documents
+
+def _load_llm_client():
+    from backend.llm_gateway import _client
+    _client(GROQ_API_KEY)
+
+def _cached(module: str, function: str) -> bool:
+    loaded = sys.modules.get(module)
+    return loaded is not None and getattr(loaded, function).cache_info().currsize > 0
+
+# name -> (load, is_warm); warmed in this order, cheapest first
+SUBSYSTEMS: Dict[str, tuple] = {
+    "vector_db": (_load_vector_db, lambda: _cached("backend.rag.vector_db", "get_client")),
+    "llm_client": (_load_llm_client, lambda: bool(getattr(sys.modules.get("backend.llm_gateway"), "_clients", None))),
+    "data_analysis": (_load_data_analysis, lambda: "backend.data_analysis.workbook" in sys.modules),
+    "pdf_reader": (_load_pdf_reader, lambda: "pypdf" in sys.modules if PDF_CHUNKER != "sentence" else _cached("backend.rag.data_loader", "get_pdf_reader")),
+    "embedding_model": (_load_embedding_model, lambda: "backend.rag.data_loader" in sys.modules and sys.modules["backend.rag.data_loader"].model_ready()),
+}
+
+_lock = threading.Lock()
+_warming: set = set()
+_errors: Dict[str, str] = {}
+_timings: Dict[str, float] = {}
+
+def warm(name: str) -> None:
+    load, _ = SUBSYSTEMS[name]
+    with _lock:
+        _warming.add(name)
+    start = time.perf_counter()
+    try:
+        load()
+        _errors.pop(name, None)
+        _timings[name] = round(time.perf_counter() - start, 3)
+        print(f"[WARMUP] {name} ready in {_timings[name]}s")
+    except Exception as e:
+        _errors[name] = str(e)
+        print(f"[WARMUP] {name} failed: {e}")
+    finally:
+        with _lock:
+            _warming.discard(name)
+
+def warm_up() -> None:
+    """Load every subsystem that isn't warm yet. Blocking; run it in a thread."""
+    for name, (_, is_warm) in SUBSYSTEMS.items():
+        if not is_warm():
+            warm(name)
+
+def status() -> Dict:
+    """{'ready': bool, 'subsystems': {name: {'state', 'seconds', 'error'}}} without loading anything."""
+    subsystems = {}
+    for name, (_, is_warm) in SUBSYSTEMS.items():
+        if is_warm():
+            state = "warm"
+        elif name in _warming:
+            state = "warming"
+        elif name in _errors:
+            state = "failed"
+        else:
+            state = "cold"
+        subsystems[name] = {"state": state, "seconds": _timings.get(name), "error": _errors.get(name)}
+    ready = all(subsystems[name]["state"] == "warm" for name in READINESS_REQUIRED)
+    return {"ready": ready, "subsystems": subsystems}
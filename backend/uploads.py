@@ -0,0 +1,71 @@
+"""Streaming uploads to disk.
+
+Uploads are copied from the request's spooled temp file to their
+destination in fixed-size chunks, hashing (and, for PDFs, counting pages)
+as they go, so memory per upload stays at one chunk however large the file
+is. The copy goes to a temp file next to the destination and is renamed
+into place only once complete and within the size limit: a rejected or
+failed upload never replaces the file already there.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional
+from backend.config import UPLOAD_CHUNK_BYTES
+
+class UploadRejected(ValueError):
+    """The upload was refused while streaming; the destination was left untouched."""
+
+class UploadTooLarge(UploadRejected):
+    pass
+
+# Page objects, not the /Pages tree nodes. Pages inside compressed object
+# streams aren't visible this way, so the count is None when none are seen.
+_PAGE = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+_PAGE_OVERLAP = 32  # A match split across two chunks is still seen
+
+def save_stream(source: BinaryIO, dest: Path, max_bytes: int, count_pages: bool = False, magic: bytes = b"") -> Dict:
+    """Copy `source` to `dest` in chunks. Blocking; run it in a thread.
+
+    Returns {'size', 'digest' (sha256 hex), 'pages'}. Raises UploadTooLarge
+    as soon as more than `max_bytes` have been read, and UploadRejected if
+    the file doesn't start with `magic`.
+    """
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha256()
+    size, pages, tail = 0, 0, b""
+    fd, tmp = tempfile.mkstemp(dir=dest.parent, prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = source.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"File size must be less than {max_bytes // (1024 * 1024)}MB")
+                if size == len(chunk) and not chunk.startswith(magic):
+                    raise UploadRejected("File content doesn't match its type")
+                digest.update(chunk)
+                if count_pages:
+                    window = tail + chunk
+                    # Matches ending in the overlap were counted last time; one ending at the
+                    # very end is left for the next chunk, which shows whether it's /Pages
+                    pages += sum(1 for m in _PAGE.finditer(window) if len(tail) <= m.end() < len(window))
+                    tail = window[-_PAGE_OVERLAP:]
+                out.write(chunk)
+        if size == 0:
+            raise UploadRejected("File is empty")
+        os.replace(tmp, dest)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    return {"size": size, "digest": digest.hexdigest(), "pages": (pages or None) if count_pages else None}
+
+def declared_size(content_length: Optional[str]) -> Optional[int]:
+    try:
+        return int(content_length) if content_length else None
+    except ValueError:
+        return None
@@ -36,7 +36,7 @@ def get_user_documents(username: str) -> List[str]:
 
 def delete_user_document(username: str, filename: str) -> bool:
     file_path = Path(UPLOADS_DIR) / username / filename
-    if file_path.exists():
+    if file_path.is_file():
         file_path.unlink()
         return True
     return False
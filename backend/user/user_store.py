@@ -0,0 +1,305 @@
+"""SQLite-backed user storage with indexed lookups and atomic quota updates."""
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from backend.config import USERS_DB_FILE, USERS_DB_PATH
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = set()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username   TEXT PRIMARY KEY,
+    email      TEXT NOT NULL,
+    password   TEXT NOT NULL,
+    created_at TEXT NOT NULL DEFAULT ''
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_users_email ON users(email);
+
+CREATE TABLE IF NOT EXISTS quotas (
+    username   TEXT NOT NULL REFERENCES users(username) ON UPDATE CASCADE ON DELETE CASCADE,
+    quota_type TEXT NOT NULL,
+    value      INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (username, quota_type)
+);
+
+-- Logged-out tokens until they expire, and per-user "tokens issued before this are invalid" times
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+    token_id   TEXT PRIMARY KEY,
+    expires_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS token_cutoffs (
+    username    TEXT PRIMARY KEY REFERENCES users(username) ON UPDATE CASCADE ON DELETE CASCADE,
+    valid_after REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+USER_FIELDS = ("email", "password", "created_at")
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.execute("PRAGMA busy_timeout=30000")
+    return conn
+
+
+def _conn() -> sqlite3.Connection:
+    """Return this thread's connection, creating the schema on first use."""
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+
+    path = str(USERS_DB_PATH)
+    conn = conns.get(path)
+    if conn is None:
+        conn = conns[path] = _connect(path)
+        with _init_lock:
+            if path not in _initialized:
+                conn.executescript(SCHEMA)
+                _import_json(conn)
+                _initialized.add(path)
+    return conn
+
+
+def _import_json(conn: sqlite3.Connection) -> None:
+    """One-time import of the legacy users.json file."""
+    if conn.execute("SELECT 1 FROM meta WHERE key = 'json_imported'").fetchone():
+        return
+
+    legacy = Path(USERS_DB_FILE)
+    users = json.loads(legacy.read_text()) if legacy.exists() else {}
+
+    skipped = []
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Another worker may have imported while this one waited for the lock
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'json_imported'").fetchone():
+            conn.execute("COMMIT")
+            return
+        for username, data in users.items():
+            inserted = conn.execute(
+                "INSERT OR IGNORE INTO users (username, email, password, created_at) VALUES (?, ?, ?, ?)",
+                (username, data.get("email", ""), data.get("password", ""), data.get("created_at", ""))
+            ).rowcount
+            if not inserted:
+                # Duplicate username or email (several legacy users without one count as duplicates)
+                skipped.append(username)
+                continue
+            for key, value in data.items():
+                if key not in USER_FIELDS and isinstance(value, int):
+                    conn.execute(
+                        "INSERT OR IGNORE INTO quotas (username, quota_type, value) VALUES (?, ?, ?)",
+                        (username, key, value)
+                    )
+        conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('json_imported', ?)", (str(len(users) - len(skipped)),))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+    if users:
+        print(f"[USERS] Imported {len(users) - len(skipped)} users from {legacy}")
+    if skipped:
+        print(f"[USERS] Skipped {len(skipped)} legacy users with a duplicate username or email: {', '.join(skipped)}")
+
+
+def _row_to_user(conn: sqlite3.Connection, row: sqlite3.Row) -> Dict:
+    user = {field: row[field] for field in USER_FIELDS}
+    for q in conn.execute("SELECT quota_type, value FROM quotas WHERE username = ?", (row["username"],)):
+        user[q["quota_type"]] = q["value"]
+    return user
+
+
+def _constraint_error(e: sqlite3.IntegrityError) -> str:
+    return "email" if "email" in str(e) else "username"
+
+# ========== READS ==========
+
+def get_user(username: str) -> Optional[Dict]:
+    conn = _conn()
+    row = conn.execute("SELECT * FROM users WHERE username = ?", (username,)).fetchone()
+    return _row_to_user(conn, row) if row else None
+
+
+def get_username_by_email(email: str) -> Optional[str]:
+    row = _conn().execute("SELECT username FROM users WHERE email = ?", (email,)).fetchone()
+    return row["username"] if row else None
+
+
+def list_users() -> List[Tuple[str, Dict]]:
+    conn = _conn()
+    rows = conn.execute("SELECT * FROM users ORDER BY username").fetchall()
+    return [(row["username"], _row_to_user(conn, row)) for row in rows]
+
+# ========== WRITES ==========
+
+def create_user(username: str, email: str, password: str, created_at: str, quotas: Dict[str, int]) -> Tuple[bool, str]:
+    """Insert a user and its quotas atomically. Returns (success, conflicting field)."""
+    conn = _conn()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            "INSERT INTO users (username, email, password, created_at) VALUES (?, ?, ?, ?)",
+            (username, email, password, created_at)
+        )
+        conn.executemany(
+            "INSERT INTO quotas (username, quota_type, value) VALUES (?, ?, ?)",
+            [(username, k, v) for k, v in quotas.items()]
+        )
+        conn.execute("COMMIT")
+        return True, ""
+    except sqlite3.IntegrityError as e:
+        conn.execute("ROLLBACK")
+        return False, _constraint_error(e)
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def update_user(username: str, new_username: str = None, new_email: str = None) -> Tuple[bool, str]:
+    """Rename a user and/or change their email. Returns (success, conflicting field)."""
+    conn = _conn()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        if new_email:
+            conn.execute("UPDATE users SET email = ? WHERE username = ?", (new_email, username))
+        if new_username and new_username != username:
+            conn.execute("UPDATE users SET username = ? WHERE username = ?", (new_username, username))
+        conn.execute("COMMIT")
+        return True, ""
+    except sqlite3.IntegrityError as e:
+        conn.execute("ROLLBACK")
+        return False, _constraint_error(e)
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def set_password(username: str, password_hash: str) -> bool:
+    cur = _conn().execute("UPDATE users SET password = ? WHERE username = ?", (password_hash, username))
+    return cur.rowcount > 0
+
+# ========== TOKEN REVOCATION ==========
+
+def _bump_revocation_version(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        "INSERT INTO meta (key, value) VALUES ('revocation_version', '1') "
+        "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+    )
+
+
+def revocation_version() -> int:
+    """Counter bumped by every revocation; workers reload their revocation sets when it moves."""
+    row = _conn().execute("SELECT value FROM meta WHERE key = 'revocation_version'").fetchone()
+    return int(row["value"]) if row else 0
+
+
+def load_revocations(now: float) -> Tuple[int, Dict[str, float], Dict[str, float]]:
+    """Return (version, {token_id: expires_at}, {username: valid_after}) as of one consistent read."""
+    conn = _conn()
+    conn.execute("BEGIN")
+    try:
+        version = revocation_version()
+        tokens = dict(conn.execute(
+            "SELECT token_id, expires_at FROM revoked_tokens WHERE expires_at > ?", (now,)
+        ).fetchall())
+        cutoffs = dict(conn.execute("SELECT username, valid_after FROM token_cutoffs").fetchall())
+    finally:
+        conn.execute("COMMIT")
+    return version, tokens, cutoffs
+
+
+def revoke_token(token_id: str, expires_at: float, now: float) -> None:
+    """Revoke one token until its expiry, dropping revocations of tokens that have expired anyway."""
+    conn = _conn()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DELETE FROM revoked_tokens WHERE expires_at <= ?", (now,))
+        conn.execute("INSERT OR IGNORE INTO revoked_tokens (token_id, expires_at) VALUES (?, ?)", (token_id, expires_at))
+        _bump_revocation_version(conn)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def revoke_tokens_before(username: str, cutoff: float) -> None:
+    conn = _conn()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            "INSERT INTO token_cutoffs (username, valid_after) SELECT username, ? FROM users WHERE username = ? "
+            "ON CONFLICT(username) DO UPDATE SET valid_after = MAX(valid_after, excluded.valid_after)",
+            (cutoff, username)
+        )
+        _bump_revocation_version(conn)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+# ========== QUOTAS ==========
+
+def get_quota(username: str, quota_type: str) -> int:
+    row = _conn().execute(
+        "SELECT value FROM quotas WHERE username = ? AND quota_type = ?", (username, quota_type)
+    ).fetchone()
+    return row["value"] if row else 0
+
+
+def set_quota(username: str, quota_type: str, value: int) -> bool:
+    conn = _conn()
+    if not conn.execute("SELECT 1 FROM users WHERE username = ?", (username,)).fetchone():
+        return False
+    conn.execute(
+        "INSERT INTO quotas (username, quota_type, value) VALUES (?, ?, ?) "
+        "ON CONFLICT(username, quota_type) DO UPDATE SET value = excluded.value",
+        (username, quota_type, int(value))
+    )
+    return True
+
+
+def ensure_quotas(username: str, defaults: Dict[str, int]) -> None:
+    """Create any missing quota rows for an existing user."""
+    conn = _conn()
+    if not conn.execute("SELECT 1 FROM users WHERE username = ?", (username,)).fetchone():
+        return
+    conn.executemany(
+        "INSERT OR IGNORE INTO quotas (username, quota_type, value) VALUES (?, ?, ?)",
+        [(username, k, v) for k, v in defaults.items()]
+    )
+
+
+def consume_quotas(usage: Dict[Tuple[str, str], int]) -> Dict[Tuple[str, str], int]:
+    """Apply a batch of usage counts in one transaction and return the new values."""
+    conn = _conn()
+    remaining = {}
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for (username, quota_type), amount in usage.items():
+            conn.execute(
+                "UPDATE quotas SET value = MAX(value - ?, 0) WHERE username = ? AND quota_type = ?",
+                (amount, username, quota_type)
+            )
+            row = conn.execute(
+                "SELECT value FROM quotas WHERE username = ? AND quota_type = ?", (username, quota_type)
+            ).fetchone()
+            remaining[(username, quota_type)] = row["value"] if row else 0
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return remaining
@@ -0,0 +1,145 @@
+"""Compare PDF chunking throughput and chunk shape: SentenceSplitter vs the structure-aware chunker.
+
+Usage:
+    python -m benchmarks.bench_chunking [--docs 4 --pages 40] [--repeat 3] [--output chunking.json]
+
+On synthetic reports with headings, prose and tables (written as real
+text-layer PDFs), times each path end to end from the file:
+
+    sentence             llama_index PDFReader + SentenceSplitter (the previous path)
+    structured           pypdf + structure-aware chunker, in-process
+    structured_parallel  the same, page ranges across PDF_PARSE_WORKERS processes
+    chunker_only         the structure-aware chunker alone on already extracted text
+
+and reports pages/s, chunks, mean tokens per chunk and how many table rows
+ended up in a chunk without their table's header row. Paths whose
+dependencies are missing are reported as skipped.
+"""
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+import numpy as np
+
+from benchmarks.fakes import write_pdf
+
+def make_report_pages(pages: int, seed: int = 0) -> List[List[str]]:
+    """Pages of a report: numbered sections, prose paragraphs and tables with a header row."""
+    rng = np.random.default_rng(seed)
+    words = ["revenue", "growth", "region", "market", "customer", "product", "quarter", "margin", "costs", "demand",
+             "increased", "declined", "stable", "forecast", "strategy", "operations", "significant", "expected"]
+    out, section = [], 0
+    for _ in range(pages):
+        lines: List[str] = []
+        while len(lines) < 48:
+            roll = rng.random()
+            if roll < 0.12:
+                section += 1
+                lines += ["", f"{section}. {' '.join(rng.choice(words, 3)).title()}"]
+            elif roll < 0.3:
+                lines += ["", "Region    Units    Revenue    Margin"]
+                lines += [f"R{rng.integers(100):02d}    {rng.integers(1, 999)}    {rng.integers(1000, 99999)}    {rng.integers(5, 40)}%" for _ in range(rng.integers(3, 12))]
+                lines.append("")
+            else:
+                for _ in range(rng.integers(2, 6)):
+                    lines.append(" ".join(rng.choice(words, 12)).capitalize() + ".")
+        out.append(lines[:48])
+    return out
+
+def _orphan_rows(chunks: List[str]) -> int:
+    """Table rows in a chunk that doesn't also hold the table header."""
+    orphans = 0
+    for text in chunks:
+        rows = [line for line in text.splitlines() if line.startswith("R") and "%" in line]
+        if rows and "Region" not in text:
+            orphans += len(rows)
+    return orphans
+
+def _time(fn: Callable[[], List[str]], pages: int, repeat: int) -> Dict:
+    try:
+        texts = fn()  # Warm-up: imports, pool start-up
+    except ImportError as e:
+        return {"skipped": f"missing dependency: {e.name}"}
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        texts = fn()
+        samples.append(time.perf_counter() - start)
+    seconds = statistics.median(samples)
+    from backend.rag.chunking import tokens
+    return {
+        "seconds": round(seconds, 4),
+        "pages_per_second": round(pages / seconds, 1),
+        "chunks": len(texts),
+        "mean_tokens": round(sum(tokens(t) for t in texts) / max(len(texts), 1), 1),
+        "orphan_table_rows": _orphan_rows(texts),
+    }
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    from backend.rag import data_loader
+    from backend.rag.chunking import chunk_page, assign_sections
+
+    corpus = [make_report_pages(args.pages, args.seed + d) for d in range(args.docs)]
+    total_pages = args.docs * args.pages
+    with tempfile.TemporaryDirectory(prefix="rag-chunking-") as tmp:
+        paths = []
+        for d, pages in enumerate(corpus):
+            paths.append(str(Path(tmp) / f"report-{d}.pdf"))
+            write_pdf(Path(paths[-1]), pages)
+
+        def sentence():
+            return [text for path in paths for text in data_loader.load_and_chunk_pdf(path)]
+
+        def structured():
+            out = []
+            for path in paths:
+                from pypdf import PdfReader
+                pages = len(PdfReader(path).pages)
+                out += assign_sections(data_loader._chunk_page_range(path, 0, pages))
+            return [c["text"] for c in out]
+
+        def structured_parallel():
+            data_loader.PDF_PARALLEL_MIN_PAGES = 1
+            return [c["text"] for path in paths for c in data_loader.load_pdf_chunks(path)]
+
+        extracted = [["\n".join(lines) for lines in pages] for pages in corpus]
+
+        def chunker_only():
+            return [
+                c["text"] for pages in extracted
+                for c in assign_sections([chunk_page(text, i + 1) for i, text in enumerate(pages)])
+            ]
+
+        results = {
+            "sentence": _time(sentence, total_pages, args.repeat),
+            "structured": _time(structured, total_pages, args.repeat),
+            "structured_parallel": _time(structured_parallel, total_pages, args.repeat),
+            "chunker_only": _time(chunker_only, total_pages, args.repeat),
+        }
+        data_loader.shutdown_pdf_pool()
+
+    print(f"{args.docs} PDFs x {args.pages} pages, median of {args.repeat}, {data_loader.PDF_PARSE_WORKERS} workers")
+    print(f"{'path':20s} {'pages/s':>9s} {'chunks':>7s} {'tokens':>7s} {'orphan rows':>12s}")
+    for name, row in results.items():
+        if "skipped" in row:
+            print(f"{name:20s} skipped ({row['skipped']})")
+        else:
+            print(f"{name:20s} {row['pages_per_second']:9.1f} {row['chunks']:7d} {row['mean_tokens']:7.1f} {row['orphan_table_rows']:12d}")
+    if args.output:
+        Path(args.output).write_text(json.dumps({"docs": args.docs, "pages": args.pages, "results": results}, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""Benchmark vectorized column info and correlation scanning against the previous per-column code on wide tables.
+
+Usage:
+    python -m benchmarks.bench_column_profile [--rows 5000] [--cols 600] [--repeat 3]
+"""
+import argparse
+import json
+import time
+import numpy as np
+import pandas as pd
+
+from backend.data_analysis.analysis import strong_correlations
+from backend.data_analysis.excel_loader import get_column_info
+
+# ========== PREVIOUS IMPLEMENTATION (for comparison) ==========
+
+def legacy_strong_correlations(corr: dict) -> list:
+    corr_df = pd.DataFrame(corr)
+    found = []
+    for i in range(len(corr_df.columns)):
+        for j in range(i + 1, len(corr_df.columns)):
+            if abs(corr_df.iloc[i, j]) > 0.7:
+                found.append((corr_df.columns[i], corr_df.columns[j]))
+    return found
+
+def legacy_column_info(df: pd.DataFrame) -> list:
+    info = []
+    for col in df.columns:
+        entry = {'non_null': int(df[col].count()), 'null': int(df[col].isna().sum()), 'unique': int(df[col].nunique())}
+        if pd.api.types.is_numeric_dtype(df[col]):
+            entry['mean'] = float(df[col].mean())
+        info.append(entry)
+    return info
+
+# ========== HARNESS ==========
+
+def make_table(rows: int, cols: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    n_cat = max(cols // 10, 1)
+    base = rng.normal(size=(rows, 1))
+    numeric = rng.normal(size=(rows, cols - n_cat)) + base * rng.uniform(0, 2, size=cols - n_cat)
+    numeric[rng.random(numeric.shape) < 0.02] = np.nan
+    df = pd.DataFrame(numeric, columns=[f"n{i}" for i in range(cols - n_cat)])
+    for i in range(n_cat):
+        df[f"c{i}"] = rng.choice(["north", "south", "east", "west"], size=rows)
+    return df
+
+def best_of(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--cols", type=int, default=600)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_table(args.rows, args.cols)
+    corr = df.select_dtypes(include='number').corr()
+
+    def legacy():
+        legacy_strong_correlations(corr.to_dict())
+        legacy_column_info(df)
+
+    def vectorized():
+        strong_correlations(corr)
+        get_column_info(df)
+
+    # Outputs must agree before timings mean anything
+    old, new = legacy_column_info(df), get_column_info(df)
+    assert all(np.isclose(o[k], n[k]) for o, n in zip(old, new) for k in o)
+    assert legacy_strong_correlations(corr.to_dict()) == [(a, b) for a, b, _ in strong_correlations(corr)]
+
+    legacy_s = best_of(legacy, args.repeat)
+    vectorized_s = best_of(vectorized, args.repeat)
+    print(json.dumps({
+        "rows": args.rows,
+        "cols": args.cols,
+        "legacy_seconds": round(legacy_s, 4),
+        "vectorized_seconds": round(vectorized_s, 4),
+        "speedup": round(legacy_s / vectorized_s, 2)
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
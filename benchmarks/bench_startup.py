@@ -0,0 +1,92 @@
+"""Check the API's import time against STARTUP_IMPORT_BUDGET_SECONDS.
+
+Usage:
+    python -m benchmarks.bench_startup [--runs 5] [--top 15] [--budget 1.5]
+
+Imports backend.main in fresh interpreters (as a worker does before it can
+accept connections) and reports the median wall time, the slowest packages
+by import time (python -X importtime), and any heavy module that
+got imported eagerly. Exits 1 if the median is over budget or a heavy module
+was imported: those belong behind a function-level import and the warm-up
+in backend.readiness.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+REPO = Path(__file__).resolve().parent.parent
+HEAVY = [
+    "torch", "sentence_transformers", "transformers", "llama_index", "pypdf",
+    "qdrant_client", "groq", "pandas", "pyarrow", "numpy", "plotly", "scipy"
+]
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import backend.main
+seconds = time.perf_counter() - start
+print(json.dumps({"seconds": seconds, "loaded": sorted(m for m in %r if m in sys.modules)}))
+""" % (HEAVY,)
+
+def _run(work: Path, importtime: bool = False) -> subprocess.CompletedProcess:
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", PROBE]
+    env = dict(os.environ, PYTHONPATH=str(REPO), WARMUP_ON_STARTUP="0")
+    result = subprocess.run(command, cwd=work, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed")
+    return result
+
+def _slowest(stderr: str, top: int) -> List[Dict]:
+    """Top-level packages by total self import time, from -X importtime output."""
+    totals: Dict[str, int] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        own, _, name = line[len("import time:"):].split("|")
+        if not own.strip().isdigit():
+            continue  # Header line
+        package = name.strip().split(".")[0]
+        totals[package] = totals.get(package, 0) + int(own)
+    ranked = sorted(totals.items(), key=lambda item: -item[1])[:top]
+    return [{"package": package, "ms": round(us / 1000, 1)} for package, us in ranked]
+
+def main() -> int:
+    from backend.config import STARTUP_IMPORT_BUDGET_SECONDS
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget", type=float, default=STARTUP_IMPORT_BUDGET_SECONDS)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="rag-startup-") as tmp:
+        work = Path(tmp)
+        (work / "frontend").symlink_to(REPO / "frontend")  # main mounts it at import
+        _run(work)  # Warm the filesystem and bytecode caches
+        samples = [json.loads(_run(work).stdout.strip().splitlines()[-1]) for _ in range(args.runs)]
+        slowest = _slowest(_run(work, importtime=True).stderr, args.top)
+
+    median = statistics.median(s["seconds"] for s in samples)
+    loaded = samples[-1]["loaded"]
+    print(f"import backend.main: median {median:.3f}s over {args.runs} runs (budget {args.budget:.2f}s)")
+    print("slowest packages (self time, summed over their modules):")
+    for row in slowest:
+        print(f"  {row['ms']:8.1f} ms  {row['package']}")
+
+    failed = False
+    if median > args.budget:
+        print(f"[FAIL] over budget by {median - args.budget:.3f}s")
+        failed = True
+    if loaded:
+        print(f"[FAIL] heavy modules imported at startup: {', '.join(loaded)}")
+        failed = True
+    if not failed:
+        print("[OK] within budget, no heavy modules imported")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+"""Evaluate retrieval quality and prompt cost across score thresholds and top_k, without calling the LLM.
+
+Usage:
+    python -m benchmarks.eval_retrieval --synthetic [--docs 8 --pages 5]
+    python -m benchmarks.eval_retrieval --questions labeled.jsonl --pdf a.pdf --pdf b.pdf
+    python -m benchmarks.eval_retrieval --questions labeled.jsonl --username alice
+
+    Sweep: --thresholds 0.2,0.25,0.3 --top-k 3,5,8 --fallback 0.3,0.35,0.4,0.45 [--output report.json]
+
+Labeled questions are JSON lines:
+    {"question": "What was Q3 revenue?", "answers": ["4.2 million"], "documents": ["report.pdf"]}
+A retrieved chunk is relevant if it contains one of `answers`
+(case-insensitive) and, when `documents` is given, comes from one of them.
+Questions without answers are unanswerable: for them the right outcome
+is the general-knowledge fallback.
+
+--pdf and --synthetic index into an in-process Qdrant; with only
+--username, the collection at QDRANT_URL is used as is. Each question is
+embedded and searched once with the largest top_k; every (threshold,
+top_k, fallback) combination is then replayed from those hits with the
+same filtering, parent expansion and fallback decision as /rag/query.
+With SMALL_TO_BIG, top_k counts results and children are searched
+CHILD_TOP_K_FACTOR times as deep, as the endpoint does. Per combination:
+
+    recall@k        answerable questions with a relevant chunk retrieved
+    mrr             mean reciprocal rank of the first relevant chunk
+    fallback        questions answered from general knowledge
+    missed          answerable questions whose answer never reaches the LLM
+    wasted          unanswerable questions still sent with document context
+    prompt_tokens   estimated mean prompt tokens per question (chars / 4)
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from itertools import product
+from pathlib import Path
+from typing import Dict, List
+
+OFF_TOPIC = [
+    "What is the capital of Australia?",
+    "How do I bake sourdough bread?",
+    "Who painted the Mona Lisa?",
+    "What is the boiling point of water at sea level?",
+    "Recommend a good science fiction novel.",
+    "How many moons does Jupiter have?",
+    "What is the difference between TCP and UDP?",
+    "Translate 'good morning' into Spanish.",
+]
+
+def _floats(raw: str) -> List[float]:
+    return [float(x) for x in raw.split(",") if x.strip()]
+
+def _ints(raw: str) -> List[int]:
+    return [int(x) for x in raw.split(",") if x.strip()]
+
+def _load_questions(path: str) -> List[Dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def _ingest(paths: List[Path], username: str) -> int:
+    import uuid
+    from backend.rag.data_loader import load_pdf_chunks, embed_texts
+    from backend.rag.parents import index_points
+    from backend.rag.vector_db import QdrantStorage
+    from backend.data_analysis.result_store import content_hash
+    total = 0
+    for path in paths:
+        points = index_points(load_pdf_chunks(str(path)), content_hash(path.read_bytes()))
+        source = f"{username}/{path.name}"
+        ids = [str(uuid.uuid5(uuid.NAMESPACE_URL, f"{source}:{i}")) for i in range(len(points))]
+        payloads = [dict(point, source=source, type="pdf") for point in points]
+        QdrantStorage().upsert(ids, embed_texts([point["text"] for point in points]), payloads)
+        total += len(points)
+    return total
+
+def _relevant(text: str, source: str, question: Dict) -> bool:
+    documents = question.get("documents")
+    if documents and source.split("/", 1)[-1] not in documents:
+        return False
+    lowered = text.lower()
+    return any(answer.lower() in lowered for answer in question.get("answers", []))
+
+def _prompt_tokens(question: str, contexts: List[str], confident: bool) -> int:
+    from backend.rag.prompts import (
+        DOCUMENT_SYSTEM_PROMPT, GENERAL_SYSTEM_PROMPT, create_document_prompt, create_general_prompt
+    )
+    if confident:
+        text = DOCUMENT_SYSTEM_PROMPT + create_document_prompt("\n\n".join(contexts), question)
+    else:
+        text = GENERAL_SYSTEM_PROMPT + create_general_prompt(question)
+    return len(text) // 4
+
+def evaluate(questions: List[Dict], hits: List[Dict], username: str, threshold: float, top_k: int, fallback: float) -> Dict:
+    """Replay /rag/query's retrieval decisions for one parameter combination."""
+    from backend.config import (
+        MIN_CONTEXT_CHUNKS, DOCUMENT_CONTEXT_LIMIT, DOCUMENT_CONTEXT_TOKENS, SMALL_TO_BIG, CHILD_TOP_K_FACTOR
+    )
+    from backend.rag.retrieval import kept_hits, is_confident
+    from backend.rag.parents import expand_hits
+
+    fetched = top_k * CHILD_TOP_K_FACTOR if SMALL_TO_BIG else top_k
+    answerable = retrieved = missed = wasted = fallbacks = 0
+    reciprocal_ranks, tokens = [], []
+    for question, found in zip(questions, hits):
+        # Search returns hits by descending score: the first `fetched` above the threshold
+        above = [i for i, score in enumerate(found["scores"][:fetched]) if score >= threshold]
+        subset = {key: [found[key][i] for i in above] for key in ("contexts", "sources", "scores", "parents") if key in found}
+        kept = kept_hits(subset, username, question.get("selected_documents"))
+        contexts = [subset["contexts"][i] for i in kept]
+        sources = [subset["sources"][i] for i in kept]
+        confident = is_confident([subset["scores"][i] for i in kept], MIN_CONTEXT_CHUNKS, fallback)
+        sent = {"contexts": [], "sources": []}
+        if confident:
+            budget = DOCUMENT_CONTEXT_TOKENS if SMALL_TO_BIG else None
+            sent = expand_hits(subset, kept, min(DOCUMENT_CONTEXT_LIMIT, top_k), budget)
+        fallbacks += not confident
+        tokens.append(_prompt_tokens(question["question"], sent["contexts"], confident))
+
+        if not question.get("answers"):
+            wasted += confident
+            continue
+        answerable += 1
+        ranks = [rank for rank, (text, src) in enumerate(zip(contexts, sources), start=1) if _relevant(text, src, question)]
+        retrieved += bool(ranks)
+        reciprocal_ranks.append(1 / ranks[0] if ranks else 0.0)
+        missed += not any(_relevant(text, src, question) for text, src in zip(sent["contexts"], sent["sources"]))
+
+    unanswerable = len(questions) - answerable
+    return {
+        "threshold": threshold,
+        "top_k": top_k,
+        "fallback": fallback,
+        "recall_at_k": retrieved / answerable if answerable else None,
+        "mrr": sum(reciprocal_ranks) / answerable if answerable else None,
+        "fallback_rate": fallbacks / len(questions),
+        "missed_rate": missed / answerable if answerable else None,
+        "wasted_rate": wasted / unanswerable if unanswerable else None,
+        "prompt_tokens": sum(tokens) / len(tokens),
+    }
+
+def _fmt(value) -> str:
+    return "     -" if value is None else f"{value:6.3f}"
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", help="Labeled questions (JSON lines)")
+    parser.add_argument("--pdf", action="append", default=[], help="Index this PDF into an in-process store first")
+    parser.add_argument("--synthetic", action="store_true", help="Generate PDFs with planted facts and their questions")
+    parser.add_argument("--docs", type=int, default=8)
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--username", default="eval", help="Owner of the documents searched")
+    parser.add_argument("--thresholds", default="0.15,0.2,0.25,0.3,0.35")
+    parser.add_argument("--top-k", default="3,5,8,10")
+    parser.add_argument("--fallback", default="0.3,0.35,0.4,0.45,0.5")
+    parser.add_argument("--output", help="Write every combination as JSON here")
+    args = parser.parse_args()
+    if not (args.questions or args.synthetic):
+        parser.error("give --questions or --synthetic")
+
+    if args.pdf or args.synthetic:
+        os.environ["QDRANT_URL"] = ":memory:"  # Before backend.config is imported
+    from backend import config
+    from backend.rag.data_loader import embed_texts
+    from backend.rag.vector_db import QdrantStorage
+
+    questions = _load_questions(args.questions) if args.questions else []
+    with tempfile.TemporaryDirectory(prefix="rag-eval-") as tmp:
+        paths = [Path(p) for p in args.pdf]
+        if args.synthetic:
+            from benchmarks.fakes import make_corpus, write_pdf
+            corpus, planted = make_corpus(args.docs, args.pages, args.seed)
+            for i, document in enumerate(corpus):
+                paths.append(Path(tmp) / f"doc-{i}.pdf")
+                write_pdf(paths[-1], document)
+            questions += [{"question": q["question"], "answers": [q["answer"]]} for q in planted]
+            questions += [{"question": q, "answers": []} for q in OFF_TOPIC]
+        if paths:
+            print(f"[EVAL] Indexed {_ingest(paths, args.username)} chunks from {len(paths)} PDF(s)", file=sys.stderr)
+
+    thresholds, top_ks, fallbacks = _floats(args.thresholds), _ints(args.top_k), _floats(args.fallback)
+    store = QdrantStorage()
+    vectors = embed_texts([q["question"] for q in questions])
+    hits, search_ms = [], []
+    for vector in vectors:
+        start = time.perf_counter()
+        hits.append(store.search(vector, top_k=max(top_ks) * (config.CHILD_TOP_K_FACTOR if config.SMALL_TO_BIG else 1), score_threshold=0.0))
+        search_ms.append((time.perf_counter() - start) * 1000)
+
+    rows = [
+        evaluate(questions, hits, args.username, threshold, top_k, fallback)
+        for threshold, top_k, fallback in product(thresholds, top_ks, fallbacks)
+    ]
+    current = (config.QUERY_SCORE_THRESHOLD, config.DEFAULT_TOP_K, config.FALLBACK_THRESHOLD)
+    answerable = sum(bool(q.get("answers")) for q in questions)
+    print(f"{len(questions)} questions ({answerable} answerable), mean search {sum(search_ms) / len(search_ms):.1f} ms")
+    print(" thresh  top_k fallbk  recall    mrr fallbk missed wasted tokens")
+    # Fewest wrong outcomes first, then cheapest prompts
+    ranked = sorted(rows, key=lambda r: ((r["missed_rate"] or 0) + (r["wasted_rate"] or 0), r["prompt_tokens"]))
+    for row in ranked:
+        marker = " *" if (row["threshold"], row["top_k"], row["fallback"]) == current else ""
+        print(
+            f"{row['threshold']:7.2f} {row['top_k']:6d} {row['fallback']:6.2f} {_fmt(row['recall_at_k'])} {_fmt(row['mrr'])} "
+            f"{_fmt(row['fallback_rate'])} {_fmt(row['missed_rate'])} {_fmt(row['wasted_rate'])} {row['prompt_tokens']:6.0f}{marker}"
+        )
+    print("* = current config (QUERY_SCORE_THRESHOLD, DEFAULT_TOP_K, FALLBACK_THRESHOLD)")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({
+            "questions": len(questions),
+            "answerable": answerable,
+            "current": dict(zip(["threshold", "top_k", "fallback"], current)),
+            "mean_search_ms": sum(search_ms) / len(search_ms),
+            "results": ranked,
+        }, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
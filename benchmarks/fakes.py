@@ -0,0 +1,133 @@
+"""Offline stand-ins and synthetic inputs for the benchmark suite.
+
+- FakeGroqServer: a local HTTP server speaking the OpenAI-compatible chat
+  completions API the Groq SDK calls, with a fixed artificial latency
+- write_pdf / make_corpus: text PDFs with planted facts to ask about
+- make_table: sales-like tables written as CSV or Excel
+
+Qdrant needs no fake: QDRANT_URL=":memory:" runs qdrant-client's
+in-process store.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Tuple
+import numpy as np
+import pandas as pd
+
+# ========== FAKE GROQ ==========
+
+class FakeGroqServer:
+    """Answers POST /openai/v1/chat/completions after `latency_ms`. Use as a context manager."""
+
+    def __init__(self, latency_ms: float = 50, port: int = 0):
+        latency = latency_ms / 1000
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("content-length", 0))) or b"{}")
+                time.sleep(latency)
+                prompt = " ".join(str(m.get("content", "")) for m in body.get("messages", []))
+                answer = "Benchmark answer based on the provided context."
+                usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(answer) // 4}
+                usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+                payload = json.dumps({
+                    "id": "chatcmpl-bench",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "fake"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+                    "usage": usage
+                }).encode()
+                self.send_response(200)
+                self.send_header("content-type", "application/json")
+                self.send_header("content-length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self) -> "FakeGroqServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+# ========== PDFS ==========
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def write_pdf(path: Path, pages: List[List[str]]) -> None:
+    """Write a minimal text-layer PDF, one list of lines per page."""
+    n = len(pages)
+    # Objects: 1 catalog, 2 page tree, 3 font, then a (page, content) pair per page
+    kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(n))
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{kids}] /Count {n} >>".encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, lines in enumerate(pages):
+        stream = ("BT /F1 10 Tf 12 TL 50 800 Td " + " ".join(f"({_escape(line)}) '" for line in lines) + " ET").encode("latin-1", "replace")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] /Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>".encode()
+        )
+        objects.append(b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    Path(path).write_bytes(bytes(out))
+
+def make_corpus(docs: int, pages: int, seed: int = 0) -> Tuple[List[List[List[str]]], List[Dict]]:
+    """Synthetic documents (pages of lines) and questions about facts planted in them."""
+    rng = np.random.default_rng(seed)
+    syllables = ["ka", "lo", "mi", "ren", "ta", "vo", "shi", "pa", "dor", "el", "qu", "an", "tis", "mo", "ra"]
+    vocabulary = ["".join(rng.choice(syllables, size=rng.integers(2, 4))) for _ in range(400)]
+    corpus, questions = [], []
+    for d in range(docs):
+        document = []
+        for p in range(pages):
+            lines = []
+            for _ in range(45):
+                lines.append(" ".join(rng.choice(vocabulary, size=12)) + ".")
+            # One fact per page, at a random line
+            project = f"{vocabulary[rng.integers(len(vocabulary))].capitalize()}-{d}-{p}"
+            budget = int(rng.integers(10, 900)) * 1000
+            lines[rng.integers(len(lines))] = f"The {project} project has a budget of {budget} dollars."
+            questions.append({"question": f"What is the budget of the {project} project?", "answer": str(budget), "doc": d})
+            document.append(lines)
+        corpus.append(document)
+    return corpus, questions
+
+# ========== TABLES ==========
+
+def make_table(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp("2022-01-01")
+    days = np.sort(rng.integers(0, 3 * 365, rows))
+    return pd.DataFrame({
+        "order_date": start + pd.to_timedelta(days, unit="D"),
+        "region": rng.choice(["North", "South", "East", "West"], rows),
+        "product": rng.choice([f"P{i:03d}" for i in range(200)], rows),
+        "units": rng.integers(1, 50, rows),
+        "revenue": (rng.gamma(2.0, 40.0, rows) * (1 + 0.2 * days / 365)).round(2),
+        "discount": np.where(rng.random(rows) < 0.1, np.nan, rng.uniform(0, 0.3, rows).round(3)),
+    })
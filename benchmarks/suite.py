@@ -0,0 +1,356 @@
+"""Offline benchmark suite for the ingestion, query and data-analysis paths.
+
+Usage:
+    python -m benchmarks.suite run [--flows ingest,query] [--output run.json] [--set CHUNK_SIZE=256]
+    python -m benchmarks.suite compare baseline.json candidate.json [--threshold 0.1]
+
+Flows:
+    ingest        PDF upload endpoint: chunk, embed, upsert (one op per PDF)
+    query         RAG question with retrieval and LLM, always a cache miss
+    query_cached  the same questions again, served from the response cache
+    summary       full-document summary request
+    data_analysis CSV analysis, charts and a query plan on a fresh copy of the file
+    llm_gateway   chat completions through the gateway alone
+
+Every flow runs in a fresh process against synthetic inputs, a fake Groq
+server (benchmarks.fakes) and qdrant-client's in-process store, so runs
+are reproducible offline once the embedding model is cached. Config
+values can be overridden per run with --set; the effective values are
+recorded in the output. Flows whose dependencies are missing are skipped.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Tuple
+import numpy as np
+
+from benchmarks.fakes import FakeGroqServer, make_corpus, make_table, write_pdf
+
+REPO = Path(__file__).resolve().parent.parent
+CONFIG_KEYS = [
+    "CHUNK_SIZE", "CHUNK_OVERLAP", "PDF_CHUNKER", "DEFAULT_TOP_K", "SCORE_THRESHOLD", "EMBEDDING_MODEL",
+    "EMBED_BATCH_SIZE", "LLM_MAX_CONCURRENCY", "DATA_CHUNK_ROWS", "METRICS_ENABLED"
+]
+USERNAME = "bench"
+
+# ========== FLOWS ==========
+# Each flow does its (untimed) setup and returns (op, count); op(i) runs the i-th timed operation.
+
+def _app():
+    from backend import main  # Needs the RAG stack: llama_index, sentence-transformers, qdrant-client
+    main.embed_texts(["warm-up"])  # Load the model outside the timed region
+    return main
+
+def _ingest(main, path: Path) -> None:
+    from starlette.datastructures import UploadFile
+    with open(path, "rb") as f:
+        result = asyncio.run(main.upload_endpoint(file=UploadFile(file=f, filename=path.name), username=USERNAME))
+    if not result["success"]:
+        raise RuntimeError(result["message"])
+
+def _write_corpus(args, work: Path):
+    corpus, questions = make_corpus(args.docs, args.pages, args.seed)
+    paths = []
+    for i, document in enumerate(corpus):
+        path = work / f"doc-{i}.pdf"
+        write_pdf(path, document)
+        paths.append(path)
+    return paths, questions
+
+def flow_ingest(args, work: Path) -> Tuple[Callable[[int], None], int]:
+    main = _app()
+    paths, _ = _write_corpus(args, work)
+    return (lambda i: _ingest(main, paths[i])), len(paths)
+
+def _seeded(args, work: Path):
+    main = _app()
+    paths, questions = _write_corpus(args, work)
+    for path in paths:
+        _ingest(main, path)
+    return main, questions
+
+def flow_query(args, work: Path):
+    main, questions = _seeded(args, work)
+
+    def op(i):
+        q = questions[i % len(questions)]
+        # The run number makes every question a cache miss
+        main._run_query(main.QueryRequest(question=f"{q['question']} (run {i})"), USERNAME)
+    return op, args.queries
+
+def flow_query_cached(args, work: Path):
+    main, questions = _seeded(args, work)
+    questions = questions[:args.queries]
+    for q in questions:
+        main._run_query(main.QueryRequest(question=q['question']), USERNAME)
+    return (lambda i: main._run_query(main.QueryRequest(question=questions[i % len(questions)]['question']), USERNAME)), args.queries
+
+def flow_summary(args, work: Path):
+    main, _ = _seeded(args, work)
+    return (lambda i: main._run_query(main.QueryRequest(question="Give me a summary of my documents"), USERNAME)), args.summaries
+
+def flow_data_analysis(args, work: Path):
+    from backend.data_analysis.workbook import analyze_sheet, sheet_charts
+    from backend.data_analysis.query_plan import validate_plan, run_plan
+    source = work / "sales.csv"
+    make_table(args.rows, args.seed).to_csv(source, index=False)
+    # A fresh file per op, so each one pays the Parquet conversion like a new upload
+    paths = []
+    for i in range(args.analyses):
+        paths.append(work / f"sales-{i}.csv")
+        shutil.copy(source, paths[-1])
+    plan = {
+        "group_by": ["region", {"column": "order_date", "grain": "month"}],
+        "aggregations": [{"column": "revenue", "func": "sum", "as": "revenue"}],
+        "sort": [{"by": "revenue", "desc": True}],
+        "limit": 10
+    }
+
+    def op(i):
+        path = str(paths[i])
+        result = analyze_sheet(path)
+        if not result['success']:
+            raise RuntimeError(result['error'])
+        sheet_charts(path, None, result['stats'], result['trends'])
+        dtypes = result['df_info']['dtypes']
+        run_plan(validate_plan(plan, dtypes), path, None, dtypes)
+    return op, len(paths)
+
+def flow_llm_gateway(args, work: Path):
+    from backend.llm_gateway import chat_completion
+    messages = [{"role": "system", "content": "You answer briefly."}, {"role": "user", "content": "Say hello."}]
+    return (lambda i: chat_completion(messages, mode="benchmark", temperature=0.0, max_tokens=32)), args.llm_calls
+
+FLOWS = {
+    "ingest": flow_ingest,
+    "query": flow_query,
+    "query_cached": flow_query_cached,
+    "summary": flow_summary,
+    "data_analysis": flow_data_analysis,
+    "llm_gateway": flow_llm_gateway,
+}
+
+# ========== RUNNER ==========
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KiB on Linux
+
+def _run_flow(name: str, options: Dict[str, Any], overrides: Dict[str, Any], env: Dict[str, str], work: str) -> Dict[str, Any]:
+    """Run one flow in this (fresh) process and return its measurements."""
+    sys.path.insert(0, str(REPO))
+    os.environ.update(env)
+    os.chdir(work)
+    # Overrides must land before any other backend module copies the config values
+    import backend.config as config
+    for key, value in overrides.items():
+        setattr(config, key, value)
+    effective = {key: getattr(config, key, None) for key in CONFIG_KEYS + list(overrides)}
+
+    args = argparse.Namespace(**options)
+    try:
+        start = time.perf_counter()
+        op, count = FLOWS[name](args, Path(work))
+        setup = time.perf_counter() - start
+    except ImportError as e:
+        return {"skipped": f"missing dependency: {e.name}", "config": effective}
+
+    latencies = [0.0] * count
+
+    def timed(i):
+        t = time.perf_counter()
+        op(i)
+        latencies[i] = time.perf_counter() - t
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(timed, range(count)))
+    wall = time.perf_counter() - start
+
+    ms = np.array(latencies) * 1000
+    return {
+        "ops": count,
+        "concurrency": args.concurrency,
+        "setup_seconds": round(setup, 3),
+        "wall_seconds": round(wall, 3),
+        "throughput_per_s": round(count / wall, 3) if wall else None,
+        "latency_ms": {
+            "mean": round(float(ms.mean()), 3),
+            "p50": round(float(np.percentile(ms, 50)), 3),
+            "p95": round(float(np.percentile(ms, 95)), 3),
+            "p99": round(float(np.percentile(ms, 99)), 3),
+            "max": round(float(ms.max()), 3),
+        },
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "config": effective,
+    }
+
+def _parse_override(item: str) -> Tuple[str, Any]:
+    key, _, raw = item.partition("=")
+    try:
+        return key, json.loads(raw)
+    except json.JSONDecodeError:
+        return key, raw
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO, capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def run(args) -> int:
+    flows = [f.strip() for f in args.flows.split(",") if f.strip()]
+    unknown = [f for f in flows if f not in FLOWS]
+    if unknown:
+        print(f"Unknown flow(s): {', '.join(unknown)}", file=sys.stderr)
+        return 2
+    overrides = dict(_parse_override(item) for item in args.set)
+    options = {k: v for k, v in vars(args).items() if k not in ("func", "flows", "set", "output")}
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "options": options,
+            "overrides": overrides,
+        },
+        "config": {},
+        "flows": {},
+    }
+
+    with tempfile.TemporaryDirectory(prefix="rag-bench-") as tmp, FakeGroqServer(args.llm_latency_ms) as groq:
+        env = {
+            "GROQ_BASE_URL": groq.url,
+            "GROQ_API_KEY": "benchmark",
+            "QDRANT_URL": ":memory:",
+            "USERS_DB_PATH": str(Path(tmp) / "users.db"),
+        }
+        for name in flows:
+            work = Path(tmp) / name
+            work.mkdir()
+            # The app mounts frontend/ relative to the working directory
+            (work / "frontend").symlink_to(REPO / "frontend")
+            print(f"[BENCH] {name}...", file=sys.stderr)
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as ex:
+                try:
+                    result = ex.submit(_run_flow, name, options, overrides, env, str(work)).result()
+                except Exception as e:
+                    result = {"error": f"{type(e).__name__}: {e}"}
+            report["config"].update(result.pop("config", {}))
+            report["flows"][name] = result
+            summary = result.get("skipped") or result.get("error") or (
+                f"{result['throughput_per_s']}/s, p95 {result['latency_ms']['p95']} ms, peak RSS {result['peak_rss_mb']} MB"
+            )
+            print(f"[BENCH] {name}: {summary}", file=sys.stderr)
+
+    output = json.dumps(report, indent=2, default=str)
+    if args.output:
+        Path(args.output).write_text(output)
+        print(f"[BENCH] Wrote {args.output}", file=sys.stderr)
+    else:
+        print(output)
+    return 0
+
+# ========== COMPARE ==========
+
+# (metric path, higher is better)
+COMPARED = [
+    ("throughput_per_s", True),
+    ("latency_ms.p50", False),
+    ("latency_ms.p95", False),
+    ("latency_ms.p99", False),
+    ("peak_rss_mb", False),
+]
+
+def _metric(result: Dict, path: str):
+    for part in path.split("."):
+        result = result.get(part) if isinstance(result, dict) else None
+    return result
+
+def compare(args) -> int:
+    base = json.loads(Path(args.baseline).read_text())
+    cand = json.loads(Path(args.candidate).read_text())
+
+    # Differences in config or workload explain most changes; show them first
+    for section, old_values, new_values in (
+        ("config", base["config"], cand["config"]),
+        ("option", base["meta"]["options"], cand["meta"]["options"]),
+    ):
+        for key in sorted(set(old_values) | set(new_values)):
+            if old_values.get(key) != new_values.get(key):
+                print(f"{section} {key}: {old_values.get(key)} -> {new_values.get(key)}")
+
+    regressions = []
+    print(f"{'flow':<14} {'metric':<18} {'baseline':>12} {'candidate':>12} {'change':>8}")
+    for flow in [f for f in base["flows"] if f in cand["flows"]]:
+        b, c = base["flows"][flow], cand["flows"][flow]
+        if any(k in r for r in (b, c) for k in ("skipped", "error")):
+            print(f"{flow:<14} (not comparable: skipped or failed in one run)")
+            continue
+        for path, higher_is_better in COMPARED:
+            old, new = _metric(b, path), _metric(c, path)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old if old else 0.0
+            worse = -change if higher_is_better else change
+            # Ignore tiny absolute latency moves, which are noise at any relative size
+            noise = path.startswith("latency_ms") and abs(new - old) < args.min_delta_ms
+            flag = worse > args.threshold and not noise
+            if flag:
+                regressions.append(f"{flow} {path}")
+            print(f"{flow:<14} {path:<18} {old:>12.2f} {new:>12.2f} {change:>+8.1%}{'  REGRESSION' if flag else ''}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    print(f"\nNo regressions beyond {args.threshold:.0%}")
+    return 0
+
+# ========== CLI ==========
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("run", help="Run flows and report throughput, latency percentiles and peak RSS as JSON")
+    p.add_argument("--flows", default=",".join(FLOWS), help="Comma-separated subset of: " + ", ".join(FLOWS))
+    p.add_argument("--output", help="Write the JSON report here instead of stdout")
+    p.add_argument("--set", action="append", default=[], metavar="KEY=VALUE", help="Override a backend.config value (JSON or string)")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--concurrency", type=int, default=1, help="Operations run in parallel threads")
+    p.add_argument("--docs", type=int, default=8, help="Synthetic PDFs (ingest, and the corpus for query flows)")
+    p.add_argument("--pages", type=int, default=5, help="Pages per PDF")
+    p.add_argument("--queries", type=int, default=50)
+    p.add_argument("--summaries", type=int, default=10)
+    p.add_argument("--rows", type=int, default=200_000, help="Rows in the synthetic table")
+    p.add_argument("--analyses", type=int, default=5)
+    p.add_argument("--llm-calls", type=int, default=100)
+    p.add_argument("--llm-latency-ms", type=float, default=50, help="Artificial latency of the fake Groq server")
+    p.set_defaults(func=run)
+
+    p = sub.add_parser("compare", help="Flag regressions between two run reports")
+    p.add_argument("baseline")
+    p.add_argument("candidate")
+    p.add_argument("--threshold", type=float, default=0.10, help="Relative change counted as a regression")
+    p.add_argument("--min-delta-ms", type=float, default=1.0, help="Latency changes smaller than this are ignored")
+    p.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
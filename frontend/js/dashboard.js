@@ -1,6 +1,6 @@
 const API_URL = 'http://localhost:8000';
 const username = localStorage.getItem('username');
-const token = localStorage.getItem('token');
+let token = localStorage.getItem('token');
 
 if (!username || !token) {
     window.location.href = 'index.html';
@@ -342,6 +342,9 @@ document.getElementById('changePasswordForm').addEventListener('submit', async (
         const data = await res.json();
         
         if (data.success) {
+            // Older sessions were signed out; keep this one with the new token
+            token = data.data.token;
+            localStorage.setItem('token', token);
             msg.className = 'message success';
             msg.textContent = 'Password changed!';
             e.target.reset();
@@ -443,8 +446,8 @@ function displayDataPreview(preview) {
     previewDiv.style.display = 'block';
 }
 
-// Load insights
-async function loadDataInsights(filename) {
+// Load insights (generated in the background after upload, so poll until ready)
+async function loadDataInsights(filename, attempt = 0) {
     try {
         const res = await fetch(`${API_URL}/data/analysis/${filename}`, {
             headers: { 'Authorization': `Bearer ${token}` }
@@ -454,7 +457,17 @@ async function loadDataInsights(filename) {
         
         if (data.success) {
             const insightsDiv = document.getElementById('insightsContent');
-            insightsDiv.innerHTML = `<p style="white-space:pre-wrap;">${data.data.llm_insights}</p>`;
+            const status = data.data.status ? data.data.status.llm_insights : 'ready';
+            if (status === 'pending') {
+                insightsDiv.innerHTML = '<p>Generating insights...</p>';
+                if (attempt < 30 && filename === currentDataFile) {
+                    setTimeout(() => loadDataInsights(filename, attempt + 1), 2000);
+                }
+            } else if (status === 'failed') {
+                insightsDiv.innerHTML = `<p>Unable to generate insights: ${data.data.errors.llm_insights}</p>`;
+            } else {
+                insightsDiv.innerHTML = `<p style="white-space:pre-wrap;">${data.data.llm_insights}</p>`;
+            }
             document.getElementById('dataInsights').style.display = 'block';
         }
     } catch (err) {
@@ -0,0 +1,61 @@
+"""Token revocation, shared between workers through the user store."""
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from backend import auth, email_outbox
+from backend.user import user_store
+
+@pytest.fixture
+def user(tmp_path, monkeypatch):
+    monkeypatch.setattr(user_store, "USERS_DB_PATH", tmp_path / "users.db")
+    monkeypatch.setattr(user_store, "USERS_DB_FILE", str(tmp_path / "users.json"))
+    monkeypatch.setattr(email_outbox, "EMAIL_OUTBOX_PATH", str(tmp_path / "outbox.db"))
+    monkeypatch.setattr(email_outbox, "_local", type(email_outbox._local)())
+    monkeypatch.setattr(auth, "_revocations", {"version": None, "checked": 0.0, "tokens": {}, "cutoffs": {}})
+    auth._TOKEN_CACHE.clear()
+    assert auth.signup("alice", "alice@example.com", "old-password")[0]
+    return "alice"
+
+def _verify(token: str) -> str:
+    return auth.verify_token(f"Bearer {token}")
+
+def _assert_revoked(token: str) -> None:
+    with pytest.raises(HTTPException, match="revoked"):
+        _verify(token)
+
+def test_logout_revokes_only_that_token(user):
+    token, other = auth.create_token(user), auth.create_token(user)
+    assert auth.revoke_token(token)
+    _assert_revoked(token)
+    assert _verify(other) == user
+
+def test_revocation_is_stored_not_per_process(user):
+    token = auth.create_token(user)
+    assert _verify(token) == user
+    # Another worker revokes: only the user store knows, and this worker picks it up on its next refresh
+    user_store.revoke_tokens_before(user, time.time())
+    auth._revocations["checked"] = 0.0
+    _assert_revoked(token)
+
+def test_revocation_check_stays_in_memory(user, monkeypatch):
+    token = auth.create_token(user)
+    assert _verify(token) == user
+    monkeypatch.setattr(auth, "REVOCATION_REFRESH_SECONDS", 3600)
+    monkeypatch.setattr(user_store, "load_revocations", None)
+    monkeypatch.setattr(user_store, "revocation_version", None)
+    assert _verify(token) == user
+    auth.revoke_user_tokens(user)
+    _assert_revoked(token)
+
+def test_revoke_all_covers_tokens_from_the_same_second(user):
+    token = auth.create_token(user)
+    auth.revoke_user_tokens(user)
+    _assert_revoked(token)
+    assert _verify(auth.create_token(user)) == user
+
+def test_change_password_ends_existing_sessions(user):
+    token = auth.create_token(user)
+    assert auth.change_password(user, "old-password", "new-password")[0]
+    _assert_revoked(token)
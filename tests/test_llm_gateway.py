@@ -0,0 +1,50 @@
+"""Circuit breaker and queue interaction in the LLM gateway."""
+from types import SimpleNamespace
+
+import pytest
+
+from backend import llm_gateway
+from backend.llm_gateway import LLMUnavailableError, _CircuitBreaker, _PriorityGate
+
+class _FakeClient:
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        message = SimpleNamespace(content=" ok ")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+@pytest.fixture
+def gateway(monkeypatch):
+    gate = _PriorityGate(limit=1, max_queue=4)
+    breaker = _CircuitBreaker(threshold=1, cooldown=0)
+    monkeypatch.setattr(llm_gateway, "_gate", gate)
+    monkeypatch.setattr(llm_gateway, "_breaker", breaker)
+    monkeypatch.setattr(llm_gateway, "_client", lambda api_key: _FakeClient())
+    monkeypatch.setattr(llm_gateway, "LLM_QUEUE_TIMEOUT_SECONDS", 0.05)
+    return gate, breaker
+
+def _call():
+    return llm_gateway.chat_completion([{"role": "user", "content": "hi"}], mode="test", temperature=0, max_tokens=8)
+
+def test_gate_timeout_while_half_open_does_not_lock_out_the_breaker(gateway):
+    gate, breaker = gateway
+    breaker.record_failure()  # Open; with no cooldown the next call is the half-open trial
+    gate.active = gate.limit  # Every slot busy, so the trial times out in the queue
+
+    with pytest.raises(LLMUnavailableError, match="Timed out"):
+        _call()
+    assert breaker.state == "half_open"
+
+    gate.active = 0
+    assert _call() == "ok"
+    assert breaker.state == "closed"
+
+def test_abandon_trial_only_clears_the_callers_own_trial(gateway):
+    _, breaker = gateway
+    breaker.record_failure()
+    assert breaker.allow()  # This thread holds the trial
+    assert not breaker.allow()
+
+    breaker.abandon_trial()
+    assert breaker.allow()
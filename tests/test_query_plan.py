@@ -0,0 +1,34 @@
+"""Data question plans: validation rejects what execution can't answer."""
+import pandas as pd
+import pytest
+
+from backend.data_analysis.query_plan import QueryPlanError, execute_plan, validate_plan
+
+DTYPES = {"region": "object", "revenue": "float64", "units": "int64"}
+
+@pytest.mark.parametrize("plan", [
+    # An alias that repeats a group_by column
+    {"group_by": ["region"], "aggregations": [{"column": "revenue", "func": "sum", "as": "region"}]},
+    # Two aggregations under one name
+    {"aggregations": [{"column": "revenue", "func": "sum", "as": "total"},
+                      {"column": "units", "func": "sum", "as": "total"}]},
+    # The same column grouped twice
+    {"group_by": ["region", "region"]},
+    # A group_by column named like the implicit count
+    {"group_by": ["count"]},
+])
+def test_duplicate_result_columns_are_rejected(plan):
+    dtypes = dict(DTYPES, count="int64")
+    with pytest.raises(QueryPlanError, match="Duplicate result columns"):
+        validate_plan(plan, dtypes)
+
+def test_distinct_names_execute():
+    df = pd.DataFrame({"region": ["West", "East", "West"], "revenue": [1.0, 2.0, 3.0], "units": [1, 2, 3]})
+    plan = validate_plan({
+        "group_by": ["region"],
+        "aggregations": [{"column": "revenue", "func": "sum", "as": "total"}, {"column": "*", "func": "count"}],
+        "sort": [{"by": "total", "desc": True}],
+    }, DTYPES)
+    result = execute_plan(plan, df, DTYPES)
+    assert result["columns"] == ["region", "total", "count"]
+    assert result["rows"] == [{"region": "West", "total": 4.0, "count": 2}, {"region": "East", "total": 2.0, "count": 1}]
@@ -0,0 +1,60 @@
+"""Quota reservations: concurrent requests can't overshoot a user's quota."""
+import pytest
+from fastapi import FastAPI, Depends, HTTPException
+from fastapi.testclient import TestClient
+
+from backend import auth, rate_limit
+from backend.user import user_store
+
+@pytest.fixture
+def user(tmp_path, monkeypatch):
+    monkeypatch.setattr(user_store, "USERS_DB_PATH", tmp_path / "users.db")
+    monkeypatch.setattr(user_store, "USERS_DB_FILE", str(tmp_path / "users.json"))
+    monkeypatch.setitem(rate_limit.RATE_LIMITS, "query", (100, 6000))
+    for state in (rate_limit._buckets, rate_limit._remaining, rate_limit._pending, rate_limit._reserved):
+        state.clear()
+    assert auth.signup("alice", "alice@example.com", "pw")[0]
+    user_store.set_quota("alice", "query_quota", 3)
+    return "alice"
+
+def test_reservations_stop_concurrent_requests_at_the_quota(user):
+    held = [rate_limit.check_limit(user, "query") for _ in range(3)]
+    with pytest.raises(HTTPException, match="exhausted"):
+        rate_limit.check_limit(user, "query")
+
+    rate_limit.release(held[0])  # That request failed: its unit is free again
+    assert rate_limit.remaining_quota(user, "query_quota") == 1
+
+def test_endpoint_charges_on_success_and_refunds_on_failure(user):
+    app = FastAPI()
+
+    @app.get("/ok")
+    async def ok(username: str = Depends(rate_limit.rate_limited("query"))):
+        rate_limit.record_usage(username, "query")
+        return {}
+
+    @app.get("/fails")
+    async def fails(username: str = Depends(rate_limit.rate_limited("query"))):
+        return {}  # Never records usage
+
+    headers = {"Authorization": f"Bearer {auth.create_token(user)}"}
+    client = TestClient(app)
+    assert client.get("/fails", headers=headers).status_code == 200
+    assert client.get("/ok", headers=headers).status_code == 200
+    assert rate_limit.remaining_quota(user, "query_quota") == 2
+    assert not rate_limit._reserved
+
+def test_flush_never_shows_written_usage_as_refunded(user, monkeypatch):
+    rate_limit.record_usage(user, "query", 2)
+    seen = []
+    consume = user_store.consume_quotas
+
+    def slow_consume(batch):
+        seen.append(rate_limit.remaining_quota(user, "query_quota"))  # Mid-flush
+        return consume(batch)
+
+    monkeypatch.setattr(user_store, "consume_quotas", slow_consume)
+    rate_limit.flush_usage()
+    assert seen == [1]
+    assert rate_limit.remaining_quota(user, "query_quota") == 1
+    assert user_store.get_quota(user, "query_quota") == 1
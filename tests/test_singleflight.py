@@ -0,0 +1,48 @@
+"""Request coalescing: one caller going away doesn't take the others down."""
+import asyncio
+
+import pytest
+
+from backend.rag.singleflight import SingleFlight
+
+def test_cancelled_leader_does_not_cancel_followers():
+    async def scenario():
+        flight = SingleFlight("test")
+        release = asyncio.Event()
+        runs = []
+
+        async def work():
+            runs.append(1)
+            await release.wait()
+            return "answer"
+
+        leader = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0)
+
+        leader.cancel()  # Leader's client disconnects
+        await asyncio.sleep(0)
+        release.set()
+
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        assert await follower == ("answer", True)
+        assert runs == [1]
+        assert flight.in_flight() == 0
+
+    asyncio.run(scenario())
+
+def test_failure_reaches_every_caller_and_clears_the_key():
+    async def scenario():
+        flight = SingleFlight("test")
+
+        async def work():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(flight.do("k", work), flight.do("k", work), return_exceptions=True)
+        assert [type(r) for r in results] == [ValueError, ValueError]
+        assert flight.in_flight() == 0
+
+    asyncio.run(scenario())